@@ -0,0 +1,109 @@
+"""
+Import time of the application, as reported by `python -X importtime`.
+
+Imports --module in a new interpreter --runs times and reports the median wall time of the
+interpreter, the median import time of the module, and the median cumulative import time of
+the heaviest dependencies. With --baseline, the report is compared to a previous one saved
+with --save, such as import_time_baseline.json, measured before the imports only needed by
+some configurations were deferred.
+
+    poetry run python benchmarks/bench_import_time.py --baseline benchmarks/import_time_baseline.json
+"""
+
+from typing import Dict, List, Optional
+
+import json
+import os
+import statistics
+import subprocess  # nosec B404
+import sys
+import time
+from pathlib import Path
+
+import typer
+
+# Dependencies reported, with the cumulative time of their first import.
+WATCHED_MODULES = [
+    "fastapi",
+    "uvicorn",
+    "sqlalchemy",
+    "sqlmodel",
+    "github",
+    "jwt",
+    "requests",
+    "httpx",
+    "google.cloud.logging",
+    "google.cloud.bigquery",
+]
+
+
+def parse_importtime(stderr: str) -> Dict[str, float]:
+    """
+    Cumulative import time in milliseconds of each module in `python -X importtime` output.
+    """
+    times: Dict[str, float] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if cumulative.strip().isdigit():
+            times.setdefault(name.strip(), int(cumulative) / 1000)
+    return times
+
+
+def measure(module: str, env: Dict[str, str]) -> Dict[str, float]:
+    start = time.perf_counter()
+    result = subprocess.run(  # nosec B603
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = parse_importtime(result.stderr)
+    return {
+        "interpreter_ms": (time.perf_counter() - start) * 1000,
+        "import_ms": times[module],
+        **{name: times.get(name, 0.0) for name in WATCHED_MODULES},
+    }
+
+
+def get_report(module: str, runs: int, env: Dict[str, str]) -> Dict[str, float]:
+    measures: List[Dict[str, float]] = [measure(module, env) for _ in range(runs)]
+    return {key: statistics.median(run[key] for run in measures) for key in measures[0]}
+
+
+def main(
+    module: str = typer.Option(
+        "github_tests_validator_app.bin.github_app_backend", help="Module imported."
+    ),
+    runs: int = typer.Option(15, help="Interpreters started, the median is reported."),
+    baseline: Optional[Path] = typer.Option(None, help="Report to compare with."),
+    save: Optional[Path] = typer.Option(None, help="Write the report to this file."),
+) -> None:
+    env = {"LOGGING": "LOCAL", **os.environ}
+    report = get_report(module, runs, env)
+    previous = json.loads(baseline.read_text())["times"] if baseline else {}
+    typer.echo(f"{module}, median of {runs} runs (LOGGING={env['LOGGING']})")
+    typer.echo(f"{'':<24} {'ms':>9}" + (f" {'baseline':>9} {'change':>9}" if previous else ""))
+    for key, value in report.items():
+        line = f"{key:<24} {value:>9.1f}"
+        if key in previous:
+            line += f" {previous[key]:>9.1f} {value - previous[key]:>+9.1f}"
+        typer.echo(line)
+    if save:
+        save.write_text(
+            json.dumps(
+                {
+                    "module": module,
+                    "runs": runs,
+                    "times": {key: round(value, 1) for key, value in report.items()},
+                },
+                indent=2,
+            )
+            + "\n"
+        )
+
+
+if __name__ == "__main__":
+    typer.run(main)
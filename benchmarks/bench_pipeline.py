@@ -0,0 +1,227 @@
+"""
+Replay webhook events through `github_event_process.run`, against a local fake of the
+GitHub API (see fake_github.py) and a SQLite database, and report the latency
+percentiles, events/second, GitHub API calls per event and peak RSS of the process.
+
+Events are generated `workflow_job` completions, one per student fork, or recorded
+payloads read from a JSON lines file. With --mode async they are replayed through
+`github_event_process.run_async`, all from a single event loop. The fake GitHub runs in
+its own process so that it does not weigh on the measures; the application settings can
+be overridden with their usual environment variables.
+
+    poetry run python benchmarks/bench_pipeline.py --events 300 --concurrency 8
+    poetry run python benchmarks/bench_pipeline.py --rate 20 --latency 0.05
+    poetry run python benchmarks/bench_pipeline.py --payloads recorded_events.jsonl
+    poetry run python benchmarks/bench_pipeline.py --mode async --concurrency 200
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import asyncio
+import json
+import os
+import resource
+import socket
+import statistics
+import subprocess  # nosec B404
+import sys
+import tempfile
+import time
+import traceback
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import typer
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fake_github import REFERENCE_REPOSITORY
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+def get_app_key() -> str:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption(),
+    ).decode()
+
+
+def start_fake_github(tests: int, latency: float) -> Tuple["subprocess.Popen[bytes]", str]:
+    port = get_free_port()
+    script = Path(__file__).with_name("fake_github.py")
+    process = subprocess.Popen(  # nosec B603
+        [sys.executable, str(script), "--port", str(port), "--tests", str(tests)]
+        + ["--latency", str(latency)],
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            get_calls(url)
+            return process, url
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("The fake GitHub did not start.")
+
+
+def get_calls(url: str) -> Dict[str, int]:
+    with urllib.request.urlopen(f"{url}/_calls") as response:  # nosec B310
+        calls: Dict[str, int] = json.load(response)
+    return calls
+
+
+def get_payload(index: int) -> Dict[str, Any]:
+    login = f"student-{index}"
+    repository = f"{login}/{REFERENCE_REPOSITORY.split('/')[1]}"
+    return {
+        "action": "completed",
+        "workflow_job": {
+            "id": 1000000 + index,
+            "run_id": 2000000 + index,
+            "head_sha": f"{index:040x}",
+            "head_branch": "main",
+            "status": "completed",
+            "conclusion": "success",
+        },
+        "repository": {"id": index, "full_name": repository, "fork": True},
+        "sender": {"login": login, "id": index, "url": f"https://api.github.com/users/{login}"},
+        "installation": {"id": 100000 + index},
+    }
+
+
+def get_payloads(events: int, payloads: Optional[Path]) -> List[Dict[str, Any]]:
+    if payloads is None:
+        return [get_payload(index) for index in range(events)]
+    with payloads.open() as lines:
+        recorded = [json.loads(line) for line in lines if line.strip()]
+    return [recorded[index % len(recorded)] for index in range(events)]
+
+
+def main(
+    events: int = typer.Option(300, min=2, help="Events replayed."),
+    concurrency: int = typer.Option(8, help="Events processed at the same time."),
+    rate: float = typer.Option(0.0, help="Events started per second, 0 to start them all."),
+    tests: int = typer.Option(200, help="Tests in the artifact of each workflow run."),
+    latency: float = typer.Option(0.0, help="Seconds the fake GitHub waits per request."),
+    payloads: Optional[Path] = typer.Option(None, help="JSON lines file of recorded payloads."),
+    mode: str = typer.Option("thread", help="thread: `run` from a pool, async: `run_async`."),
+) -> None:
+    fake_github, url = start_fake_github(tests, latency)
+    database = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    database.close()
+    os.environ.setdefault("LOGGING", "LOCAL")
+    os.environ.setdefault("GH_API_URL", url)
+    os.environ.setdefault("GH_APP_ID", "1")
+    os.environ.setdefault("GH_APP_KEY", get_app_key())
+    os.environ.setdefault("SQLALCHEMY_URI", f"sqlite:///{database.name}")
+    try:
+        run_benchmark(url, get_payloads(events, payloads), concurrency, rate, mode)
+    finally:
+        fake_github.terminate()
+        os.unlink(database.name)
+
+
+def run_benchmark(
+    url: str, payloads: List[Dict[str, Any]], concurrency: int, rate: float, mode: str
+) -> None:
+    # The application reads its settings when it is imported.
+    import logging
+
+    from github_tests_validator_app.bin import github_event_process
+    from github_tests_validator_app.lib.connectors.async_github_client import (
+        close_async_github_client,
+    )
+    from github_tests_validator_app.lib.metrics import STAGE_SECONDS
+    from github_tests_validator_app.lib.connectors.sqlalchemy_client import (
+        SQLAlchemyConnector,
+        WorkflowRunDetail,
+        init_db,
+    )
+    from sqlmodel import Session, func, select
+
+    logging.getLogger().setLevel(logging.WARNING)
+    init_db()
+    latencies: List[float] = []
+    failures = 0
+
+    def replay(payload: Dict[str, Any], scheduled: float) -> None:
+        nonlocal failures
+        try:
+            github_event_process.run(payload)
+        except Exception:
+            failures += 1
+            logging.error(traceback.format_exc())
+        latencies.append(time.perf_counter() - scheduled)
+
+    async def replay_async(
+        payload: Dict[str, Any], scheduled: float, slots: asyncio.Semaphore
+    ) -> None:
+        nonlocal failures
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        async with slots:
+            try:
+                await github_event_process.run_async(payload)
+            except Exception:
+                failures += 1
+                logging.error(traceback.format_exc())
+        latencies.append(time.perf_counter() - scheduled)
+
+    async def replay_all(start: float) -> None:
+        slots = asyncio.Semaphore(concurrency)
+        await asyncio.gather(
+            *(
+                replay_async(payload, start + index / rate if rate > 0 else start, slots)
+                for index, payload in enumerate(payloads)
+            )
+        )
+        await close_async_github_client()
+
+    calls_before = sum(get_calls(url).values())
+    start = time.perf_counter()
+    if mode == "async":
+        asyncio.run(replay_all(start))
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for index, payload in enumerate(payloads):
+                scheduled = start + index / rate if rate > 0 else start
+                time.sleep(max(0.0, scheduled - time.perf_counter()))
+                executor.submit(replay, payload, scheduled)
+    elapsed = time.perf_counter() - start
+    calls = get_calls(url)
+
+    with Session(SQLAlchemyConnector().engine) as session:
+        details = session.exec(select(func.count()).select_from(WorkflowRunDetail)).one()
+    percentiles = statistics.quantiles(latencies, n=100)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    typer.echo(f"events           {len(payloads):>10} ({failures} failed)")
+    typer.echo(f"events/second    {len(payloads) / elapsed:>10.1f}")
+    for name, percentile in (("p50", 49), ("p95", 94), ("p99", 98)):
+        typer.echo(f"latency {name}      {percentiles[percentile] * 1000:>10.1f} ms")
+    typer.echo(f"API calls/event  {(sum(calls.values()) - calls_before) / len(payloads):>10.2f}")
+    for endpoint, count in sorted(calls.items(), key=lambda item: -item[1]):
+        typer.echo(f"  {endpoint:<20} {count / len(payloads):>8.2f}")
+    totals: Dict[str, List[float]] = {}
+    for name, labels, value in STAGE_SECONDS.samples():
+        total = totals.setdefault(labels["stage"], [0.0, 0.0])
+        if name.endswith("_sum"):
+            total[0] += value
+        elif name.endswith("_count"):
+            total[1] += value
+    typer.echo("mean stage duration, calls/event")
+    for stage, (seconds, count) in sorted(totals.items(), key=lambda item: -item[1][0]):
+        typer.echo(f"  {stage:<20} {seconds / count * 1000:>8.1f} ms {count / len(payloads):>6.2f}")
+    typer.echo(f"peak RSS         {peak_rss:>10.1f} MB")
+    typer.echo(f"test details     {details:>10}")
+
+
+if __name__ == "__main__":
+    typer.run(main)
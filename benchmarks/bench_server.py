@@ -0,0 +1,167 @@
+"""
+Start the webhook server with SERVER_WORKERS processes against the fake GitHub of
+fake_github.py, and report its cold start, the events/second it processes per worker
+process, and how long it takes to drain on SIGTERM.
+
+Cold start is measured from the process launch to the first answer of /healthz, when
+the server listens, and of /readyz, when the database pool, the GitHub App credentials
+and the background workers are warm. `workflow_job` deliveries are then posted from
+--concurrency threads, and an event is processed once its workflow run is in the
+database. The other settings can be overridden with their usual environment variables;
+SQLite serializes the writes of the processes, set SQLALCHEMY_URI to a PostgreSQL
+database to measure more than one worker.
+
+    poetry run python benchmarks/bench_server.py --workers 1 --workers 2 --events 200
+"""
+
+from typing import Any, Dict, List
+
+import json
+import os
+import signal
+import subprocess  # nosec B404
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import typer
+from bench_pipeline import get_app_key, get_free_port, get_payload, start_fake_github
+from sqlalchemy import create_engine, text
+
+
+def wait_for(url: str, timeout: float = 120) -> float:
+    """
+    Seconds until `url` answers with a 200.
+    """
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - start
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} did not answer within {timeout}s.")
+
+
+def count_workflow_runs(database_url: str) -> int:
+    engine = create_engine(database_url)
+    try:
+        with engine.connect() as connection:
+            return int(connection.execute(text("SELECT count(*) FROM workflow_run")).scalar() or 0)
+    except Exception:
+        # The tables are created by the server at startup.
+        return 0
+    finally:
+        engine.dispose()
+
+
+def run_server(
+    workers: int, events: int, concurrency: int, env: Dict[str, str], first_index: int
+) -> Dict[str, Any]:
+    port = get_free_port()
+    url = f"http://127.0.0.1:{port}"
+    launched = time.perf_counter()
+    server = subprocess.Popen(  # nosec B603
+        [
+            sys.executable,
+            "-c",
+            "from github_tests_validator_app.bin.github_app_backend "
+            "import launch_app; launch_app()",
+        ],
+        env={**env, "PORT": str(port), "SERVER_WORKERS": str(workers)},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for(f"{url}/healthz")
+        healthy = time.perf_counter() - launched
+        # Every worker process answers /readyz once it is warm; ask a few times.
+        for _ in range(workers * 4):
+            wait_for(f"{url}/readyz")
+        ready = time.perf_counter() - launched
+        before = count_workflow_runs(env["SQLALCHEMY_URI"])
+
+        def deliver(index: int) -> None:
+            # Deliveries answered with a 503 while the queue is full are redelivered.
+            while (
+                requests.post(
+                    url,
+                    data=json.dumps(get_payload(index)),
+                    headers={"X-GitHub-Event": "workflow_job", "X-GitHub-Delivery": f"d-{index}"},
+                ).status_code
+                == 503
+            ):
+                time.sleep(0.1)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(deliver, range(first_index, first_index + events)))
+        delivered = time.perf_counter() - start
+        while count_workflow_runs(env["SQLALCHEMY_URI"]) - before < events:
+            if time.perf_counter() - start > 600:
+                raise RuntimeError("The events were not all processed within 600s.")
+            time.sleep(0.05)
+        processed = time.perf_counter() - start
+
+        stopping = time.perf_counter()
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=120)
+        return {
+            "workers": workers,
+            "healthz_seconds": healthy,
+            "readyz_seconds": ready,
+            "deliveries_per_second": events / delivered,
+            "events_per_second": events / processed,
+            "events_per_second_per_worker": events / processed / workers,
+            "shutdown_seconds": time.perf_counter() - stopping,
+        }
+    finally:
+        if server.poll() is None:
+            server.kill()
+
+
+def main(
+    workers: List[int] = typer.Option([1, 2], help="Server worker processes, repeatable."),
+    events: int = typer.Option(200, help="Deliveries posted per run."),
+    concurrency: int = typer.Option(16, help="Deliveries posted at the same time."),
+    tests: int = typer.Option(200, help="Tests in the artifact of each workflow run."),
+    latency: float = typer.Option(0.02, help="Seconds the fake GitHub waits per request."),
+) -> None:
+    fake_github, github_url = start_fake_github(tests, latency)
+    database = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    database.close()
+    env = {
+        "LOGGING": "LOCAL",
+        "GH_API_URL": github_url,
+        "GH_APP_ID": "1",
+        "GH_APP_KEY": get_app_key(),
+        "SQLALCHEMY_URI": f"sqlite:///{database.name}",
+        # Each delivery is its own workflow run, they are processed right away.
+        "EVENT_COALESCE_WINDOW": "0",
+        **os.environ,
+    }
+    typer.echo(f"{os.cpu_count()} CPUs")
+    typer.echo(
+        f"{'workers':>8} {'healthz s':>10} {'readyz s':>10} {'deliveries/s':>13} "
+        f"{'events/s':>9} {'per worker':>11} {'shutdown s':>11}"
+    )
+    try:
+        for index, count in enumerate(workers):
+            result = run_server(count, events, concurrency, env, index * events)
+            typer.echo(
+                f"{result['workers']:>8} {result['healthz_seconds']:>10.2f} "
+                f"{result['readyz_seconds']:>10.2f} {result['deliveries_per_second']:>13.1f} "
+                f"{result['events_per_second']:>9.1f} "
+                f"{result['events_per_second_per_worker']:>11.1f} "
+                f"{result['shutdown_seconds']:>11.2f}"
+            )
+    finally:
+        fake_github.terminate()
+        os.unlink(database.name)
+
+
+if __name__ == "__main__":
+    typer.run(main)
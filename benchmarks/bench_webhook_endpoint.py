@@ -0,0 +1,142 @@
+"""
+Measure the requests/second of the webhook endpoint for a mix of GitHub deliveries.
+
+Requests are sent straight to the ASGI application, and events are dropped once accepted,
+so that only the endpoint is measured: reading, filtering and decoding the deliveries.
+Each run compares deliveries carrying the X-GitHub-Event header, filtered before decoding,
+with the same deliveries without it, which are all decoded.
+
+    poetry run python benchmarks/bench_webhook_endpoint.py --requests 5000
+    poetry run python benchmarks/bench_webhook_endpoint.py --decoder json
+"""
+
+from typing import Any, Dict, List, Tuple
+
+import asyncio
+import json
+import os
+import random
+import time
+
+os.environ.setdefault("LOGGING", "LOCAL")
+
+import typer  # noqa: E402
+from github_tests_validator_app.bin import github_app_backend, github_event_process  # noqa: E402
+
+# Share of the deliveries received by the application, by event and action
+TRAFFIC = [
+    ("workflow_job", "queued", 30),
+    ("workflow_job", "in_progress", 30),
+    ("workflow_job", "completed", 15),
+    ("push", None, 15),
+    ("pull_request", "opened", 5),
+    ("pull_request", "synchronize", 5),
+]
+
+
+def get_payload(event_name: str, action: Any, index: int) -> Dict[str, Any]:
+    repository = {
+        "id": index,
+        "full_name": f"user-{index}/repo",
+        "description": "x" * 200,
+        **{f"{i}_url": f"https://api.github.com/repos/user-{index}/repo/{i}" for i in range(60)},
+    }
+    sender = {f"{i}_url": f"https://api.github.com/users/user-{index}/{i}" for i in range(20)}
+    payload: Dict[str, Any] = {"action": action} if action else {"ref": "refs/heads/main"}
+    if event_name == "workflow_job":
+        payload["workflow_job"] = {
+            "id": index,
+            "run_id": index,
+            "head_sha": "0" * 40,
+            "head_branch": "main",
+            "steps": [{"name": f"step {i}", "status": "completed"} for i in range(20)],
+        }
+    elif event_name == "pull_request":
+        payload["pull_request"] = {"number": index, "head": {"ref": "main", "sha": "0" * 40}}
+    else:
+        payload["pusher"] = {"name": f"user-{index}"}
+    payload.update(repository=repository, sender=sender)
+    return payload
+
+
+Delivery = Tuple[List[Tuple[bytes, bytes]], bytes]
+
+
+def get_deliveries(count: int, with_event_header: bool) -> List[Delivery]:
+    random.seed(0)
+    weights = [weight for _, _, weight in TRAFFIC]
+    deliveries = []
+    for index in range(count):
+        event_name, action, _ = random.choices(TRAFFIC, weights)[0]  # nosec B311
+        body = json.dumps(get_payload(event_name, action, index)).encode()
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"x-github-delivery", str(index).encode()),
+        ]
+        if with_event_header:
+            headers.append((b"x-github-event", event_name.encode()))
+        deliveries.append((headers, body))
+    return deliveries
+
+
+async def post(headers: List[Tuple[bytes, bytes]], body: bytes) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/",
+        "raw_path": b"/",
+        "root_path": "",
+        "query_string": b"",
+        "headers": headers,
+        "client": ("127.0.0.1", 1234),
+        "server": ("127.0.0.1", 8080),
+    }
+    status = 0
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await github_app_backend.app(scope, receive, send)
+    return status
+
+
+async def measure(deliveries: List[Delivery]) -> float:
+    start = time.perf_counter()
+    for headers, body in deliveries:
+        assert await post(headers, body) == 202  # nosec B101
+    return len(deliveries) / (time.perf_counter() - start)
+
+
+def main(
+    requests: int = typer.Option(5000, help="Deliveries sent per run."),
+    decoder: str = typer.Option("default", help="'default' or 'json' to compare with json.loads."),
+) -> None:
+    dispatched = []
+
+    def dispatch(payload: Dict[str, Any], *args: Any) -> None:
+        dispatched.append(payload)
+
+    github_app_backend.dispatch = dispatch  # type: ignore
+    if decoder == "json":
+        github_event_process.json_loads = json.loads  # type: ignore
+
+    asyncio.run(measure(get_deliveries(200, False)))  # warm up
+    for with_event_header in (False, True):
+        deliveries = get_deliveries(requests, with_event_header)
+        dispatched.clear()
+        rate = asyncio.run(measure(deliveries))
+        label = "filtered on headers" if with_event_header else "decoded"
+        typer.echo(f"{label:<20} {rate:>10.0f} requests/s  {len(dispatched):>6} dispatched")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,70 @@
+"""
+Load test of the webhook signature check.
+
+Measures the cost of a signature verification, then the requests/second of the webhook
+endpoint for deliveries without signature, with a wrong one and with a valid one.
+
+    poetry run python benchmarks/bench_webhook_signature.py --requests 5000
+"""
+
+from typing import Any, Dict, List
+
+import asyncio
+import hashlib
+import hmac
+import os
+import time
+import timeit
+
+os.environ.setdefault("LOGGING", "LOCAL")
+
+import typer  # noqa: E402
+from bench_webhook_endpoint import Delivery, get_deliveries, post  # noqa: E402
+from github_tests_validator_app.bin import github_app_backend  # noqa: E402
+from github_tests_validator_app.lib.webhook_signature import verify_signature  # noqa: E402
+
+SECRET = b"benchmark-secret"
+
+
+def sign(deliveries: List[Delivery], signature: Any) -> List[Delivery]:
+    signed = []
+    for headers, body in deliveries:
+        if signature == "valid":
+            value = "sha256=" + hmac.new(SECRET, body, hashlib.sha256).hexdigest()
+            headers = headers + [(b"x-hub-signature-256", value.encode())]
+        elif signature == "wrong":
+            headers = headers + [(b"x-hub-signature-256", b"sha256=" + b"0" * 64)]
+        signed.append((headers, body))
+    return signed
+
+
+async def measure(deliveries: List[Delivery], status: int) -> float:
+    start = time.perf_counter()
+    for headers, body in deliveries:
+        assert await post(headers, body) == status  # nosec B101
+    return len(deliveries) / (time.perf_counter() - start)
+
+
+def main(requests: int = typer.Option(5000, help="Deliveries sent per run.")) -> None:
+    github_app_backend.webhook_secret = SECRET
+
+    def dispatch(payload: Dict[str, Any], *args: Any) -> None:
+        pass
+
+    github_app_backend.dispatch = dispatch  # type: ignore
+
+    deliveries = get_deliveries(requests, with_event_header=True)
+    _, body = deliveries[0]
+    signature = sign(deliveries[:1], "valid")[0][0][-1][1].decode()
+    number = 20000
+    seconds = timeit.timeit(lambda: verify_signature(body, signature, SECRET), number=number)
+    typer.echo(f"verify_signature ({len(body)} bytes) {seconds / number * 1e6:>8.1f} us")
+
+    asyncio.run(measure(sign(deliveries[:200], "valid"), 202))  # warm up
+    for signature, status in (("missing", 401), ("wrong", 401), ("valid", 202)):
+        rate = asyncio.run(measure(sign(deliveries, signature), status))
+        typer.echo(f"{signature + ' signature':<18} {status} {rate:>10.0f} requests/s")
+
+
+if __name__ == "__main__":
+    typer.run(main)
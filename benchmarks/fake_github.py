@@ -0,0 +1,302 @@
+"""
+Local stand-in of the GitHub REST endpoints used by the application, for the benchmarks.
+
+Every repository other than the reference one is served as a fork of it, with the same
+`.github/workflows` folder, and every workflow run has one artifact holding a pytest JSON
+report. Responses carry rate limit headers, may be delayed to emulate the network, and
+the requests are counted by endpoint, readable on GET /_calls.
+
+    poetry run python benchmarks/fake_github.py --port 8081
+"""
+
+from typing import Any, Dict, List, Tuple
+
+import base64
+import hashlib
+import io
+import json
+import re
+import threading
+import time
+import zipfile
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import typer
+
+REFERENCE_REPOSITORY = "teacher/course"
+WORKFLOWS_FOLDER = ".github/workflows"
+RATE_LIMIT = 15000
+
+
+def get_sha(*parts: Any) -> str:
+    return hashlib.sha1(":".join(map(str, parts)).encode()).hexdigest()  # nosec B324
+
+
+def get_pytest_report(tests: int) -> Dict[str, Any]:
+    records = [
+        {
+            "nodeid": f"tests/test_challenge_{i % 10}.py::test_question_{i}",
+            "lineno": i,
+            "outcome": "passed" if i % 4 else "failed",
+            "keywords": [f"test_question_{i}", f"challenge_{i % 10}", "course"],
+            "setup": {"duration": 0.0001, "outcome": "passed"},
+            "call": {"duration": 0.002, "outcome": "passed" if i % 4 else "failed"},
+            "teardown": {"duration": 0.0001, "outcome": "passed"},
+        }
+        for i in range(tests)
+    ]
+    return {
+        "created": 1700000000.0,
+        "duration": 1.5,
+        "exitcode": 1,
+        "root": "/home/runner/work/course",
+        "environment": {"Python": "3.9.18", "Platform": "Linux"},
+        "summary": {
+            "passed": sum(test["outcome"] == "passed" for test in records),
+            "failed": sum(test["outcome"] == "failed" for test in records),
+            "total": tests,
+            "collected": tests,
+        },
+        "tests": records,
+    }
+
+
+def get_artifact_zip(tests: int) -> bytes:
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("results.json", json.dumps(get_pytest_report(tests)))
+    return archive.getvalue()
+
+
+class FakeGitHub:
+    """
+    Args:
+        tests (int): number of tests of the pytest report of each artifact
+        files (int): number of files of the repositories outside of the workflows folder
+        workflows (int): number of files in the workflows folder
+        latency (float): seconds waited before answering each request
+    """
+
+    def __init__(
+        self, tests: int = 200, files: int = 200, workflows: int = 5, latency: float = 0.0
+    ) -> None:
+        self.latency = latency
+        self.artifact = get_artifact_zip(tests)
+        self.workflow_files = {
+            f"{WORKFLOWS_FOLDER}/workflow_{i}.yml": f"name: workflow {i}\n".encode()
+            for i in range(workflows)
+        }
+        self.other_files = [f"exercises/exercise_{i}.py" for i in range(files)]
+        self._lock = threading.Lock()
+        self.calls: "Counter[str]" = Counter()
+        self._remaining: Dict[str, int] = {}
+        self.reset = int(time.time()) + 3600
+        self.url = ""
+        self.routes = [
+            ("GET", r"/_calls", self.get_calls),
+            ("GET", r"/app", self.get_app),
+            ("POST", r"/app/installations/(?P<id>\d+)/access_tokens", self.create_token),
+            ("GET", r"/repos/(?P<repo>[^/]+/[^/]+)", self.get_repo),
+            ("GET", r"/repos/(?P<repo>[^/]+/[^/]+)/installation", self.get_installation),
+            ("GET", r"/repos/(?P<repo>[^/]+/[^/]+)/branches/(?P<branch>.+)", self.get_branch),
+            ("GET", r"/repos/(?P<repo>[^/]+/[^/]+)/git/trees/(?P<ref>[^/]+)", self.get_tree),
+            ("GET", r"/repos/(?P<repo>[^/]+/[^/]+)/contents/(?P<path>.*)", self.get_contents),
+            (
+                "GET",
+                r"/repos/(?P<repo>[^/]+/[^/]+)/actions/runs/(?P<run_id>\d+)/artifacts",
+                self.get_run_artifacts,
+            ),
+            (
+                "GET",
+                r"/repos/(?P<repo>[^/]+/[^/]+)/actions/artifacts/(?P<id>\d+)/zip",
+                self.get_artifact_zip,
+            ),
+        ]
+
+    def serve(self, port: int = 0) -> ThreadingHTTPServer:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                fake.handle(self, "GET")
+
+            def do_POST(self) -> None:
+                fake.handle(self, "POST")
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{server.server_address[1]}"
+        return server
+
+    def handle(self, request: BaseHTTPRequestHandler, method: str) -> None:
+        url = urlparse(request.path)
+        length = int(request.headers.get("Content-Length") or 0)
+        if length:
+            request.rfile.read(length)
+        for route_method, pattern, endpoint in self.routes:
+            match = re.fullmatch(pattern, url.path)
+            if route_method == method and match:
+                break
+        else:
+            self.respond(request, 404, {"message": "Not Found"})
+            return
+        if endpoint != self.get_calls:
+            with self._lock:
+                self.calls[endpoint.__name__] += 1
+            if self.latency:
+                time.sleep(self.latency)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        status, body = endpoint(query=query, **match.groupdict())
+        self.respond(request, status, body, request.headers.get("Authorization", ""))
+
+    def respond(
+        self, request: BaseHTTPRequestHandler, status: int, body: Any, authorization: str = ""
+    ) -> None:
+        content_type = "application/json"
+        if isinstance(body, bytes):
+            content_type = "application/zip"
+        else:
+            body = json.dumps(body).encode()
+        with self._lock:
+            remaining = self._remaining.get(authorization, RATE_LIMIT) - 1
+            self._remaining[authorization] = remaining
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        request.send_header("X-RateLimit-Limit", str(RATE_LIMIT))
+        request.send_header("X-RateLimit-Remaining", str(max(0, remaining)))
+        request.send_header("X-RateLimit-Reset", str(self.reset))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def repo_json(self, repo: str) -> Dict[str, Any]:
+        owner, name = repo.split("/")
+        data = {
+            "id": int(get_sha(repo)[:8], 16),
+            "name": name,
+            "full_name": repo,
+            "owner": {"login": owner, "id": int(get_sha(owner)[:8], 16), "type": "User"},
+            "private": False,
+            "fork": repo != REFERENCE_REPOSITORY,
+            "url": f"{self.url}/repos/{repo}",
+            "default_branch": "main",
+        }
+        if repo != REFERENCE_REPOSITORY:
+            data["parent"] = self.repo_json(REFERENCE_REPOSITORY)
+            data["source"] = data["parent"]
+        return data
+
+    def get_calls(self, query: Dict[str, str]) -> Tuple[int, Any]:
+        with self._lock:
+            return 200, dict(self.calls)
+
+    def get_app(self, query: Dict[str, str]) -> Tuple[int, Any]:
+        return 200, {"id": 1, "slug": "fake-app", "name": "Fake app", "owner": {"login": "fake"}}
+
+    def create_token(self, query: Dict[str, str], id: str) -> Tuple[int, Any]:
+        expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+        return 201, {
+            "token": f"ghs_fake_{id}_{get_sha(id, time.time())[:16]}",
+            "expires_at": expires_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "permissions": {"actions": "read", "contents": "read"},
+            "repository_selection": "all",
+        }
+
+    def get_repo(self, query: Dict[str, str], repo: str) -> Tuple[int, Any]:
+        return 200, self.repo_json(repo)
+
+    def get_installation(self, query: Dict[str, str], repo: str) -> Tuple[int, Any]:
+        return 200, {"id": int(get_sha(repo.split("/")[0])[:6], 16), "app_id": 1}
+
+    def get_branch(self, query: Dict[str, str], repo: str, branch: str) -> Tuple[int, Any]:
+        sha = get_sha(repo, branch)
+        return 200, {
+            "name": branch,
+            "commit": {"sha": sha, "url": f"{self.url}/repos/{repo}/commits/{sha}"},
+            "protected": False,
+        }
+
+    def get_tree(self, query: Dict[str, str], repo: str, ref: str) -> Tuple[int, Any]:
+        elements: List[Dict[str, Any]] = [
+            {"path": ".github", "type": "tree", "mode": "040000", "sha": get_sha(".github")},
+            {"path": WORKFLOWS_FOLDER, "type": "tree", "mode": "040000", "sha": get_sha("wf")},
+        ]
+        # The workflows are identical in every fork, so that they are found unchanged.
+        blobs = [(path, get_sha(content)) for path, content in self.workflow_files.items()]
+        blobs += [(path, get_sha(repo, path)) for path in self.other_files]
+        for path, sha in blobs:
+            elements.append({"path": path, "type": "blob", "mode": "100644", "sha": sha})
+        return 200, {"sha": ref, "tree": elements, "truncated": False}
+
+    def get_contents(self, query: Dict[str, str], repo: str, path: str) -> Tuple[int, Any]:
+        ref = query.get("ref", "main")
+        path = path.strip("/")
+        if path in self.workflow_files:
+            return 200, self.content_json(repo, path, ref, with_content=True)
+        files = [file for file in self.workflow_files if file.startswith(f"{path}/")]
+        if not files:
+            return 404, {"message": "Not Found"}
+        return 200, [self.content_json(repo, file, ref) for file in files]
+
+    def content_json(
+        self, repo: str, path: str, ref: str, with_content: bool = False
+    ) -> Dict[str, Any]:
+        content = self.workflow_files[path]
+        data: Dict[str, Any] = {
+            "type": "file",
+            "name": path.split("/")[-1],
+            "path": path,
+            "sha": get_sha(content),
+            "size": len(content),
+            "url": f"{self.url}/repos/{repo}/contents/{path}?ref={ref}",
+        }
+        if with_content:
+            data.update(encoding="base64", content=base64.b64encode(content).decode())
+        return data
+
+    def get_run_artifacts(self, query: Dict[str, str], repo: str, run_id: str) -> Tuple[int, Any]:
+        artifact = {
+            "id": int(run_id),
+            "name": "tests-results-logs",
+            "size_in_bytes": len(self.artifact),
+            "archive_download_url": f"{self.url}/repos/{repo}/actions/artifacts/{run_id}/zip",
+            "expired": False,
+            "workflow_run": {"id": int(run_id), "head_branch": "main"},
+        }
+        return 200, {"total_count": 1, "artifacts": [artifact]}
+
+    def get_artifact_zip(self, query: Dict[str, str], repo: str, id: str) -> Tuple[int, Any]:
+        return 200, self.artifact
+
+
+def start_fake_github(**kwargs: Any) -> Tuple[FakeGitHub, ThreadingHTTPServer]:
+    """
+    Serve a fake GitHub on a free local port, from a background thread.
+    """
+    fake = FakeGitHub(**kwargs)
+    server = fake.serve()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return fake, server
+
+
+def main(
+    port: int = typer.Option(8081, help="Port to listen on."),
+    tests: int = typer.Option(200, help="Tests of the pytest report of each artifact."),
+    latency: float = typer.Option(0.0, help="Seconds waited before each response."),
+) -> None:
+    fake = FakeGitHub(tests=tests, latency=latency)
+    server = fake.serve(port)
+    typer.echo(f"Fake GitHub listening on {fake.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    typer.run(main)
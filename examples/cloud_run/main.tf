@@ -80,6 +80,10 @@ resource "google_cloud_run_service" "github_test_validator_app" {
         metadata {
           annotations = {
             "run.googleapis.com/deploy-timestamp" = timestamp()
+            # Webhooks are answered before being processed: keep the CPU allocated
+            # outside of requests for the background workers and the BigQuery batcher.
+            "run.googleapis.com/cpu-throttling" = "false"
+            "autoscaling.knative.dev/minScale" = "1"
           }
         }
         spec {
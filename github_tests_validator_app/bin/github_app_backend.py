@@ -1,30 +1,302 @@
-from typing import cast
+from typing import Any, AsyncIterator, Callable, Dict, List, Union, cast
 
+import importlib
 import logging
 import os
+import queue
+import threading
+import time
 import traceback
+from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI, Request
-from github_tests_validator_app.bin.github_event_process import run
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+from github_tests_validator_app.bin.github_event_process import (
+    accept_event,
+    decode_payload,
+    dispatch,
+    event_coalescer,
+    event_deduplicator,
+)
+from github_tests_validator_app.bin.github_repo_validation import folder_hash_cache
+from github_tests_validator_app.config import (
+    ACCEPTED_EVENT_ACTIONS,
+    GH_ALLOW_UNSIGNED_WEBHOOKS,
+    GH_WEBHOOK_SECRET,
+    SERVER_GRACEFUL_TIMEOUT,
+    SERVER_PREWARM,
+    SERVER_WORKERS,
+    SQL_CREATE_TABLES_ON_STARTUP,
+    SQLALCHEMY_URI,
+    WORKER_COUNT,
+    WORKER_MODE,
+    WORKER_QUEUE_MAX_SIZE,
+    WORKER_SHUTDOWN_TIMEOUT,
+)
+from github_tests_validator_app.lib.connectors.bigquery_batcher import (
+    get_detail_batcher_stats,
+    stop_detail_batcher,
+)
+from github_tests_validator_app.lib.connectors.github_token_cache import token_cache
+from github_tests_validator_app.lib.connectors.rate_limiter import rate_limiter
+from github_tests_validator_app.lib.connectors.sqlalchemy_client import (
+    get_pool_stats,
+    init_db,
+    ping_db,
+)
+from github_tests_validator_app.lib.job_queue import JobQueue
+from github_tests_validator_app.lib.metrics import Gauge, Metric, gauges_from_stats, registry
+from github_tests_validator_app.lib.tracing import setup_tracing, start_span, stop_tracing
+from github_tests_validator_app.lib.webhook_signature import verify_signature
 
-app = FastAPI()
+job_queue = JobQueue(workers=WORKER_COUNT, max_size=WORKER_QUEUE_MAX_SIZE, mode=WORKER_MODE)
+webhook_secret = GH_WEBHOOK_SECRET.encode()
+
+
+class ServerState:
+    """
+    Lifecycle of the instance reported by /readyz: ready once warmed up, and not anymore
+    while draining before shutting down.
+    """
+
+    def __init__(self) -> None:
+        self.started_at = time.monotonic()
+        self.warmup_seconds: Union[float, None] = None
+        self.checks: Dict[str, str] = {}
+        self.draining = False
+
+    def ready(self) -> bool:
+        return (
+            self.warmup_seconds is not None
+            and all(check == "ok" for check in self.checks.values())
+            and not self.draining
+        )
+
+    def status(self) -> str:
+        if self.draining:
+            return "draining"
+        if self.warmup_seconds is None:
+            return "warming_up"
+        return "ready" if self.ready() else "failed"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "status": self.status(),
+            "ready": self.ready(),
+            "uptime_seconds": time.monotonic() - self.started_at,
+            "warmup_seconds": self.warmup_seconds,
+            "checks": self.checks,
+        }
+
+
+server_state = ServerState()
+
+
+def import_deferred_modules() -> None:
+    """
+    Import the modules only used by some worker modes and databases, which are not imported
+    with the application.
+    """
+    if WORKER_MODE == "async":
+        importlib.import_module("github_tests_validator_app.lib.connectors.async_github_client")
+    if SQLALCHEMY_URI.startswith("bigquery"):
+        importlib.import_module("google.cloud.bigquery")
+
+
+# What the first events would otherwise wait for, checked before the instance is ready.
+prewarm_checks: Dict[str, Callable[[], Any]] = {
+    "imports": import_deferred_modules,
+    "database": ping_db,
+    "github_app": lambda: token_cache.get_integration().get_app(),
+    "job_queue": job_queue.warm_up,
+}
+
+
+def prewarm() -> None:
+    """
+    Open a database connection, authenticate as the GitHub App and start the worker
+    processes, recording the outcome of each check.
+    """
+    start = time.monotonic()
+    for name, check in prewarm_checks.items():
+        try:
+            check()
+            server_state.checks[name] = "ok"
+        except Exception as e:
+            logging.error(f"[ERROR]: pre-warming {name} failed: {e}")
+            server_state.checks[name] = f"error: {e}"
+    server_state.warmup_seconds = time.monotonic() - start
+    logging.info(f"Pre-warmed in {server_state.warmup_seconds:.2f}s: {server_state.checks}")
+
+
+WEBHOOK_DELIVERIES = registry.counter(
+    "github_app_webhook_deliveries_total",
+    "Webhook deliveries received, by X-GitHub-Event header and outcome.",
+    ("event", "outcome"),
+)
+
+
+def get_stats() -> Dict[str, Any]:
+    return {
+        "queue": job_queue.stats(),
+        "deduplication": event_deduplicator.stats(),
+        "coalescing": event_coalescer.stats(),
+        "db_pool": get_pool_stats(),
+        "github_tokens": token_cache.stats(),
+        "github_rate_limit": rate_limiter.stats(),
+        "folder_hash_cache": folder_hash_cache.stats(),
+        "bigquery_batches": get_detail_batcher_stats(),
+        "server": server_state.stats(),
+    }
+
+
+def collect_stats_metrics() -> List[Metric]:
+    """
+    Gauges of the components reported by /stats, read when the metrics are scraped.
+    """
+    stats = get_stats()
+    budgets = stats.pop("github_rate_limit")
+    metrics: List[Metric] = []
+    for budget_key in ["remaining", "limit", "reset_in_seconds", "throttled", "throttled_seconds"]:
+        gauge = Gauge(
+            f"github_app_github_rate_limit_{budget_key}",
+            f"GitHub API budget {budget_key.replace('_', ' ')}, by installation.",
+            ("budget",),
+        )
+        for budget, budget_stats in budgets.items():
+            gauge.set(budget_stats[budget_key], budget=budget)
+        metrics.append(gauge)
+    for component, component_stats in stats.items():
+        metrics.extend(gauges_from_stats(f"github_app_{component}", component_stats))
+    return metrics
+
+
+registry.add_collector(collect_stats_metrics)
+
+
+def create_tables() -> None:
+    try:
+        init_db()
+    except:
+        logging.error(traceback.format_exc())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    if not webhook_secret:
+        if not GH_ALLOW_UNSIGNED_WEBHOOKS:
+            raise RuntimeError(
+                "GH_WEBHOOK_SECRET is not set: set it, or set GH_ALLOW_UNSIGNED_WEBHOOKS to "
+                "true to accept webhooks without verifying their signature."
+            )
+        logging.warning("GH_WEBHOOK_SECRET is not set, webhook signatures are not verified.")
+    if SQL_CREATE_TABLES_ON_STARTUP:
+        create_tables()
+    setup_tracing()
+    job_queue.start()
+    if SERVER_PREWARM:
+        # The server listens meanwhile, /readyz answers 503 until it is done.
+        threading.Thread(target=prewarm, name="prewarm", daemon=True).start()
+    else:
+        server_state.warmup_seconds = 0.0
+    yield
+    server_state.draining = True
+    # Workflow runs waiting for more jobs are queued before draining.
+    event_coalescer.flush()
+    job_queue.stop(timeout=WORKER_SHUTDOWN_TIMEOUT)
+    # Write the test results still buffered by the events processed above.
+    stop_detail_batcher()
+    stop_tracing()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.post("/")
-async def main(request: Request) -> None:
+async def main(request: Request) -> Response:
+    body = await request.body()
+    event_name = request.headers.get("X-GitHub-Event")
+    # Headers are not trusted yet, unknown events share a label.
+    event = event_name if event_name in ACCEPTED_EVENT_ACTIONS else "other"
+    if webhook_secret and not verify_signature(
+        body, request.headers.get("X-Hub-Signature-256"), webhook_secret
+    ):
+        WEBHOOK_DELIVERIES.inc(event=event, outcome="unauthorized")
+        return Response(status_code=401)
+    outcome: Union[str, None] = None
     try:
-        payload = await request.json()
-        run(payload)
+        # Most deliveries are dropped here, before decoding them.
+        if not accept_event(event_name, body):
+            outcome = "ignored"
+            return Response(status_code=202)
+        delivery_id = request.headers.get("X-GitHub-Delivery")
+        # The jobs of the delivery continue this trace.
+        with start_span("webhook", {"github.event": event, "github.delivery": delivery_id}):
+            payload = decode_payload(body)
+            submitted = dispatch(payload, delivery_id, job_queue.submit)
+        outcome = "submitted" if submitted else "skipped"
+    except queue.Full:
+        logging.error("Job queue is full, rejecting the event.")
+        outcome = "queue_full"
+        return Response(status_code=503, headers={"Retry-After": "10"})
     except:
+        outcome = "error"
         formatted_exception = traceback.format_exc()
         logging.error(formatted_exception)
+    finally:
+        WEBHOOK_DELIVERIES.inc(event=event, outcome=outcome)
+    return Response(status_code=202)
+
+
+@app.get("/stats")
+async def stats() -> Dict[str, Any]:
+    return get_stats()
+
+
+@app.get("/healthz")
+async def healthz() -> JSONResponse:
+    """
+    Liveness: the process answers and its background workers are running.
+    """
+    alive = job_queue.alive()
+    return JSONResponse(
+        {"status": "ok" if alive else "workers_stopped"}, status_code=200 if alive else 503
+    )
+
+
+@app.get("/readyz")
+async def readyz() -> JSONResponse:
+    """
+    Readiness: the instance is warmed up and accepts events, not while draining.
+    """
+    state = server_state.stats()
+    ready = state["ready"] and job_queue.running
+    return JSONResponse(state, status_code=200 if ready else 503)
+
+
+@app.get("/metrics")
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+def get_server_workers(workers: int = SERVER_WORKERS) -> int:
+    return workers if workers > 0 else os.cpu_count() or 1
 
 
 def launch_app():
+    workers = get_server_workers()
+    if workers > 1 and SQL_CREATE_TABLES_ON_STARTUP:
+        # The tables are created once before the server processes are started, instead of
+        # by all of them at the same time.
+        create_tables()
+        os.environ["SQL_CREATE_TABLES_ON_STARTUP"] = "false"
     uvicorn.run(
-        app,
+        # Worker processes import the application themselves.
+        "github_tests_validator_app.bin.github_app_backend:app" if workers > 1 else app,
         host="0.0.0.0",  # nosec B104
         port=int(os.environ.get("PORT", 8080)),
         log_level="info",
+        workers=workers,
+        timeout_graceful_shutdown=int(SERVER_GRACEFUL_TIMEOUT),
     )
@@ -0,0 +1,250 @@
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import json
+import logging
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import typer
+from github import UnknownObjectException, WorkflowRun
+from github.GithubObject import NotSet
+from github_tests_validator_app.bin.github_event_process import run
+from github_tests_validator_app.lib.connectors.bigquery_batcher import stop_detail_batcher
+from github_tests_validator_app.lib.connectors.github_client import GitHubConnector
+from github_tests_validator_app.lib.connectors.github_token_cache import token_cache
+from github_tests_validator_app.lib.connectors.rate_limiter import rate_limiter
+
+DATE_FORMATS = ["%Y-%m-%d", "%Y-%m-%dT%H:%M:%S"]
+
+
+class BackfillCheckpoint:
+    """
+    Workflow runs already re-ingested, appended to a JSON lines file as they are done so
+    that an interrupted backfill resumes where it stopped. Failed runs are retried.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self.done: Set[str] = set()
+        if path.exists():
+            with path.open() as lines:
+                for line in lines:
+                    if line.strip():
+                        record = json.loads(line)
+                        if record["status"] == "done":
+                            self.done.add(record["key"])
+                        else:
+                            self.done.discard(record["key"])
+
+    def mark(self, key: str, status: str) -> None:
+        with self._lock:
+            with self.path.open("a") as lines:
+                lines.write(json.dumps({"key": key, "status": status}) + "\n")
+            if status == "done":
+                self.done.add(key)
+
+
+def get_run_key(payload: Dict[str, Any]) -> str:
+    return f"{payload['repository']['full_name']}:{payload['workflow_job']['run_id']}"
+
+
+def get_installations() -> Dict[str, int]:
+    """
+    Installation id of the GitHub App by account login.
+    """
+    return {
+        installation.account.login.lower(): installation.id
+        for installation in token_cache.get_integration().get_installations()
+    }
+
+
+def get_repository_connector(repository: str, branch: Optional[str] = None) -> GitHubConnector:
+    """
+    Connector to `repository` on `branch`, by default on the default branch of the repository.
+    """
+    connector = GitHubConnector(
+        {"organization_or_user": repository.split("/")[0]}, repository, branch or "main"
+    )
+    if not branch:
+        # The default branch is only known once the repository is fetched.
+        connector.BRANCH_NAME = connector.repo.default_branch
+    return connector
+
+
+def list_forks(reference_repo: str) -> List[str]:
+    connector = get_repository_connector(reference_repo)
+    rate_limiter.throttle(connector.ACCESS_TOKEN)
+    forks = [fork.full_name for fork in connector.repo.get_forks()]
+    connector.observe_rate_limit()
+    return forks
+
+
+def get_backfill_payload(
+    workflow_run: WorkflowRun.WorkflowRun, repository: str, installation_id: int
+) -> Dict[str, Any]:
+    """
+    workflow_job event payload of a past workflow run, with what `run` reads from it.
+    """
+    actor = workflow_run.actor
+    return {
+        "action": "completed",
+        "workflow_job": {
+            "run_id": workflow_run.id,
+            "run_attempt": workflow_run.run_attempt,
+            "head_sha": workflow_run.head_sha,
+            "head_branch": workflow_run.head_branch,
+        },
+        "repository": {"full_name": repository},
+        "sender": {"login": actor.login, "id": actor.id, "url": actor.url},
+        "installation": {"id": installation_id},
+    }
+
+
+def list_workflow_runs(
+    repository: str,
+    installation_id: int,
+    workflow: str,
+    since: datetime,
+    until: datetime,
+    branch: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Completed runs of the validation workflow, `workflow` being its file name or id, on
+    every branch or only on `branch`.
+    """
+    token_cache.remember_installation(repository, installation_id)
+    connector = get_repository_connector(repository, branch)
+    rate_limiter.throttle(connector.ACCESS_TOKEN)
+    try:
+        workflow_runs = connector.repo.get_workflow(workflow).get_runs(
+            status="completed",
+            created=f"{since.isoformat()}..{until.isoformat()}",
+            branch=branch or NotSet,
+        )
+        payloads = [
+            get_backfill_payload(workflow_run, repository, installation_id)
+            for workflow_run in workflow_runs
+        ]
+    except UnknownObjectException:
+        logging.warning(f"No workflow {workflow} in {repository}.")
+        payloads = []
+    connector.observe_rate_limit()
+    return payloads
+
+
+def map_with_progress(
+    function: Callable[..., Any], items: List[Any], workers: int, label: str
+) -> Dict[int, Any]:
+    """
+    Call `function` on every item from a pool of `workers` threads, showing the progress.
+
+    Returns:
+        Dict[int, Any]: result of each item by index, the exception it raised if it failed
+    """
+    results: Dict[int, Any] = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor, typer.progressbar(
+        length=len(items), label=label
+    ) as progress:
+        futures = {executor.submit(function, item): index for index, item in enumerate(items)}
+        for future in as_completed(futures):
+            exception = future.exception()
+            results[futures[future]] = exception if exception else future.result()
+            progress.update(1)
+    return results
+
+
+def reprocess(
+    payloads: List[Dict[str, Any]], checkpoint: BackfillCheckpoint, workers: int
+) -> Dict[str, int]:
+    """
+    Re-ingest workflow runs through the webhook processing, skipping the ones already done.
+    """
+
+    def process(payload: Dict[str, Any]) -> None:
+        key = get_run_key(payload)
+        try:
+            run(payload)
+        except Exception:
+            logging.error(f"[ERROR]: cannot re-ingest {key}: {traceback.format_exc()}")
+            checkpoint.mark(key, "failed")
+            raise
+        checkpoint.mark(key, "done")
+
+    pending = [payload for payload in payloads if get_run_key(payload) not in checkpoint.done]
+    results = map_with_progress(process, pending, workers, "Re-ingesting workflow runs")
+    failed = sum(isinstance(result, Exception) for result in results.values())
+    return {
+        "done": len(pending) - failed,
+        "failed": failed,
+        "skipped": len(payloads) - len(pending),
+    }
+
+
+def backfill(
+    reference_repo: str = typer.Argument(..., help="Repository forked by the students."),
+    workflow: str = typer.Option(
+        ..., help="File name of the workflow running the tests, such as tests.yml."
+    ),
+    since: datetime = typer.Option(..., formats=DATE_FORMATS, help="Runs created from."),
+    until: Optional[datetime] = typer.Option(
+        None, formats=DATE_FORMATS, help="Runs created until, defaults to now."
+    ),
+    branch: Optional[str] = typer.Option(
+        None, help="Only re-ingest the runs of this branch, defaults to every branch."
+    ),
+    workers: int = typer.Option(8, min=1, help="Workflow runs processed at the same time."),
+    checkpoint: Path = typer.Option(
+        Path("backfill_checkpoint.jsonl"), help="Progress file, to resume a backfill."
+    ),
+    dry_run: bool = typer.Option(False, help="Only list the workflow runs."),
+) -> None:
+    """
+    Re-ingest the test results of the workflow runs of the forks of a repository where the
+    GitHub App is installed, for instance after an outage.
+    """
+    until = until or datetime.now()
+    start = time.monotonic()
+    installations = get_installations()
+    forks = [
+        (fork, installations[fork.split("/")[0].lower()])
+        for fork in list_forks(reference_repo)
+        if fork.split("/")[0].lower() in installations
+    ]
+    typer.echo(f"{len(forks)} forks of {reference_repo} have installed the GitHub App.")
+
+    listed = map_with_progress(
+        lambda fork: list_workflow_runs(fork[0], fork[1], workflow, since, until, branch),
+        forks,
+        workers,
+        "Listing workflow runs",
+    )
+    payloads = []
+    for index, result in sorted(listed.items()):
+        if isinstance(result, Exception):
+            typer.echo(f"Cannot list the workflow runs of {forks[index][0]}: {result}", err=True)
+        else:
+            payloads.extend(result)
+    typer.echo(f"{len(payloads)} runs of {workflow} between {since} and {until}.")
+    if dry_run:
+        return
+
+    try:
+        counts = reprocess(payloads, BackfillCheckpoint(checkpoint), workers)
+    finally:
+        # Write the test results still buffered.
+        stop_detail_batcher()
+    typer.echo(
+        f"{counts['done']} workflow runs re-ingested, {counts['failed']} failed, "
+        f"{counts['skipped']} already done, in {time.monotonic() - start:.0f}s."
+    )
+    if counts["failed"]:
+        raise typer.Exit(code=1)
+
+
+def launch_backfill() -> None:
+    typer.run(backfill)
@@ -0,0 +1,8 @@
+from github_tests_validator_app.lib.connectors.sqlalchemy_client import init_db
+
+
+def migrate() -> None:
+    """
+    Create the database tables used by the GitHub App.
+    """
+    init_db()
@@ -1,18 +1,52 @@
-from typing import Any, Dict, List
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, NamedTuple, Union
 
+import asyncio
+import json
 import logging
+import queue
+import re
+import threading
+import time
+import traceback
+from contextvars import Context, copy_context
 
 from github_tests_validator_app.bin.github_repo_validation import (
     get_event,
     get_user_github_connector,
+    get_user_github_connector_async,
     validate_github_repo,
+    validate_github_repo_async,
 )
 from github_tests_validator_app.bin.user_pytest_summaries_validation import (
     send_user_pytest_summaries,
+    send_user_pytest_summaries_async,
+)
+from github_tests_validator_app.config import (
+    ACCEPTED_EVENT_ACTIONS,
+    EVENT_COALESCE_MAX_DELAY,
+    EVENT_COALESCE_WINDOW,
+    WORKER_MODE,
 )
 from github_tests_validator_app.lib.connectors.sqlalchemy_client import SQLAlchemyConnector, User
+from github_tests_validator_app.lib.deduplication import (
+    EventDeduplicator,
+    get_delivery_keys,
+    get_event_keys,
+    get_workflow_run_keys,
+)
+from github_tests_validator_app.lib.metrics import current_event, registry, track_stage
+from github_tests_validator_app.lib.tracing import start_span
 from github_tests_validator_app.lib.utils import init_github_user_from_github_event
 
+# orjson when the "speedups" extra is installed.
+json_loads: Callable[[Union[str, bytes]], Any]
+try:
+    import orjson
+
+    json_loads = orjson.loads
+except ImportError:  # pragma: no cover
+    json_loads = json.loads
+
 process = {
     "pull_request": validate_github_repo,
     # "pusher": validate_github_repo,
@@ -21,18 +55,237 @@ process = {
 }
 
 
+async def skip_event(*args: Any) -> None:
+    pass
+
+
+process_async: Dict[str, Callable[..., Awaitable[Any]]] = {
+    "pull_request": validate_github_repo_async,
+    "pusher": skip_event,
+    "workflow_job": send_user_pytest_summaries_async,
+}
+
+# GitHub sends the action as the first key of the payload.
+ACTION_PATTERN = re.compile(rb'\A\s*\{\s*"action"\s*:\s*"([^"\\]*)"')
+
+EVENTS_PROCESSED = registry.counter(
+    "github_app_events_processed_total",
+    "Events processed by the workers, by event and status.",
+    ("event", "status"),
+)
+
+
+class PendingEvent(NamedTuple):
+    payload: Dict[str, Any]
+    callback: Callable[[Dict[str, Any], List[str]], Any]
+    first_seen: float
+    timer: threading.Timer
+    context: Context
+    claimed: List[str]
+
+
+class EventCoalescer:
+    """
+    Debounce events sharing a key: `callback` is called once with the last event of a key
+    and the deduplication keys claimed by all of them, when no other event of that key has
+    arrived for `window` seconds, and at most `max_delay` seconds after the first one. It
+    runs in the context the last event was added in, so that it belongs to the trace of its
+    delivery. When the job queue is full, the event is fired again `retry_delay` seconds
+    later rather than dropped, its deliveries having already been acknowledged.
+    """
+
+    def __init__(
+        self,
+        window: float = EVENT_COALESCE_WINDOW,
+        max_delay: float = EVENT_COALESCE_MAX_DELAY,
+        retry_delay: float = 10,
+    ) -> None:
+        self.window = window
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, PendingEvent] = {}
+        self.coalesced = 0
+        self.fired = 0
+
+    def add(
+        self,
+        key: Hashable,
+        payload: Dict[str, Any],
+        callback: Callable[[Dict[str, Any], List[str]], Any],
+        claimed: Union[List[str], None] = None,
+    ) -> None:
+        with self._lock:
+            now = time.monotonic()
+            pending = self._pending.get(key)
+            first_seen = now
+            claimed = list(claimed or [])
+            if pending:
+                pending.timer.cancel()
+                first_seen = pending.first_seen
+                claimed = pending.claimed + claimed
+                self.coalesced += 1
+            delay = max(0.0, min(self.window, first_seen + self.max_delay - now))
+            self._schedule(key, payload, callback, first_seen, copy_context(), claimed, delay)
+
+    def flush(self) -> None:
+        """
+        Fire every pending event right away, meant to be called before shutting down.
+        """
+        with self._lock:
+            keys = list(self._pending)
+        for key in keys:
+            self._fire(key, retry=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"pending": len(self._pending), "coalesced": self.coalesced, "fired": self.fired}
+
+    def _schedule(
+        self,
+        key: Hashable,
+        payload: Dict[str, Any],
+        callback: Callable[[Dict[str, Any], List[str]], Any],
+        first_seen: float,
+        context: Context,
+        claimed: List[str],
+        delay: float,
+    ) -> None:
+        timer = threading.Timer(delay, self._fire, args=(key,))
+        timer.daemon = True
+        self._pending[key] = PendingEvent(payload, callback, first_seen, timer, context, claimed)
+        timer.start()
+
+    def _fire(self, key: Hashable, retry: bool = True) -> None:
+        with self._lock:
+            pending = self._pending.pop(key, None)
+            if pending is None:
+                return
+            pending.timer.cancel()
+            self.fired += 1
+        try:
+            pending.context.run(pending.callback, pending.payload, pending.claimed)
+        except queue.Full:
+            if not retry:
+                logging.error(f"[ERROR]: job queue is full, dropping the event {key}.")
+                return
+            logging.warning(f"Job queue is full, retrying the event {key} in {self.retry_delay}s.")
+            with self._lock:
+                newer = self._pending.get(key)
+                if newer:
+                    # A later event of the key fires instead, with the deliveries of both.
+                    self._pending[key] = newer._replace(claimed=pending.claimed + newer.claimed)
+                else:
+                    self._schedule(
+                        key,
+                        pending.payload,
+                        pending.callback,
+                        pending.first_seen,
+                        pending.context,
+                        pending.claimed,
+                        self.retry_delay,
+                    )
+        except Exception:
+            logging.error(traceback.format_exc())
+
+
+event_deduplicator = EventDeduplicator()
+event_coalescer = EventCoalescer()
+
+
 def handle_process(payload: Dict[str, Any]) -> str:
     # Get event
     event: str = get_event(payload)
     if (
-        not event
-        or (event == "pull_request" and payload["action"] not in ["reopened", "opened"])
-        or (event == "workflow_job" and payload["action"] not in ["completed"])
+        event not in ACCEPTED_EVENT_ACTIONS
+        or payload.get("action") not in ACCEPTED_EVENT_ACTIONS[event]
     ):
         return ""
     return event
 
 
+def accept_event(event_name: Union[str, None], body: bytes) -> bool:
+    """
+    Tell from the X-GitHub-Event header and the action at the start of the raw body whether
+    an event may be processed, without decoding it. Events that cannot be told apart this
+    way are accepted and filtered by `handle_process` once decoded.
+    """
+    if not event_name:
+        return True
+    if event_name not in ACCEPTED_EVENT_ACTIONS:
+        return False
+    match = ACTION_PATTERN.match(body)
+    return not match or match.group(1).decode() in ACCEPTED_EVENT_ACTIONS[event_name]
+
+
+def decode_payload(body: bytes) -> Dict[str, Any]:
+    payload: Dict[str, Any] = json_loads(body)
+    return payload
+
+
+def dispatch(
+    payload: Dict[str, Any], delivery_id: Union[str, None], submit: Callable[..., Any]
+) -> bool:
+    """
+    Hand a webhook event over to `submit` unless it is ignored or a duplicate.
+
+    Args:
+        payload (Dict[str, Any]): information of new event
+        delivery_id (Union[str, None]): X-GitHub-Delivery header of the webhook
+        submit (Callable[..., Any]): job queue submit function
+
+    Returns:
+        bool: True if the event has been submitted, or is waiting for the other jobs
+            of its workflow run
+    """
+    event = handle_process(payload)
+    if not event:
+        return False
+    if event != "workflow_job" or event_coalescer.window <= 0:
+        return submit_event(payload, get_event_keys(payload, delivery_id), submit)
+
+    delivery_keys = get_delivery_keys(delivery_id)
+    if not event_deduplicator.claim(delivery_keys):
+        logging.info(f"Skipping duplicate event: {', '.join(delivery_keys)}.")
+        return False
+    # The jobs of a workflow run are processed once, after the last one completes.
+    event_coalescer.add(
+        (
+            payload["repository"]["full_name"],
+            payload["workflow_job"]["run_id"],
+            payload["workflow_job"].get("run_attempt", 1),
+        ),
+        payload,
+        lambda last, claimed: submit_event(last, get_workflow_run_keys(last), submit, claimed),
+        delivery_keys,
+    )
+    return True
+
+
+def submit_event(
+    payload: Dict[str, Any],
+    keys: List[str],
+    submit: Callable[..., Any],
+    claimed: Union[List[str], None] = None,
+) -> bool:
+    """
+    Claim the keys of an event and submit it, `claimed` being keys already claimed for it,
+    such as the deliveries of a coalesced workflow run. All of them are released if the
+    event is rejected or fails, so that it can be redelivered.
+    """
+    if not event_deduplicator.claim(keys):
+        logging.info(f"Skipping duplicate event: {', '.join(keys)}.")
+        return False
+    release_keys = keys + (claimed or [])
+    try:
+        job = run_async if WORKER_MODE == "async" else run
+        submit(job, payload, on_error=lambda: event_deduplicator.release(release_keys))
+    except queue.Full:
+        event_deduplicator.release(release_keys)
+        raise
+    return True
+
+
 def run(payload: Dict[str, Any]) -> None:
     """
     Validator function
@@ -55,6 +308,28 @@ def run(payload: Dict[str, Any]) -> None:
         return
     logging.info("Connecting to the database...")
     sql_client = SQLAlchemyConnector()
+    token = current_event.set(event)
+    attributes = {
+        "github.event": event,
+        "github.repository": payload.get("repository", {}).get("full_name"),
+        "github.run_id": payload.get("workflow_job", {}).get("run_id"),
+    }
+    try:
+        # All the writes of the event are sent together when it has been processed.
+        with start_span("run", attributes), track_stage("event"), sql_client.unit_of_work():
+            process_event(sql_client, user_data, payload, event)
+    except Exception:
+        EVENTS_PROCESSED.inc(event=event, status="failure")
+        raise
+    else:
+        EVENTS_PROCESSED.inc(event=event, status="success")
+    finally:
+        current_event.reset(token)
+
+
+def process_event(
+    sql_client: SQLAlchemyConnector, user_data: Dict[str, Any], payload: Dict[str, Any], event: str
+) -> None:
     try:
         sql_client.add_new_user(user_data)
     except Exception as e:
@@ -76,4 +351,63 @@ def run(payload: Dict[str, Any]) -> None:
     logging.info(f'Begin process: "{event}"...')
     # Run the process
     process[event](user_github_connector, sql_client, payload, event)
-    logging.info(f'End of process: "{event}".')
\ No newline at end of file
+    logging.info(f'End of process: "{event}".')
+
+
+async def run_async(payload: Dict[str, Any]) -> None:
+    """
+    Asyncio counterpart of `run`: the GitHub requests of many events can be in flight from
+    a single thread, the database being written from a thread once the event is processed.
+
+    Args:
+        payload (Dict[str, Any]): information of new event
+    """
+    event = handle_process(payload)
+    if not event:
+        return
+    user_data = init_github_user_from_github_event(payload)
+    if not isinstance(user_data, dict):
+        return
+    sql_client = SQLAlchemyConnector()
+    token = current_event.set(event)
+    attributes = {
+        "github.event": event,
+        "github.repository": payload.get("repository", {}).get("full_name"),
+        "github.run_id": payload.get("workflow_job", {}).get("run_id"),
+    }
+    try:
+        with start_span("run", attributes), track_stage("event"), sql_client.unit_of_work():
+            await process_event_async(sql_client, user_data, payload, event)
+            await asyncio.to_thread(sql_client.flush)
+    except Exception:
+        EVENTS_PROCESSED.inc(event=event, status="failure")
+        raise
+    else:
+        EVENTS_PROCESSED.inc(event=event, status="success")
+    finally:
+        current_event.reset(token)
+
+
+async def process_event_async(
+    sql_client: SQLAlchemyConnector, user_data: Dict[str, Any], payload: Dict[str, Any], event: str
+) -> None:
+    try:
+        sql_client.add_new_user(user_data)
+    except Exception as e:
+        logging.error(f"[ERROR]: {e}")
+
+    user_github_connector = await get_user_github_connector_async(user_data, payload)
+    if not user_github_connector:
+        sql_client.add_new_repository_validation(
+            user_data,
+            False,
+            payload,
+            event,
+            "[ERROR]: cannot get the user github repository.",
+        )
+        logging.error("[ERROR]: cannot get the user github repository.")
+        return
+
+    logging.info(f'Begin process: "{event}"...')
+    await process_async[event](user_github_connector, sql_client, payload, event)
+    logging.info(f'End of process: "{event}".')
@@ -1,18 +1,39 @@
-from typing import Any, Dict, List, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple, Union, cast
 
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from github import ContentFile
 from github_tests_validator_app.config import (
+    FOLDER_HASH_CACHE_SIZE,
+    FOLDER_HASH_CACHE_SQL,
+    FOLDER_HASH_CACHE_TTL,
+    GH_FOLDER_FETCH_MODE,
     GH_PAT,
     GH_WORKFLOWS_FOLDER_NAME,
+    VALIDATION_CACHE_SIZE,
+    VALIDATION_CACHE_TTL,
     commit_ref_path,
     default_message,
 )
 
 
+from github_tests_validator_app.lib.cache import TTLCache
 from github_tests_validator_app.lib.connectors.github_client import GitHubConnector
+from github_tests_validator_app.lib.connectors.github_token_cache import token_cache
 from github_tests_validator_app.lib.connectors.sqlalchemy_client import SQLAlchemyConnector, User
+from github_tests_validator_app.lib.metrics import track_stage
+from github_tests_validator_app.lib.tracing import traced
+from github_tests_validator_app.lib.utils import get_hash_tree_elements, submit_with_context
+
+if TYPE_CHECKING:
+    # httpx is only imported by the workers in async mode.
+    from github_tests_validator_app.lib.connectors.async_github_client import AsyncGitHubConnector
+
+folder_hash_cache = TTLCache(max_size=FOLDER_HASH_CACHE_SIZE, ttl=FOLDER_HASH_CACHE_TTL)
+# Verdicts keyed by (repository, head sha, parent repository, parent sha)
+validation_cache = TTLCache(max_size=VALIDATION_CACHE_SIZE, ttl=VALIDATION_CACHE_TTL)
 
 
 def get_event(payload: Dict[str, Any]) -> str:
@@ -44,6 +65,21 @@ def get_user_branch(payload: Dict[str, Any], trigger: Union[str, None] = None) -
     return branch
 
 
+def get_head_sha(payload: Dict[str, Any], event: str) -> Union[str, None]:
+    """
+    Commit of the repository the event is about, if it is known.
+    """
+    if event == "workflow_job":
+        return cast(Union[str, None], payload["workflow_job"].get("head_sha"))
+    if event == "pull_request":
+        head = payload["pull_request"]["head"]
+        # The head of a pull request may live in another fork.
+        if head.get("repo") and head["repo"]["full_name"] == payload["repository"]["full_name"]:
+            return cast(Union[str, None], head.get("sha"))
+    return None
+
+
+@traced()
 def get_user_github_connector(
     user_data: Dict[str, Any], payload: Dict[str, Any]
 ) -> Union[GitHubConnector, None]:
@@ -57,29 +93,236 @@ def get_user_github_connector(
     if github_user_branch is None:
         return None
 
+    if "installation" in payload:
+        # The event already tells which installation the repository belongs to.
+        token_cache.remember_installation(
+            payload["repository"]["full_name"], payload["installation"]["id"]
+        )
+
     return GitHubConnector(user_data, payload["repository"]["full_name"], github_user_branch)
 
 
+@traced()
+async def get_user_github_connector_async(
+    user_data: Dict[str, Any], payload: Dict[str, Any]
+) -> Union["AsyncGitHubConnector", None]:
+    from github_tests_validator_app.lib.connectors.async_github_client import AsyncGitHubConnector
+
+    if not user_data or get_user_branch(payload) is None:
+        return None
+
+    if "installation" in payload:
+        token_cache.remember_installation(
+            payload["repository"]["full_name"], payload["installation"]["id"]
+        )
+
+    return await AsyncGitHubConnector.create(user_data, payload["repository"]["full_name"], "main")
+
+
+@traced()
+def get_reference_folder_hash(
+    solution_repo: GitHubConnector,
+    folder: str,
+    sql_client: Union[SQLAlchemyConnector, None] = None,
+    commit_sha: Union[str, None] = None,
+) -> str:
+    """
+    Hash a folder of the reference repository, once per commit.
+
+    Many forks are validated against the same reference commit, so the hash is cached in
+    memory and, with FOLDER_HASH_CACHE_SQL, in the database shared by all instances.
+    """
+    commit_sha = commit_sha or solution_repo.get_last_hash_commit()
+    key = (solution_repo.REPO_NAME, commit_sha, folder, GH_FOLDER_FETCH_MODE)
+    folder_hash = folder_hash_cache.get(key)
+    if folder_hash:
+        logging.info(f"Reference hash of {folder} at {commit_sha} found in cache.")
+        return str(folder_hash)
+
+    if sql_client and FOLDER_HASH_CACHE_SQL:
+        folder_hash = sql_client.get_folder_hash(*key)
+
+    if not folder_hash:
+        if GH_FOLDER_FETCH_MODE == "tree":
+            folder_hash = solution_repo.get_tree_hash(folder, commit_sha)
+        else:
+            folder_hash = solution_repo.get_hash(folder, commit_sha)
+        if sql_client and FOLDER_HASH_CACHE_SQL:
+            try:
+                sql_client.add_folder_hash(*key, folder_hash)
+            except Exception as e:
+                logging.error(f"[ERROR]: {e}")
+
+    folder_hash_cache.set(key, folder_hash)
+    return str(folder_hash)
+
+
+@traced()
+async def get_reference_folder_hash_async(
+    solution_repo: "AsyncGitHubConnector",
+    folder: str,
+    sql_client: Union[SQLAlchemyConnector, None] = None,
+    commit_sha: Union[str, None] = None,
+) -> str:
+    """
+    Asyncio counterpart of `get_reference_folder_hash`, sharing its caches. The database
+    is queried from a thread, so that the event loop is not blocked.
+    """
+    commit_sha = commit_sha or await solution_repo.get_last_hash_commit()
+    key = (solution_repo.REPO_NAME, commit_sha, folder, GH_FOLDER_FETCH_MODE)
+    folder_hash = folder_hash_cache.get(key)
+    if folder_hash:
+        logging.info(f"Reference hash of {folder} at {commit_sha} found in cache.")
+        return str(folder_hash)
+
+    if sql_client and FOLDER_HASH_CACHE_SQL:
+        folder_hash = await asyncio.to_thread(sql_client.get_folder_hash, *key)
+
+    if not folder_hash:
+        if GH_FOLDER_FETCH_MODE == "tree":
+            folder_hash = await solution_repo.get_tree_hash(folder, commit_sha)
+        else:
+            folder_hash = await solution_repo.get_hash(folder, commit_sha)
+        if sql_client and FOLDER_HASH_CACHE_SQL:
+            try:
+                await asyncio.to_thread(sql_client.add_folder_hash, *key, folder_hash)
+            except Exception as e:
+                logging.error(f"[ERROR]: {e}")
+
+    folder_hash_cache.set(key, folder_hash)
+    return str(folder_hash)
+
+
+@traced()
 def compare_folder(
-    user_github: GitHubConnector, solution_repo: GitHubConnector, folder: str
+    user_github: GitHubConnector,
+    solution_repo: GitHubConnector,
+    folder: str,
+    sql_client: Union[SQLAlchemyConnector, None] = None,
+    user_ref: Union[str, None] = None,
+    solution_ref: Union[str, None] = None,
+) -> Any:
+
+    if GH_FOLDER_FETCH_MODE == "tree":
+        return compare_folder_tree(
+            user_github, solution_repo, folder, sql_client, user_ref, solution_ref
+        )
+
+    logging.info(f"BRANCH NAME: {user_github.BRANCH_NAME}")
+    # The reference side is hashed in the background while the user side is fetched.
+    executor = ThreadPoolExecutor(max_workers=1)
+    solution_future = submit_with_context(
+        executor, get_reference_folder_hash, solution_repo, folder, sql_client, solution_ref
+    )
+    try:
+        user_contents = user_github.repo.get_contents(
+            folder, ref=user_ref or user_github.BRANCH_NAME
+        )
+
+        if isinstance(user_contents, ContentFile.ContentFile) and user_contents.type == "submodule":
+            solution_last_commit = solution_ref or solution_repo.get_last_hash_commit()
+            user_commit = user_contents.sha
+            return solution_last_commit == user_commit
+
+        user_hash = user_github.get_hash(folder, user_ref)
+        solution_hash = solution_future.result()
+    finally:
+        # A submodule or a missing user folder does not wait for the reference hash.
+        solution_future.cancel()
+        executor.shutdown(wait=False)
+    logging.info(f"user_hash = {user_hash}")
+    logging.info(f"solution_hash = {solution_hash}")
+    logging.info(f"is valid = {user_hash == solution_hash}")
+    return user_hash == solution_hash
+
+
+@traced()
+def compare_folder_tree(
+    user_github: GitHubConnector,
+    solution_repo: GitHubConnector,
+    folder: str,
+    sql_client: Union[SQLAlchemyConnector, None] = None,
+    user_ref: Union[str, None] = None,
+    solution_ref: Union[str, None] = None,
 ) -> Any:
 
     logging.info(f"BRANCH NAME: {user_github.BRANCH_NAME}")
-    user_contents = user_github.repo.get_contents(folder, ref=user_github.BRANCH_NAME)
+    executor = ThreadPoolExecutor(max_workers=1)
+    solution_future = submit_with_context(
+        executor, get_reference_folder_hash, solution_repo, folder, sql_client, solution_ref
+    )
+    try:
+        user_elements = user_github.get_tree_elements(folder, user_ref)
 
-    if isinstance(user_contents, ContentFile.ContentFile) and user_contents.type == "submodule":
-        solution_last_commit = solution_repo.get_last_hash_commit()
-        user_commit = user_contents.sha
-        return solution_last_commit == user_commit
+        if user_elements[0].path == folder.strip("/") and user_elements[0].type == "commit":
+            solution_last_commit = solution_ref or solution_repo.get_last_hash_commit()
+            user_commit = user_elements[0].sha
+            return solution_last_commit == user_commit
 
-    user_hash = user_github.get_hash(folder)
-    solution_hash = solution_repo.get_hash(folder)
+        user_hash = get_hash_tree_elements(user_elements)
+        solution_hash = solution_future.result()
+    finally:
+        solution_future.cancel()
+        executor.shutdown(wait=False)
     logging.info(f"user_hash = {user_hash}")
     logging.info(f"solution_hash = {solution_hash}")
     logging.info(f"is valid = {user_hash == solution_hash}")
     return user_hash == solution_hash
 
 
+@traced()
+async def compare_folder_async(
+    user_github: "AsyncGitHubConnector",
+    solution_repo: "AsyncGitHubConnector",
+    folder: str,
+    sql_client: Union[SQLAlchemyConnector, None] = None,
+    user_ref: Union[str, None] = None,
+    solution_ref: Union[str, None] = None,
+) -> bool:
+    """
+    Asyncio counterpart of `compare_folder` and `compare_folder_tree`, hashing both sides
+    concurrently.
+    """
+    solution_task = asyncio.ensure_future(
+        get_reference_folder_hash_async(solution_repo, folder, sql_client, solution_ref)
+    )
+    # Its error does not matter when the user side fails or is a submodule.
+    solution_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+    try:
+        if GH_FOLDER_FETCH_MODE == "tree":
+            user_elements = await user_github.get_tree_elements(folder, user_ref)
+            user_submodule = (
+                user_elements[0]
+                if user_elements[0].path == folder.strip("/") and user_elements[0].type == "commit"
+                else None
+            )
+            user_commit = user_submodule.sha if user_submodule else None
+        else:
+            user_contents = await user_github.get_contents(folder, user_ref)
+            user_commit = (
+                user_contents["sha"]
+                if isinstance(user_contents, dict) and user_contents["type"] == "submodule"
+                else None
+            )
+
+        if user_commit:
+            solution_last_commit = solution_ref or await solution_repo.get_last_hash_commit()
+            return bool(solution_last_commit == user_commit)
+
+        if GH_FOLDER_FETCH_MODE == "tree":
+            user_hash = get_hash_tree_elements(user_elements)
+        else:
+            user_hash = await user_github.get_hash(folder, user_ref)
+        solution_hash = await solution_task
+    finally:
+        solution_task.cancel()
+    logging.info(f"user_hash = {user_hash}")
+    logging.info(f"solution_hash = {solution_hash}")
+    logging.info(f"is valid = {user_hash == solution_hash}")
+    return user_hash == solution_hash
+
+
+@traced()
 def validate_github_repo(
     user_github_connector: GitHubConnector,
     sql_client: SQLAlchemyConnector,
@@ -114,9 +357,29 @@ def validate_github_repo(
         return
 
 
-    workflows_havent_changed = compare_folder(
-        user_github_connector, original_github_connector, GH_WORKFLOWS_FOLDER_NAME
+    # The verdict only depends on the commits of both repositories.
+    head_sha = get_head_sha(payload, event)
+    parent_sha = original_github_connector.get_last_hash_commit()
+    validation_key = (
+        (user_github_connector.REPO_NAME, head_sha, original_repo_name, parent_sha)
+        if head_sha
+        else None
+    )
+    workflows_havent_changed = (
+        get_known_validation(validation_key, sql_client) if validation_key else None
     )
+    if workflows_havent_changed is None:
+        with track_stage("folder_hash"):
+            workflows_havent_changed = compare_folder(
+                user_github_connector,
+                original_github_connector,
+                GH_WORKFLOWS_FOLDER_NAME,
+                sql_client,
+                user_ref=head_sha,
+                solution_ref=parent_sha,
+            )
+        if validation_key:
+            validation_cache.set(validation_key, workflows_havent_changed)
 
 
     workflows_conclusion = "success" if workflows_havent_changed else "failure"
@@ -132,7 +395,91 @@ def validate_github_repo(
         payload,
         event,
         workflows_message,
+        head_sha=head_sha,
+        parent_repository=original_repo_name,
+        parent_sha=parent_sha,
     )
     
     return workflows_havent_changed
+
+
+@traced()
+async def validate_github_repo_async(
+    user_github_connector: "AsyncGitHubConnector",
+    sql_client: SQLAlchemyConnector,
+    payload: Dict[str, Any],
+    event: str,
+) -> bool:
+    """
+    Asyncio counterpart of `validate_github_repo`.
+    """
+    from github_tests_validator_app.lib.connectors.async_github_client import AsyncGitHubConnector
+
+    original_repo_name = user_github_connector.parent_full_name or user_github_connector.REPO_NAME
+    logging.info(f"Connecting to ORIGINAL repo : {original_repo_name}")
+    original_github_connector = await AsyncGitHubConnector.create(
+        user_data=user_github_connector.user_data,
+        repo_name=original_repo_name,
+        branch_name="main",
+    )
+
+    head_sha = get_head_sha(payload, event)
+    parent_sha = await original_github_connector.get_last_hash_commit()
+    validation_key = (
+        (user_github_connector.REPO_NAME, head_sha, original_repo_name, parent_sha)
+        if head_sha
+        else None
+    )
+    workflows_havent_changed = (
+        await asyncio.to_thread(get_known_validation, validation_key, sql_client)
+        if validation_key
+        else None
+    )
+    if workflows_havent_changed is None:
+        with track_stage("folder_hash"):
+            workflows_havent_changed = await compare_folder_async(
+                user_github_connector,
+                original_github_connector,
+                GH_WORKFLOWS_FOLDER_NAME,
+                sql_client,
+                user_ref=head_sha,
+                solution_ref=parent_sha,
+            )
+        if validation_key:
+            validation_cache.set(validation_key, workflows_havent_changed)
+
+    logging.info(f"Workflows conclusion: {'success' if workflows_havent_changed else 'failure'}")
+    sql_client.add_new_repository_validation(
+        user_github_connector.user_data,
+        workflows_havent_changed,
+        payload,
+        event,
+        default_message["valid_repository"]["workflows"][str(workflows_havent_changed)],
+        head_sha=head_sha,
+        parent_repository=original_repo_name,
+        parent_sha=parent_sha,
+    )
+    return workflows_havent_changed
+
+
+def get_known_validation(
+    validation_key: Tuple[str, str, str, str], sql_client: SQLAlchemyConnector
+) -> Union[bool, None]:
+    """
+    Verdict already computed for the same commits, by this instance or recorded in the
+    repository_validation table, for instance while processing the pull request.
+    """
+    workflows_havent_changed: Union[bool, None] = validation_cache.get(validation_key)
+    if workflows_havent_changed is None:
+        try:
+            workflows_havent_changed = sql_client.get_repository_validation(
+                *validation_key, infos=default_message["valid_repository"]["workflows"].values()
+            )
+        except Exception as e:
+            logging.error(f"[ERROR]: {e}")
+        if workflows_havent_changed is not None:
+            validation_cache.set(validation_key, workflows_havent_changed)
+    if workflows_havent_changed is not None:
+        logging.info(f"Reusing the validation of {', '.join(validation_key)}.")
+    return workflows_havent_changed
     
\ No newline at end of file
@@ -1,26 +1,36 @@
-from typing import Any, Dict, List, Tuple, Union
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Tuple, Union, cast
 
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import chain
 
 from github_tests_validator_app.config import (default_message)
 
+from github_tests_validator_app.lib.artifacts import PytestArtifact, open_pytest_artifact
 from github_tests_validator_app.lib.connectors.github_client import GitHubConnector
 from github_tests_validator_app.lib.connectors.sqlalchemy_client import SQLAlchemyConnector
-from github_tests_validator_app.bin.github_repo_validation import validate_github_repo
+from github_tests_validator_app.bin.github_repo_validation import (
+    validate_github_repo,
+    validate_github_repo_async,
+)
+from github_tests_validator_app.lib.tracing import traced
+from github_tests_validator_app.lib.utils import submit_with_context
 
+if TYPE_CHECKING:
+    from github_tests_validator_app.lib.connectors.async_github_client import AsyncGitHubConnector
 
+
+@traced()
 def get_user_artifact(
     user_github_connector: GitHubConnector,
     sql_client: SQLAlchemyConnector,
-    all_user_artifact: Dict[str, Any],
     payload: Dict[str, Any],
 ) -> Any:
 
     workflow_run_id = payload["workflow_job"]["run_id"]
-    artifact_info = user_github_connector.get_artifact_info_from_artifacts_with_worflow_run_id(
-        all_user_artifact["artifacts"], workflow_run_id
-    )
+    artifact_info = user_github_connector.get_workflow_run_artifact(workflow_run_id)
     if not artifact_info:
         sql_client.add_new_pytest_summary(
             {},
@@ -36,8 +46,8 @@ def get_user_artifact(
         return None
 
     # Read Artifact
-    artifact_resp = user_github_connector.get_artifact(artifact_info)
-    artifact = user_github_connector.get_artifact_from_format_zip_bytes(artifact_resp.content)
+    artifact_file = user_github_connector.download_artifact(artifact_info)
+    artifact = open_pytest_artifact(artifact_file)
     if not artifact:
         sql_client.add_new_pytest_summary(
             {},
@@ -55,6 +65,37 @@ def get_user_artifact(
     return artifact
 
 
+@traced()
+async def get_user_artifact_async(
+    user_github_connector: "AsyncGitHubConnector",
+    sql_client: SQLAlchemyConnector,
+    payload: Dict[str, Any],
+) -> Union[PytestArtifact, None]:
+    """
+    Asyncio counterpart of `get_user_artifact`, the archive being read from a thread.
+    """
+    workflow_run_id = payload["workflow_job"]["run_id"]
+    artifact_info = await user_github_connector.get_workflow_run_artifact(workflow_run_id)
+    artifact = None
+    if artifact_info:
+        artifact_file = await user_github_connector.download_artifact(artifact_info)
+        artifact = await asyncio.to_thread(open_pytest_artifact, artifact_file)
+    if not artifact:
+        info = "find" if not artifact_info else "read"
+        sql_client.add_new_pytest_summary(
+            {},
+            workflow_run_id,
+            user_github_connector.user_data,
+            user_github_connector.REPO_NAME,
+            user_github_connector.BRANCH_NAME,
+            info=f"[ERROR]: Cannot {info} the artifact of Pytest result on GitHub user repository.",
+        )
+        logging.error(
+            f"[ERROR]: Cannot {info} the artifact of Pytest result on GitHub user repository."
+        )
+    return artifact
+
+
 def get_test_information(path: str) -> Tuple[str, str, str]:
 
     list_path_name = path.split("::")
@@ -64,27 +105,28 @@ def get_test_information(path: str) -> Tuple[str, str, str]:
     return file_path, script_name, test_name
 
 
-def parsing_pytest_summaries(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def iter_pytest_summaries(results: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
 
-    pytest_summaries = []
     for test in results:
         # if not test["outcome"] == "error":
         file_path, script_name, test_name = get_test_information(test["nodeid"])
-        pytest_summaries.append(
-            {   
-                "challenge_name": test["keywords"][-2],
-                "file_path": file_path,
-                "script_name": script_name,
-                "test_name": test_name,
-                "outcome": test["outcome"],
-                "setup": test["setup"],
-                "call": test.get("call", {}),
-                "teardown": test.get("teardown", {}),
-            }
-        )
-    return pytest_summaries
+        yield {
+            "challenge_name": test["keywords"][-2],
+            "file_path": file_path,
+            "script_name": script_name,
+            "test_name": test_name,
+            "outcome": test["outcome"],
+            "setup": test["setup"],
+            "call": test.get("call", {}),
+            "teardown": test.get("teardown", {}),
+        }
 
 
+def parsing_pytest_summaries(results: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return list(iter_pytest_summaries(results))
+
+
+@traced()
 def send_user_pytest_summaries(
     user_github_connector: GitHubConnector,
     sql_client: SQLAlchemyConnector,
@@ -92,36 +134,88 @@ def send_user_pytest_summaries(
     event: str,
 ) -> None:
 
-    # Get all artifacts
-    all_user_artifact = user_github_connector.get_all_artifacts()
-    if not all_user_artifact:
-        message = f"[ERROR]: Cannot get all artifact on repository {user_github_connector.REPO_NAME} of user {user_github_connector.user_data['organization_or_user']}."
-        if all_user_artifact["total_count"] == 0:
-            message = f"[ERROR]: No artifact on repository {user_github_connector.REPO_NAME} of user {user_github_connector.user_data['organization_or_user']}."
-        sql_client.add_new_pytest_summary(
-            {},
-            payload["workflow_job"]["run_id"],
-            user_github_connector.user_data,
-            user_github_connector.REPO_NAME,
-            user_github_connector.BRANCH_NAME,
-            info=message,
+    # The repository is validated while the artifact is downloaded.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        validation = submit_with_context(
+            executor, validate_github_repo, user_github_connector, sql_client, payload, event
         )
-        logging.error(message)
-        return
+        # Get user artifact
+        artifact = get_user_artifact(user_github_connector, sql_client, payload)
+        # logging.info(f"User artifact: {artifact}")
+        if not artifact:
+            logging.info("[ERROR]: Cannot get user artifact.")
+            if validation.exception():
+                logging.error(f"[ERROR]: {validation.exception()}")
+            return
+
+        with artifact:
+            send_artifact_results(
+                user_github_connector, sql_client, payload, event, artifact, validation.result()
+            )
 
-    # Get user artifact
-    artifact = get_user_artifact(user_github_connector, sql_client, all_user_artifact, payload)
-    # logging.info(f"User artifact: {artifact}")
+
+@traced()
+async def send_user_pytest_summaries_async(
+    user_github_connector: "AsyncGitHubConnector",
+    sql_client: SQLAlchemyConnector,
+    payload: Dict[str, Any],
+    event: str,
+) -> None:
+    """
+    Asyncio counterpart of `send_user_pytest_summaries`. The test results are parsed and
+    written from a thread, so that the event loop is not blocked.
+    """
+    validation = asyncio.ensure_future(
+        validate_github_repo_async(user_github_connector, sql_client, payload, event)
+    )
+    try:
+        artifact = await get_user_artifact_async(user_github_connector, sql_client, payload)
+    except BaseException:
+        validation.cancel()
+        raise
     if not artifact:
         logging.info("[ERROR]: Cannot get user artifact.")
+        try:
+            await validation
+        except Exception as e:
+            logging.error(f"[ERROR]: {e}")
         return
-    
+
+    with artifact:
+        workflow_hasnt_changed = await validation
+
+        def write_results() -> None:
+            send_artifact_results(
+                user_github_connector,
+                sql_client,
+                payload,
+                event,
+                artifact,
+                workflow_hasnt_changed,
+            )
+            # The transaction holding the details is committed by the same thread, instead
+            # of waiting for another one while it locks the tables.
+            sql_client.flush()
+
+        await asyncio.to_thread(write_results)
+
+
+def send_artifact_results(
+    user_github_connector: Union[GitHubConnector, "AsyncGitHubConnector"],
+    sql_client: SQLAlchemyConnector,
+    payload: Dict[str, Any],
+    event: str,
+    artifact: PytestArtifact,
+    workflow_hasnt_changed: Union[bool, None] = None,
+) -> None:
+
     # Check if workflow hasn't changed
-    workflow_hasnt_changed = validate_github_repo(
-        user_github_connector,
-        sql_client,
-        payload,
-        event)
+    if workflow_hasnt_changed is None:
+        workflow_hasnt_changed = validate_github_repo(
+            cast(GitHubConnector, user_github_connector),
+            sql_client,
+            payload,
+            event)
 
     if not workflow_hasnt_changed:
         logging.info(f"[ERROR] Workflow has changed for user {user_github_connector.user_data['organization_or_user']}")
@@ -150,27 +244,25 @@ def send_user_pytest_summaries(
     
     # Send summary user results to Google Sheet
     sql_client.add_new_pytest_summary(
-        artifact,
+        artifact.header,
         payload["workflow_job"]["run_id"],
         user_github_connector.user_data,
         user_github_connector.REPO_NAME,
         user_github_connector.BRANCH_NAME,
         info="Result of user tests",
     )
-    
-    if artifact["tests"]:
-        
-        # Parsing artifact / challenge results
-        pytest_summaries = parsing_pytest_summaries(artifact["tests"])
-        # logging.info(f'pytest summaries: {pytest_summaries}')
+
+    # Parsing artifact / challenge results, one test record at a time
+    pytest_summaries = iter_pytest_summaries(artifact.iter_tests())
+    first_pytest_summary = next(pytest_summaries, None)
+    if first_pytest_summary:
         # Send new results to Big Query
         logging.info("Adding new pytest details ...")
         sql_client.add_new_pytest_detail(
             repository=user_github_connector.REPO_NAME,
             branch=user_github_connector.BRANCH_NAME,
-            results=pytest_summaries,
+            results=chain([first_pytest_summary], pytest_summaries),
             workflow_run_id=payload["workflow_job"]["run_id"],
         )
-    
     else:
         logging.info("No tests found in artifact, probably no tests were run.")
@@ -3,7 +3,6 @@ from typing import Dict, List, cast
 import logging
 import os
 
-import google.cloud.logging
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,13 +19,27 @@ if os.getenv("LOGGING", "").replace("\r\n", "").replace("\r", "") == "LOCAL":
     if logging.getLogger("uvicorn") and logging.getLogger("uvicorn").handlers:
         logging.getLogger("uvicorn").removeHandler(logging.getLogger("uvicorn").handlers[0])
 
+elif os.getenv("K_SERVICE"):
+    # On Cloud Run, logs are written to stdout as structured JSON lines, which is what the
+    # Cloud Logging client would pick after querying the metadata server.
+    from google.cloud.logging.handlers import StructuredLogHandler, setup_logging
+
+    setup_logging(StructuredLogHandler(project_id=os.getenv("GOOGLE_CLOUD_PROJECT")))
+
 else:
+    import google.cloud.logging
+
     logging_client = google.cloud.logging.Client()
-    logging_client.get_default_handler()
     logging_client.setup_logging()
 
 
 
+# Webhook events processed by the application, with the actions they are processed for
+ACCEPTED_EVENT_ACTIONS: Dict[str, List[str]] = {
+    "pull_request": ["opened", "reopened"],
+    "workflow_job": ["completed"],
+}
+
 commit_ref_path: Dict[str, List[str]] = {
     "pull_request": ["pull_request", "head", "ref"],
     "pusher": ["ref"],
@@ -37,6 +50,24 @@ commit_ref_path: Dict[str, List[str]] = {
 GH_APP_ID = cast(str, os.getenv("GH_APP_ID", "")).replace("\r\n", "").replace("\r", "")
 GH_APP_KEY = cast(str, os.getenv("GH_APP_KEY", "").replace("\\n", "\n"))
 GH_PAT = cast(str, os.getenv("GH_PAT", "")).replace("\r\n", "").replace("\r", "")
+GH_WEBHOOK_SECRET = (
+    cast(str, os.getenv("GH_WEBHOOK_SECRET", "")).replace("\r\n", "").replace("\r", "")
+)
+# Without a webhook secret, the application only starts when unsigned webhooks are allowed.
+GH_ALLOW_UNSIGNED_WEBHOOKS = os.getenv("GH_ALLOW_UNSIGNED_WEBHOOKS", "false").lower() == "true"
+GH_TOKEN_REFRESH_MARGIN = float(os.getenv("GH_TOKEN_REFRESH_MARGIN", "300"))
+
+# HTTP connections to GitHub, shared by all the events of an instance
+GH_HTTP_POOL_SIZE = int(os.getenv("GH_HTTP_POOL_SIZE", "20"))
+GH_HTTP_TIMEOUT = float(os.getenv("GH_HTTP_TIMEOUT", "30"))
+GH_HTTP_RETRIES = int(os.getenv("GH_HTTP_RETRIES", "3"))
+GH_HTTP_BACKOFF_FACTOR = float(os.getenv("GH_HTTP_BACKOFF_FACTOR", "0.5"))
+GH_SECONDS_BETWEEN_REQUESTS = float(os.getenv("GH_SECONDS_BETWEEN_REQUESTS", "0.25"))
+# Installation API budget: requests are spread out below the low watermark and wait for the
+# reset below the reserve
+GH_RATE_LIMIT_RESERVE = int(os.getenv("GH_RATE_LIMIT_RESERVE", "50"))
+GH_RATE_LIMIT_LOW_WATERMARK = int(os.getenv("GH_RATE_LIMIT_LOW_WATERMARK", "500"))
+GH_RATE_LIMIT_MAX_WAIT = float(os.getenv("GH_RATE_LIMIT_MAX_WAIT", "60"))
 
 SQLALCHEMY_URI = cast(str, os.getenv("SQLALCHEMY_URI", "")).replace("\r\n", "").replace("\r", "").replace('"', '').replace("\n", "").replace("\\n", "").strip()
 if not SQLALCHEMY_URI:
@@ -44,9 +75,62 @@ if not SQLALCHEMY_URI:
     
 # SQLALCHEMY_URI="sqlite:///./test.db"
 
+SQL_POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", "5"))
+SQL_MAX_OVERFLOW = int(os.getenv("SQL_MAX_OVERFLOW", "10"))
+SQL_POOL_RECYCLE = int(os.getenv("SQL_POOL_RECYCLE", "1800"))
+SQL_POOL_TIMEOUT = float(os.getenv("SQL_POOL_TIMEOUT", "30"))
+SQL_UPSERT_BATCH_SIZE = int(os.getenv("SQL_UPSERT_BATCH_SIZE", "1000"))
+BQ_BATCH_MAX_ROWS = int(os.getenv("BQ_BATCH_MAX_ROWS", "5000"))
+BQ_BATCH_MAX_SECONDS = float(os.getenv("BQ_BATCH_MAX_SECONDS", "10"))
+BQ_STAGING_TABLE_EXPIRATION = int(os.getenv("BQ_STAGING_TABLE_EXPIRATION", "3600"))
+SQL_CREATE_TABLES_ON_STARTUP = os.getenv("SQL_CREATE_TABLES_ON_STARTUP", "true").lower() == "true"
+
 GH_WORKFLOWS_FOLDER_NAME = ".github/workflows"
-GH_API = "https://api.github.com/repos"
+# "tree" hashes a folder from a single Git Trees API call, "contents" downloads every file
+GH_FOLDER_FETCH_MODE = cast(str, os.getenv("GH_FOLDER_FETCH_MODE", "tree")).strip()
+GH_FETCH_WORKERS = int(os.getenv("GH_FETCH_WORKERS", "8"))
+# Hashes of the reference repositories folders, keyed by commit SHA
+FOLDER_HASH_CACHE_SIZE = int(os.getenv("FOLDER_HASH_CACHE_SIZE", "1024"))
+FOLDER_HASH_CACHE_TTL = float(os.getenv("FOLDER_HASH_CACHE_TTL", "86400"))
+FOLDER_HASH_CACHE_SQL = os.getenv("FOLDER_HASH_CACHE_SQL", "false").lower() == "true"
+VALIDATION_CACHE_SIZE = int(os.getenv("VALIDATION_CACHE_SIZE", "1024"))
+VALIDATION_CACHE_TTL = float(os.getenv("VALIDATION_CACHE_TTL", "86400"))
+# REST API root, changed to reach GitHub Enterprise Server or a local fake
+GH_API_URL = cast(str, os.getenv("GH_API_URL", "https://api.github.com")).strip().rstrip("/")
+GH_API = f"{GH_API_URL}/repos"
 GH_ALL_ARTIFACT_ENDPOINT = "actions/artifacts"
+# Artifacts lookup, retried with exponential backoff while the run artifacts are not listed yet
+GH_ARTIFACT_LOOKUP_ATTEMPTS = int(os.getenv("GH_ARTIFACT_LOOKUP_ATTEMPTS", "4"))
+GH_BACKOFF_BASE_DELAY = float(os.getenv("GH_BACKOFF_BASE_DELAY", "1"))
+GH_BACKOFF_MAX_DELAY = float(os.getenv("GH_BACKOFF_MAX_DELAY", "10"))
+GH_ARTIFACT_LIST_MAX_PAGES = int(os.getenv("GH_ARTIFACT_LIST_MAX_PAGES", "10"))
+# Artifacts are downloaded in chunks and kept in memory up to ARTIFACT_SPOOL_MAX_SIZE bytes
+ARTIFACT_CHUNK_SIZE = int(os.getenv("ARTIFACT_CHUNK_SIZE", str(64 * 1024)))
+ARTIFACT_SPOOL_MAX_SIZE = int(os.getenv("ARTIFACT_SPOOL_MAX_SIZE", str(8 * 1024 * 1024)))
+
+# Web server: SERVER_WORKERS processes, 0 for one per CPU, each with its own background workers
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+SERVER_PREWARM = os.getenv("SERVER_PREWARM", "true").lower() == "true"
+SERVER_GRACEFUL_TIMEOUT = float(os.getenv("SERVER_GRACEFUL_TIMEOUT", "10"))
+
+# Background workers
+# "thread", "process" or "async"
+WORKER_MODE = cast(str, os.getenv("WORKER_MODE", "thread")).strip()
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", "4"))
+WORKER_QUEUE_MAX_SIZE = int(os.getenv("WORKER_QUEUE_MAX_SIZE", "100"))
+WORKER_SHUTDOWN_TIMEOUT = float(os.getenv("WORKER_SHUTDOWN_TIMEOUT", "60"))
+
+# Duplicate webhook events
+EVENT_DEDUP_CACHE_SIZE = int(os.getenv("EVENT_DEDUP_CACHE_SIZE", "10000"))
+EVENT_DEDUP_TTL = float(os.getenv("EVENT_DEDUP_TTL", "86400"))
+EVENT_DEDUP_SQL = os.getenv("EVENT_DEDUP_SQL", "false").lower() == "true"
+# workflow_job events of a workflow run are processed once, after the last one
+EVENT_COALESCE_WINDOW = float(os.getenv("EVENT_COALESCE_WINDOW", "5"))
+EVENT_COALESCE_MAX_DELAY = float(os.getenv("EVENT_COALESCE_MAX_DELAY", "60"))
+
+# OpenTelemetry traces, with the optional "tracing" dependencies
+TRACING_EXPORTER = cast(str, os.getenv("TRACING_EXPORTER", "none")).strip()  # "console", "otlp"
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", "0.1"))
 
 # Log message
 default_message: Dict[str, Dict[str, Dict[str, str]]] = {
@@ -0,0 +1,57 @@
+from typing import IO, Any, Dict, Iterator, Union
+
+import zipfile
+
+from github_tests_validator_app.lib.json_stream import iter_object_array, load_object_without
+from github_tests_validator_app.lib.metrics import timed
+
+
+class PytestArtifact:
+    """
+    Pytest JSON report read lazily from a zipped GitHub artifact.
+
+    The report fields are loaded without the `tests` array, whose records are decoded one
+    by one by `iter_tests`, so a large report never has to be held in memory.
+
+    Args:
+        file (IO[bytes]): seekable file containing the zip archive, closed with the artifact
+    """
+
+    def __init__(self, file: IO[bytes]) -> None:
+        self.file = file
+        self.zip_file = zipfile.ZipFile(file)
+        self.member_name = self.zip_file.namelist()[0]
+        with self.zip_file.open(self.member_name) as member:
+            self.header = load_object_without(member, "tests")
+
+    def iter_tests(self) -> Iterator[Dict[str, Any]]:
+        with self.zip_file.open(self.member_name) as member:
+            yield from iter_object_array(member, "tests")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.header.get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.header
+
+    def __getitem__(self, key: str) -> Any:
+        return self.header[key]
+
+    def close(self) -> None:
+        self.zip_file.close()
+        self.file.close()
+
+    def __enter__(self) -> "PytestArtifact":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+@timed("artifact_parse")
+def open_pytest_artifact(file: IO[bytes]) -> Union[PytestArtifact, None]:
+    try:
+        return PytestArtifact(file)
+    except (zipfile.BadZipFile, IndexError, ValueError):
+        file.close()
+        return None
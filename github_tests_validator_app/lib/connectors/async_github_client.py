@@ -0,0 +1,515 @@
+from typing import IO, Any, Dict, List, NamedTuple, Tuple, Union, cast
+
+import asyncio
+import base64
+import logging
+import tempfile
+import time
+import weakref
+from datetime import datetime, timezone
+
+import httpx
+from github import Auth, ContentFile
+from github_tests_validator_app.config import (
+    ARTIFACT_CHUNK_SIZE,
+    ARTIFACT_SPOOL_MAX_SIZE,
+    GH_ALL_ARTIFACT_ENDPOINT,
+    GH_API,
+    GH_API_URL,
+    GH_APP_ID,
+    GH_APP_KEY,
+    GH_ARTIFACT_LIST_MAX_PAGES,
+    GH_ARTIFACT_LOOKUP_ATTEMPTS,
+    GH_HTTP_BACKOFF_FACTOR,
+    GH_HTTP_POOL_SIZE,
+    GH_HTTP_RETRIES,
+    GH_HTTP_TIMEOUT,
+)
+from github_tests_validator_app.lib.connectors.github_token_cache import token_cache
+from github_tests_validator_app.lib.connectors.http_session import RETRY_STATUS_CODES
+from github_tests_validator_app.lib.connectors.rate_limiter import rate_limiter
+from github_tests_validator_app.lib.metrics import timed, track_stage
+from github_tests_validator_app.lib.tracing import get_current_span, traced
+from github_tests_validator_app.lib.utils import (
+    TreeElement,
+    get_backoff_delays,
+    get_hash_files,
+    get_hash_tree_elements,
+)
+
+TOKEN_EXPIRATION_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+# App JWTs are valid 5 minutes; signing one parses the private key, which takes tens of ms.
+APP_JWT_REUSE_SECONDS = 240
+
+
+class ContentElement(NamedTuple):
+    """
+    File or directory of the Contents API, with the attributes of PyGithub's ContentFile
+    that are hashed.
+    """
+
+    path: str
+    type: str
+    sha: str
+    decoded_content: bytes = b""
+
+
+def is_retryable(response: httpx.Response) -> bool:
+    # Secondary rate limits are answered with a 403 and a Retry-After header.
+    return response.status_code in RETRY_STATUS_CODES or (
+        response.status_code == 403 and "Retry-After" in response.headers
+    )
+
+
+def get_retry_delay(attempt: int, response: Union[httpx.Response, None] = None) -> float:
+    retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+    if retry_after.isdigit():
+        return float(retry_after)
+    return float(GH_HTTP_BACKOFF_FACTOR * 2**attempt)
+
+
+class AsyncGitHubClient:
+    """
+    Connection pool to the GitHub API for the coroutines of one event loop, with the same
+    retries, rate limiting and installation tokens as the synchronous connectors. Tokens
+    are kept in the shared token cache, minted once per installation at a time.
+    """
+
+    def __init__(
+        self, base_url: str = GH_API_URL, http_client: Union[httpx.AsyncClient, None] = None
+    ) -> None:
+        self.base_url = base_url
+        self.http = http_client or httpx.AsyncClient(
+            timeout=GH_HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=GH_HTTP_POOL_SIZE, max_keepalive_connections=GH_HTTP_POOL_SIZE
+            ),
+        )
+        self._app_auth: Union[Auth.AppAuth, None] = None
+        self._app_jwt: Tuple[str, float] = ("", 0.0)
+        self._app_jwt_lock: Union[asyncio.Lock, None] = None
+        self._minting_locks: Dict[int, asyncio.Lock] = {}
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+    async def request(
+        self, method: str, url: str, token: str, stream: bool = False, **kwargs: Any
+    ) -> httpx.Response:
+        """
+        Send a request authenticated with an installation token, taken from its budget.
+        A streamed response must be closed by the caller.
+
+        Raises:
+            httpx.HTTPStatusError: GitHub answered with an error, after the retries
+        """
+        return await self._send(method, url, f"Bearer {token}", token, stream, **kwargs)
+
+    async def get_token(self, repo_name: str) -> str:
+        installation_id = token_cache.get_cached_installation_id(repo_name)
+        if installation_id is None:
+            response = await self._send(
+                "GET", f"{GH_API}/{repo_name}/installation", await self._get_app_authorization()
+            )
+            installation_id = int(response.json()["id"])
+            token_cache.store_installation_id(repo_name, installation_id)
+        token = token_cache.get_cached_token(installation_id)
+        if token:
+            return token
+
+        async with self._minting_locks.setdefault(installation_id, asyncio.Lock()):
+            # Another coroutine may have minted the token while we were waiting.
+            token = token_cache.get_cached_token(installation_id)
+            if token:
+                return token
+            logging.info(f"Minting a new access token for installation {installation_id} ...")
+            with track_stage("token_minting"):
+                response = await self._send(
+                    "POST",
+                    f"{self.base_url}/app/installations/{installation_id}/access_tokens",
+                    await self._get_app_authorization(),
+                )
+            authorization = response.json()
+            expires_at = datetime.strptime(authorization["expires_at"], TOKEN_EXPIRATION_FORMAT)
+            token_cache.store_token(
+                installation_id,
+                authorization["token"],
+                expires_at.replace(tzinfo=timezone.utc).timestamp(),
+            )
+            return str(authorization["token"])
+
+    async def _get_app_authorization(self) -> str:
+        if self._app_jwt_lock is None:
+            self._app_jwt_lock = asyncio.Lock()
+        async with self._app_jwt_lock:
+            app_jwt, signed_at = self._app_jwt
+            if time.monotonic() - signed_at > APP_JWT_REUSE_SECONDS:
+                if self._app_auth is None:
+                    self._app_auth = Auth.AppAuth(app_id=GH_APP_ID, private_key=GH_APP_KEY)
+                app_jwt = await asyncio.to_thread(self._app_auth.create_jwt)
+                self._app_jwt = (app_jwt, time.monotonic())
+        return f"Bearer {app_jwt}"
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        authorization: str,
+        token: Union[str, None] = None,
+        stream: bool = False,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """
+        Retry 5xx, 429 and secondary rate limit responses and connection errors with
+        exponential backoff, honoring the Retry-After header.
+        """
+        headers = {"Accept": "application/vnd.github+json", "Authorization": authorization}
+        attempt = 0
+        while True:
+            await asyncio.sleep(rate_limiter.acquire(token))
+            request = self.http.build_request(method, url, headers=headers, **kwargs)
+            try:
+                # Artifacts are redirected to the blob storage, without the Authorization header.
+                response = await self.http.send(request, stream=stream, follow_redirects=True)
+            except httpx.TransportError as e:
+                if attempt >= GH_HTTP_RETRIES:
+                    raise e
+                delay = get_retry_delay(attempt)
+                logging.warning(f"Request {method} {url} failed: {e}. Retrying in {delay:.1f}s...")
+            else:
+                if token:
+                    for hop in [*response.history, response]:
+                        rate_limiter.update_from_headers(token, hop.headers)
+                if attempt >= GH_HTTP_RETRIES or not is_retryable(response):
+                    if response.is_error:
+                        await response.aclose()
+                        response.raise_for_status()
+                    return response
+                await response.aclose()
+                delay = get_retry_delay(attempt, response)
+                logging.warning(
+                    f"Request {method} {url} answered {response.status_code}. Retrying in {delay:.1f}s..."
+                )
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+# Connections belong to the event loop they were opened in.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncGitHubClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_async_github_client() -> AsyncGitHubClient:
+    """
+    Return the client of the running event loop, shared by all its connectors.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncGitHubClient()
+    return client
+
+
+async def close_async_github_client() -> None:
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+class AsyncGitHubConnector:
+    """
+    Asyncio counterpart of GitHubConnector, for the GitHub calls of the event processing.
+    The repository is a dict of the JSON returned by the REST API; `create` builds a
+    connector and fetches it.
+    """
+
+    def __init__(
+        self,
+        user_data: Dict[str, Any],
+        repo_name: str,
+        branch_name: str,
+        access_token: Union[str, None] = None,
+        client: Union[AsyncGitHubClient, None] = None,
+    ) -> None:
+        self.user_data = user_data
+        self.REPO_NAME = repo_name
+        self.BRANCH_NAME = branch_name
+        self.ACCESS_TOKEN = access_token
+        self.client = client or get_async_github_client()
+        self.repo: Dict[str, Any] = {}
+
+    @classmethod
+    async def create(
+        cls,
+        user_data: Dict[str, Any],
+        repo_name: str,
+        branch_name: str,
+        access_token: Union[str, None] = None,
+        client: Union[AsyncGitHubClient, None] = None,
+    ) -> "AsyncGitHubConnector":
+        connector = cls(user_data, repo_name, branch_name, access_token, client)
+        await connector.connect()
+        return connector
+
+    async def connect(self) -> None:
+        logging.info(
+            f"Connecting to Github with user {self.user_data['organization_or_user']} on repo: {self.REPO_NAME} ..."
+        )
+        minted = not self.ACCESS_TOKEN
+        try:
+            if minted:
+                self.ACCESS_TOKEN = await self.client.get_token(self.REPO_NAME)
+            await self.get_repo(self.REPO_NAME)
+            logging.info(f"Successfully connected to repo: {self.REPO_NAME}")
+        except httpx.HTTPStatusError as e:
+            logging.error(f"Failed to connect to repo: {self.REPO_NAME}, error: {e}")
+            if minted and e.response.status_code == 401:
+                token_cache.invalidate(self.REPO_NAME)
+            raise e
+
+    @property
+    def parent_full_name(self) -> Union[str, None]:
+        parent = self.repo.get("parent")
+        return str(parent["full_name"]) if parent else None
+
+    @timed("get_repo")
+    async def get_repo(self, repo_name: str) -> Dict[str, Any]:
+        self.REPO_NAME = repo_name
+        self.repo = await self._request_data(f"{GH_API}/{repo_name}")
+        return self.repo
+
+    async def get_last_hash_commit(self) -> str:
+        branch = await self._request_data(f"{GH_API}/{self.REPO_NAME}/branches/{self.BRANCH_NAME}")
+        logging.info(f"BRANCH NAME: {self.BRANCH_NAME}")
+        return str(branch["commit"]["sha"])
+
+    async def get_contents(
+        self, path: str, ref: Union[str, None] = None
+    ) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Contents API entries of a directory, or the entry of a file with its content.
+        """
+        return cast(
+            Union[List[Dict[str, Any]], Dict[str, Any]],
+            await self._request_data(
+                f"{GH_API}/{self.REPO_NAME}/contents/{path.strip('/')}",
+                params={"ref": ref or self.BRANCH_NAME},
+            ),
+        )
+
+    async def get_files_content(
+        self, contents: Union[List[Dict[str, Any]], Dict[str, Any]], ref: Union[str, None] = None
+    ) -> List[ContentElement]:
+        """
+        Walk the directories breadth-first, listing the directories of a level and
+        downloading the files concurrently, in the order of GitHubConnector.get_files_content.
+        """
+        ref = ref or self.BRANCH_NAME
+        entries = contents if isinstance(contents, list) else [contents]
+        files: List[Dict[str, Any]] = []
+        while entries:
+            directories = [entry["path"] for entry in entries if entry["type"] == "dir"]
+            files.extend(entry for entry in entries if entry["type"] != "dir")
+            listings = await asyncio.gather(*(self.get_contents(path, ref) for path in directories))
+            entries = [entry for listing in listings for entry in cast(List[Any], listing)]
+
+        async def fetch(entry: Dict[str, Any]) -> ContentElement:
+            if entry["type"] == "file" and "content" not in entry:
+                entry = cast(Dict[str, Any], await self.get_contents(entry["path"], ref))
+            content = base64.b64decode(entry["content"]) if entry["type"] == "file" else b""
+            return ContentElement(entry["path"], entry["type"], entry["sha"], content)
+
+        return list(await asyncio.gather(*(fetch(entry) for entry in files)))
+
+    @traced()
+    async def get_hash(self, folder_name: str, ref: Union[str, None] = None) -> str:
+        ref = ref or self.BRANCH_NAME
+        logging.info(
+            f"Attempting to fetch contents for folder: {folder_name} in repo {self.REPO_NAME} on ref {ref}"
+        )
+        files_content = await self.get_files_content(await self.get_contents(folder_name, ref), ref)
+        logging.info(f"Number of files fetched from folder {folder_name}: {len(files_content)}")
+        get_current_span().set_attributes(
+            {"github.repository": self.REPO_NAME, "github.file_count": len(files_content)}
+        )
+        hash_value = str(get_hash_files(cast(List[ContentFile.ContentFile], files_content)))
+        logging.info(f"Generated hash for folder {folder_name}: {hash_value}")
+        return hash_value
+
+    @traced()
+    async def get_tree_elements(
+        self, folder_name: str, ref: Union[str, None] = None
+    ) -> List[TreeElement]:
+        """
+        List the elements under a folder with a single recursive Git Trees API call, or from
+        the subtree of the folder when the tree of the repository is truncated, as
+        GitHubConnector.get_tree_elements.
+
+        Raises:
+            httpx.HTTPStatusError: 404 if the folder is not in the tree
+        """
+        ref = ref or self.BRANCH_NAME
+        logging.info(
+            f"Fetching tree of folder: {folder_name} in repo {self.REPO_NAME} on ref {ref}"
+        )
+        url = f"{GH_API}/{self.REPO_NAME}/git/trees/{ref}"
+        tree = await self._request_data(url, params={"recursive": "1"})
+
+        folder_name = folder_name.strip("/")
+        if tree.get("truncated"):
+            logging.warning(
+                f"Tree of repo {self.REPO_NAME} is truncated, fetching the subtree of {folder_name}."
+            )
+            elements = await self._get_folder_elements(folder_name, ref)
+        else:
+            elements = [
+                TreeElement(element["path"], element["type"], element["sha"])
+                for element in tree["tree"]
+                if element["path"] == folder_name or element["path"].startswith(f"{folder_name}/")
+            ]
+        if not elements:
+            message = f"Failed to fetch folder '{folder_name}'. Not found in tree {tree['sha']}."
+            logging.error(message)
+            request = httpx.Request("GET", url)
+            raise httpx.HTTPStatusError(
+                message, request=request, response=httpx.Response(404, request=request)
+            )
+        logging.info(f"Number of elements fetched from folder {folder_name}: {len(elements)}")
+        get_current_span().set_attributes(
+            {"github.repository": self.REPO_NAME, "github.file_count": len(elements)}
+        )
+        return elements
+
+    async def _get_folder_elements(self, folder_name: str, ref: str) -> List[TreeElement]:
+        """
+        Find the folder from the root tree and list it with its own subtree, as
+        GitHubConnector._get_folder_elements.
+        """
+        folder = TreeElement(folder_name, "tree", ref)
+        for name in folder_name.split("/"):
+            if folder.type != "tree":
+                return []
+            tree = await self._request_data(f"{GH_API}/{self.REPO_NAME}/git/trees/{folder.sha}")
+            entries = {element["path"]: element for element in tree["tree"]}
+            if name not in entries:
+                return []
+            folder = TreeElement(folder_name, entries[name]["type"], entries[name]["sha"])
+        if folder.type != "tree":
+            return [folder]
+        return [folder, *await self._get_subtree_elements(folder.sha, folder_name)]
+
+    async def _get_subtree_elements(self, sha: str, prefix: str) -> List[TreeElement]:
+        url = f"{GH_API}/{self.REPO_NAME}/git/trees/{sha}"
+        tree = await self._request_data(url, params={"recursive": "1"})
+        if not tree.get("truncated"):
+            return [
+                TreeElement(f"{prefix}/{element['path']}", element["type"], element["sha"])
+                for element in tree["tree"]
+            ]
+        elements = []
+        for element in (await self._request_data(url))["tree"]:
+            path = f"{prefix}/{element['path']}"
+            elements.append(TreeElement(path, element["type"], element["sha"]))
+            if element["type"] == "tree":
+                elements.extend(await self._get_subtree_elements(element["sha"], path))
+        return elements
+
+    async def get_tree_hash(self, folder_name: str, ref: Union[str, None] = None) -> str:
+        elements = await self.get_tree_elements(folder_name, ref)
+        hash_value = get_hash_tree_elements(elements)
+        logging.info(f"Generated hash for folder {folder_name}: {hash_value}")
+        return hash_value
+
+    @traced()
+    @timed("artifact_list")
+    async def get_workflow_run_artifact(self, workflow_run_id: int) -> Union[None, Dict[str, Any]]:
+        """
+        Find the artifact uploaded by a workflow run, as GitHubConnector.get_workflow_run_artifact.
+        """
+        url = f"{GH_API}/{self.REPO_NAME}/actions/runs/{workflow_run_id}/artifacts"
+        max_retries = GH_ARTIFACT_LOOKUP_ATTEMPTS
+        for attempt, delay in enumerate(get_backoff_delays(max_retries), start=1):
+            try:
+                response = await self._request_data(url)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 404:
+                    raise e
+                logging.warning(f"Workflow run {workflow_run_id} not found on {self.REPO_NAME}.")
+                break
+            if response.get("artifacts"):
+                logging.info(
+                    f"Artifact of workflow run {workflow_run_id} found on attempt {attempt}"
+                )
+                return cast(Dict[str, Any], response["artifacts"][0])
+            if attempt < max_retries:
+                logging.warning(
+                    f"No artifact for workflow run {workflow_run_id} on attempt {attempt}/{max_retries}. Retrying in {delay:.1f}s..."
+                )
+                await asyncio.sleep(delay)
+
+        return await self.find_workflow_run_artifact(workflow_run_id)
+
+    async def find_workflow_run_artifact(self, workflow_run_id: int) -> Union[None, Dict[str, Any]]:
+        per_page = 100
+        url = f"{GH_API}/{self.REPO_NAME}/{GH_ALL_ARTIFACT_ENDPOINT}"
+        for page in range(1, GH_ARTIFACT_LIST_MAX_PAGES + 1):
+            try:
+                params = {"per_page": per_page, "page": page}
+                response = await self._request_data(url, params=params)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 404:
+                    logging.error(f"No artifacts found for the repository: {self.REPO_NAME}")
+                    return None
+                raise e
+            artifacts = response.get("artifacts", [])
+            for artifact in artifacts:
+                if artifact.get("workflow_run", {}).get("id") == workflow_run_id:
+                    return cast(Dict[str, Any], artifact)
+            # Artifacts are listed newest first, see GitHubConnector.find_workflow_run_artifact.
+            if len(artifacts) < per_page or all(
+                a.get("workflow_run", {}).get("id", 0) < workflow_run_id for a in artifacts
+            ):
+                break
+        logging.error(f"No artifact found for workflow run {workflow_run_id} on {self.REPO_NAME}.")
+        return None
+
+    @traced()
+    @timed("artifact_download")
+    async def download_artifact(self, artifact_info: Dict[str, Any]) -> IO[bytes]:
+        """
+        Stream an artifact archive into a temporary file, kept in memory up to
+        ARTIFACT_SPOOL_MAX_SIZE bytes. It is returned rewound, and must be closed by the caller.
+        """
+        url = f"{GH_API}/{self.REPO_NAME}/{GH_ALL_ARTIFACT_ENDPOINT}/{artifact_info['id']}/zip"
+        artifact_file = tempfile.SpooledTemporaryFile(max_size=ARTIFACT_SPOOL_MAX_SIZE)
+        size = 0
+        try:
+            response = await self.client.request("GET", url, self._get_token(), stream=True)
+            try:
+                async for chunk in response.aiter_bytes(chunk_size=ARTIFACT_CHUNK_SIZE):
+                    artifact_file.write(chunk)
+                    size += len(chunk)
+            finally:
+                await response.aclose()
+        except Exception:
+            artifact_file.close()
+            raise
+        logging.info(f"Artifact {artifact_info['id']} downloaded: {size} bytes")
+        get_current_span().set_attributes(
+            {"github.artifact_id": artifact_info["id"], "github.artifact_bytes": size}
+        )
+        artifact_file.seek(0)
+        return cast(IO[bytes], artifact_file)
+
+    def _get_token(self) -> str:
+        if not self.ACCESS_TOKEN:
+            raise RuntimeError(f"Connector of {self.REPO_NAME} is not connected.")
+        return self.ACCESS_TOKEN
+
+    async def _request_data(
+        self, url: str, params: Union[Dict[str, Any], None] = None
+    ) -> Dict[str, Any]:
+        logging.info(f"Trying to request {url} with params {params}")
+        response = await self.client.request("GET", url, self._get_token(), params=params)
+        return cast(Dict[str, Any], response.json())
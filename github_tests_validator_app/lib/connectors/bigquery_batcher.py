@@ -0,0 +1,283 @@
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Tuple, Union
+
+import atexit
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from multiprocessing.util import Finalize
+
+from github_tests_validator_app.config import (
+    BQ_BATCH_MAX_ROWS,
+    BQ_BATCH_MAX_SECONDS,
+    BQ_STAGING_TABLE_EXPIRATION,
+    SQLALCHEMY_URI,
+)
+from github_tests_validator_app.lib.metrics import timed
+from github_tests_validator_app.lib.tracing import start_span
+
+if TYPE_CHECKING:
+    # Only imported once a batch is written, the other databases do not need it.
+    from google.cloud import bigquery
+
+DETAIL_KEY = ("organization_or_user", "file_path", "test_name", "repository")
+
+MERGE_SQL = """
+MERGE `{main_table}` AS T
+USING `{staging_table}` AS S
+ON T.organization_or_user = S.organization_or_user
+AND T.file_path           = S.file_path
+AND T.test_name           = S.test_name
+AND T.repository          = S.repository
+WHEN MATCHED THEN
+UPDATE SET
+    created_at           = S.created_at,
+    branch               = S.branch,
+    workflow_run_id      = S.workflow_run_id,
+    script_name          = S.script_name,
+    challenge_name       = S.challenge_name,
+    outcome              = S.outcome,
+    setup                = S.setup,
+    call                 = S.call,
+    teardown             = S.teardown
+WHEN NOT MATCHED THEN
+INSERT (created_at, organization_or_user, repository, branch,
+        workflow_run_id, file_path, test_name, script_name,
+        challenge_name, outcome, setup, call, teardown)
+VALUES (S.created_at, S.organization_or_user, S.repository, S.branch,
+        S.workflow_run_id, S.file_path, S.test_name, S.script_name,
+        S.challenge_name, S.outcome, S.setup, S.call, S.teardown)
+"""
+
+
+class BigQueryDetailBatcher:
+    """
+    Buffer workflow_run_detail rows of many workflow runs and write them in micro-batches.
+
+    A batch is written when `max_rows` rows are buffered or `max_seconds` after its first
+    row: the rows are loaded into a staging table with a single load job, merged into the
+    main table with a single MERGE, and the staging table is deleted. Load jobs do not go
+    through the streaming buffer, so the MERGE always sees every row of the batch.
+
+    Args:
+        dataset (str): BigQuery dataset of the workflow_run_detail table
+        max_rows (int): number of buffered rows triggering a write
+        max_seconds (float): maximum time a row waits in the buffer
+    """
+
+    def __init__(
+        self,
+        dataset: str,
+        max_rows: int = BQ_BATCH_MAX_ROWS,
+        max_seconds: float = BQ_BATCH_MAX_SECONDS,
+        client: Union["bigquery.Client", None] = None,
+    ) -> None:
+        self.dataset = dataset
+        self.main_table = f"{dataset}.workflow_run_detail"
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self._client = client
+        self._schema: Union[List["bigquery.SchemaField"], None] = None
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._rows: List[Dict[str, Any]] = []
+        self._first_row_time = 0.0
+        self._stopping = False
+        self._thread: Union[threading.Thread, None] = None
+        self.batches = 0
+        self.rows_written = 0
+        self.failed_batches = 0
+
+    @property
+    def client(self) -> "bigquery.Client":
+        if self._client is None:
+            from google.cloud import bigquery
+
+            self._client = bigquery.Client()
+        return self._client
+
+    def add(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Buffer rows to be written with the next batch. The background writer is woken up
+        to write it right away when the buffer reaches `max_rows`.
+
+        Returns:
+            int: number of rows added
+        """
+        # Rows are parsed from the artifact as they are consumed, without holding the lock.
+        rows = list(rows)
+        if not rows:
+            return 0
+        with self._condition:
+            started = not self._rows
+            if started:
+                self._first_row_time = time.monotonic()
+            self._rows.extend(rows)
+            stopped = self._stopping
+            if not stopped:
+                self._start()
+                if started or len(self._rows) >= self.max_rows:
+                    self._condition.notify_all()
+        if stopped:
+            self.flush()
+        return len(rows)
+
+    def flush(self) -> bool:
+        """
+        Write the buffered rows.
+
+        Returns:
+            bool: False if the batch failed and its rows were kept for the next one
+        """
+        with self._flush_lock:
+            with self._condition:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return True
+            rows = deduplicate_rows(rows)
+            try:
+                self._write(rows)
+            except Exception as e:
+                self.failed_batches += 1
+                logging.error(f"Error writing a batch of {len(rows)} pytest details: {e}")
+                with self._condition:
+                    # Give the rows another chance with the next batch, unless they pile up.
+                    if len(self._rows) + len(rows) <= 10 * self.max_rows:
+                        self._rows = rows + self._rows
+                        self._first_row_time = time.monotonic()
+                    else:
+                        logging.error(f"Dropping {len(rows)} pytest details.")
+                return False
+            self.batches += 1
+            self.rows_written += len(rows)
+            return True
+
+    def stop(self) -> None:
+        """
+        Write the buffered rows and stop the background writer.
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread:
+            thread.join()
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            pending_rows = len(self._rows)
+        return {
+            "pending_rows": pending_rows,
+            "batches": self.batches,
+            "rows_written": self.rows_written,
+            "failed_batches": self.failed_batches,
+        }
+
+    def _start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="bigquery-batcher", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._stopping and not self._is_due():
+                    self._condition.wait(timeout=self._time_until_due())
+                if self._stopping:
+                    return
+            if not self.flush():
+                # Do not hammer BigQuery while it fails, retry after a full period.
+                with self._condition:
+                    self._condition.wait_for(lambda: self._stopping, timeout=self.max_seconds)
+
+    def _is_due(self) -> bool:
+        return bool(self._rows) and (
+            len(self._rows) >= self.max_rows
+            or time.monotonic() - self._first_row_time >= self.max_seconds
+        )
+
+    def _time_until_due(self) -> Union[float, None]:
+        if not self._rows:
+            return None
+        return max(0.0, self._first_row_time + self.max_seconds - time.monotonic())
+
+    @timed("bigquery_job")
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        # Batches mix the rows of many events, their spans start their own trace.
+        with start_span("bigquery_batch", {"bigquery.rows": len(rows)}):
+            self._load_and_merge(rows)
+
+    def _load_and_merge(self, rows: List[Dict[str, Any]]) -> None:
+        from google.cloud import bigquery
+
+        if self._schema is None:
+            self._schema = self.client.get_table(self.main_table).schema
+        staging_table_id = f"{self.dataset}.staging_workflow_run_detail_{uuid.uuid4().hex}"
+        staging_table = bigquery.Table(
+            f"{self.client.project}.{staging_table_id}", schema=self._schema
+        )
+        # The staging table removes itself if the batch dies before deleting it.
+        staging_table.expires = datetime.now(timezone.utc) + timedelta(
+            seconds=BQ_STAGING_TABLE_EXPIRATION
+        )
+
+        logging.info(f"Loading {len(rows)} pytest details into {staging_table_id}...")
+        self.client.create_table(staging_table)
+        try:
+            job_config = bigquery.LoadJobConfig(
+                schema=self._schema,
+                write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+            )
+            with start_span("bigquery_load", {"bigquery.table": staging_table_id}):
+                self.client.load_table_from_json(
+                    rows, staging_table_id, job_config=job_config
+                ).result()
+
+            logging.info("Merging data from staging to main table...")
+            with start_span("bigquery_merge", {"bigquery.table": self.main_table}):
+                self.client.query(
+                    MERGE_SQL.format(main_table=self.main_table, staging_table=staging_table_id)
+                ).result()
+        finally:
+            self.client.delete_table(staging_table_id, not_found_ok=True)
+        logging.info(f"{len(rows)} pytest details written.")
+
+
+def deduplicate_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Keep the last row of each workflow_run_detail key, a MERGE source must not match a
+    target row more than once.
+    """
+    unique_rows: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+    for row in rows:
+        key = tuple(row[column] for column in DETAIL_KEY)
+        unique_rows.pop(key, None)
+        unique_rows[key] = row
+    return list(unique_rows.values())
+
+
+_detail_batcher: Union[BigQueryDetailBatcher, None] = None
+_detail_batcher_lock = threading.Lock()
+
+
+def get_detail_batcher() -> BigQueryDetailBatcher:
+    global _detail_batcher
+    if _detail_batcher is None:
+        with _detail_batcher_lock:
+            if _detail_batcher is None:
+                _detail_batcher = BigQueryDetailBatcher(dataset=SQLALCHEMY_URI.split("/")[-1])
+                # Write what is left when the process exits, worker processes included.
+                atexit.register(_detail_batcher.stop)
+                Finalize(_detail_batcher, _detail_batcher.stop, exitpriority=10)
+    return _detail_batcher
+
+
+def stop_detail_batcher() -> None:
+    if _detail_batcher is not None:
+        _detail_batcher.stop()
+
+
+def get_detail_batcher_stats() -> Dict[str, Any]:
+    return _detail_batcher.stats() if _detail_batcher is not None else {}
@@ -0,0 +1,182 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from abc import ABC, abstractmethod
+from itertools import islice
+
+from github_tests_validator_app.config import SQL_UPSERT_BATCH_SIZE
+from github_tests_validator_app.lib.connectors.bigquery_batcher import (
+    deduplicate_rows,
+    get_detail_batcher,
+)
+from github_tests_validator_app.lib.metrics import timed
+from sqlalchemy import Table, and_, bindparam, or_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql.dml import Delete, Insert
+
+
+class DetailWriter(ABC):
+    """
+    Write workflow_run_detail rows, replacing the existing rows of the same tests, in the
+    transaction of `connection` if given. Writers that are not `transactional` write
+    outside of it.
+    """
+
+    transactional = True
+
+    @abstractmethod
+    def write(self, rows: Iterable[Dict[str, Any]], connection: Optional[Connection] = None) -> int:
+        pass
+
+
+class BigQueryDetailWriter(DetailWriter):
+    transactional = False
+
+    def write(self, rows: Iterable[Dict[str, Any]], connection: Optional[Connection] = None) -> int:
+        # Rows of many workflow runs are written together by a single load job and MERGE.
+        return get_detail_batcher().add(
+            dict(row, created_at=row["created_at"].isoformat()) for row in rows
+        )
+
+
+class BatchDetailWriter(DetailWriter):
+    """
+    Write rows by batches of `batch_size`, in a single transaction.
+
+    Args:
+        engine (Engine): engine of the database
+        batch_size (int): number of rows per statement
+    """
+
+    def __init__(self, engine: Engine, batch_size: int = SQL_UPSERT_BATCH_SIZE) -> None:
+        self.engine = engine
+        self.batch_size = batch_size
+
+    @timed("sql_detail_write")
+    def write(self, rows: Iterable[Dict[str, Any]], connection: Optional[Connection] = None) -> int:
+        if connection is not None:
+            return self._write(rows, connection)
+        with self.engine.begin() as connection:
+            return self._write(rows, connection)
+
+    def _write(self, rows: Iterable[Dict[str, Any]], connection: Connection) -> int:
+        count = 0
+        for batch in self._batches(rows):
+            # A statement cannot update the same row twice.
+            batch = deduplicate_rows(batch)
+            self._write_batch(batch, connection)
+            count += len(batch)
+        return count
+
+    @abstractmethod
+    def _write_batch(self, batch: List[Dict[str, Any]], connection: Connection) -> None:
+        pass
+
+    def _batches(self, rows: Iterable[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        iterator = iter(rows)
+        while True:
+            batch = list(islice(iterator, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+
+class UpsertDetailWriter(BatchDetailWriter):
+    """
+    Write rows with batched `INSERT ... ON CONFLICT DO UPDATE` statements, each batch
+    being sent as a single executemany.
+
+    Args:
+        engine (Engine): engine of the database
+        table (Table): workflow_run_detail table
+        insert (Callable): dialect `insert` construct supporting `on_conflict_do_update`
+        batch_size (int): number of rows per statement
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        table: Table,
+        insert: Callable[[Table], Insert],
+        batch_size: int = SQL_UPSERT_BATCH_SIZE,
+    ) -> None:
+        super().__init__(engine, batch_size)
+        self.statement = get_upsert_statement(table, insert)
+
+    def _write_batch(self, batch: List[Dict[str, Any]], connection: Connection) -> None:
+        connection.execute(self.statement, batch)
+
+
+class ReplaceDetailWriter(BatchDetailWriter):
+    """
+    Write rows on the databases without `ON CONFLICT`: the existing rows of a batch are
+    deleted and the batch inserted, with one executemany each, in the same transaction.
+
+    Args:
+        engine (Engine): engine of the database
+        table (Table): workflow_run_detail table
+        batch_size (int): number of rows per statement
+    """
+
+    def __init__(
+        self, engine: Engine, table: Table, batch_size: int = SQL_UPSERT_BATCH_SIZE
+    ) -> None:
+        super().__init__(engine, batch_size)
+        self.primary_key = [column.name for column in table.primary_key]
+        self.delete = table.delete().where(
+            and_(*(column == bindparam(f"key_{column.name}") for column in table.primary_key))
+        )
+        self.insert = table.insert()
+
+    def _write_batch(self, batch: List[Dict[str, Any]], connection: Connection) -> None:
+        connection.execute(
+            self.delete,
+            [{f"key_{name}": row[name] for name in self.primary_key} for row in batch],
+        )
+        connection.execute(self.insert, batch)
+
+
+def get_upsert_statement(table: Table, insert: Callable[[Table], Insert]) -> Insert:
+    """
+    `INSERT ... ON CONFLICT DO UPDATE` of every column of the table on its primary key.
+    """
+    statement = insert(table)
+    return statement.on_conflict_do_update(  # type: ignore[attr-defined,no-any-return]
+        index_elements=[column.name for column in table.primary_key],
+        set_={
+            column.name: statement.excluded[column.name]  # type: ignore[attr-defined]
+            for column in table.columns
+            if not column.primary_key
+        },
+    )
+
+
+def get_replace_statements(table: Table, rows: List[Dict[str, Any]]) -> Tuple[Delete, Insert]:
+    """
+    `DELETE` of the rows of the table with the primary keys of `rows`, then multi-row
+    `INSERT` of `rows`: two statements for any number of rows on the databases without
+    `ON CONFLICT`, such as BigQuery, where each statement is a query job.
+    """
+    delete = table.delete().where(
+        or_(*(and_(*(column == row[column.name] for column in table.primary_key)) for row in rows))
+    )
+    return delete, table.insert().values(rows)
+
+
+UPSERT_INSERTS = {
+    "postgresql": postgresql_insert,
+    "sqlite": sqlite_insert,
+}
+
+
+def get_detail_writer(engine: Engine, table: Table) -> DetailWriter:
+    """
+    Return the workflow_run_detail writer matching the dialect of the engine.
+    """
+    dialect = engine.dialect.name
+    if dialect == "bigquery":
+        return BigQueryDetailWriter()
+    if dialect in UPSERT_INSERTS:
+        return UpsertDetailWriter(engine, table, UPSERT_INSERTS[dialect])
+    return ReplaceDetailWriter(engine, table)
@@ -1,22 +1,67 @@
-from typing import Any, Dict, List, Union
+from typing import IO, Any, Callable, Dict, List, Sequence, TypeVar, Union, cast
 
 import os
 import io
 import json
 import time
 import logging
+import tempfile
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 
 import requests
-from github import Auth
-from github import ContentFile, Github, GithubIntegration, Repository, UnknownObjectException
+from github import (
+    BadCredentialsException,
+    ContentFile,
+    Repository,
+    UnknownObjectException,
+)
 from github_tests_validator_app.config import (
+    ARTIFACT_CHUNK_SIZE,
+    ARTIFACT_SPOOL_MAX_SIZE,
     GH_ALL_ARTIFACT_ENDPOINT,
     GH_API,
-    GH_APP_ID,
-    GH_APP_KEY,
+    GH_ARTIFACT_LIST_MAX_PAGES,
+    GH_ARTIFACT_LOOKUP_ATTEMPTS,
+    GH_FETCH_WORKERS,
+)
+from github_tests_validator_app.lib.connectors.github_token_cache import token_cache
+from github_tests_validator_app.lib.connectors.http_session import (
+    get_github_client,
+    get_http_session,
 )
-from github_tests_validator_app.lib.utils import get_hash_files
+from github_tests_validator_app.lib.connectors.rate_limiter import rate_limiter
+from github_tests_validator_app.lib.metrics import timed, track_stage
+from github_tests_validator_app.lib.tracing import get_current_span, traced
+from github_tests_validator_app.lib.utils import (
+    TreeElement,
+    TreeEntry,
+    get_backoff_delays,
+    get_hash_files,
+    get_hash_tree_elements,
+)
+
+# Shared by all the connectors so that the number of concurrent GitHub requests stays bounded.
+fetch_pool = ThreadPoolExecutor(max_workers=GH_FETCH_WORKERS, thread_name_prefix="github-fetch")
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def rate_limited(method: F) -> F:
+    """
+    Wait for the installation budget before a PyGithub call and record what is left after.
+    """
+
+    @wraps(method)
+    def wrapper(self: "GitHubConnector", *args: Any, **kwargs: Any) -> Any:
+        rate_limiter.throttle(self.ACCESS_TOKEN)
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.observe_rate_limit()
+
+    return cast(F, wrapper)
 
 
 class GitHubConnector:
@@ -39,101 +84,292 @@ class GitHubConnector:
             logging.info("No access token provided, trying to get one ...")
             self.set_git_integration()
             self.set_access_token(repo_name)
+        if not self.ACCESS_TOKEN:
+            logging.error(f"[ERROR]: No GitHub access token available for repo: {repo_name}")
+            raise ValueError(f"No GitHub access token available for repo: {repo_name}")
 
         logging.info(f"Access token: {self.ACCESS_TOKEN[:10]}... (truncated for security)")
         
         try:
-            self.connector = Github(login_or_token=self.ACCESS_TOKEN, timeout=30)
-            self.repo = self.connector.get_repo(f"{repo_name}")
+            self.connector = get_github_client(self.ACCESS_TOKEN)
+            rate_limiter.throttle(self.ACCESS_TOKEN)
+            with track_stage("get_repo"):
+                self.repo = self.connector.get_repo(f"{repo_name}")
+            self.observe_rate_limit()
             logging.info(f"repo_name = {repo_name} and repo = {self.repo}")
             logging.info(f"Successfully connected to repo: {repo_name}")
+        except BadCredentialsException as e:
+            logging.error(f"Failed to connect to repo: {repo_name}, error: {e}")
+            if not access_token:
+                token_cache.invalidate(repo_name)
+            raise e
         except Exception as e:
             logging.error(f"Failed to connect to repo: {repo_name}, error: {e}")
             raise e
 
     def set_git_integration(self) -> None:
-        self.git_integration = GithubIntegration(
-            auth=Auth.AppAuth(app_id=GH_APP_ID, private_key=GH_APP_KEY)
-        )
+        self.git_integration = token_cache.get_integration()
 
     def set_access_token(self, repo_name: str) -> None:
-        self.ACCESS_TOKEN = self.git_integration.get_access_token(
-            installation_id=self.git_integration.get_installation(
-                repo_name.split("/")[0], repo_name.split("/")[1]
-            ).id
-        ).token
+        self.ACCESS_TOKEN = token_cache.get_token(repo_name)
+
+    def observe_rate_limit(self) -> None:
+        requester = self.connector.requester
+        remaining, limit = requester.rate_limiting
+        if limit >= 0 and self.ACCESS_TOKEN:
+            rate_limiter.update(
+                self.ACCESS_TOKEN, limit, remaining, requester.rate_limiting_resettime
+            )
 
+    @rate_limited
+    @timed("get_repo")
     def get_repo(self, repo_name: str) -> Repository.Repository:
         self.REPO_NAME = repo_name
         self.repo = self.connector.get_repo(f"{repo_name}")
         logging.info("Done.")
         return self.repo
 
+    @rate_limited
     def get_last_hash_commit(self) -> str:
         branch = self.repo.get_branch(self.BRANCH_NAME)
         logging.info(f"BRANCH NAME: {self.BRANCH_NAME}")
         return branch.commit.sha
 
-    def get_files_content(self, contents: Any) -> List[ContentFile.ContentFile]:
+    def get_files_content(
+        self, contents: Any, ref: Union[str, None] = None
+    ) -> List[ContentFile.ContentFile]:
+        """
+        Walk the directories breadth-first, listing the directories of a level concurrently.
+        """
+        ref = ref or self.BRANCH_NAME
+        contents = contents if isinstance(contents, list) else [contents]
         files_content = []
         while contents:
-            file_content = contents.pop(0)
-            if file_content.type == "dir":
-                logging.info(f"Fetching contents of directory: {file_content.path}")
-                contents.extend(self.repo.get_contents(file_content.path, ref=self.BRANCH_NAME))
-            else:
-                logging.info(f"File fetched: {file_content.path}")
-                files_content.append(file_content)
+            directories = []
+            for file_content in contents:
+                if file_content.type == "dir":
+                    logging.info(f"Fetching contents of directory: {file_content.path}")
+                    directories.append(file_content.path)
+                else:
+                    logging.info(f"File fetched: {file_content.path}")
+                    files_content.append(file_content)
+            contents = [
+                file_content
+                for directory_contents in fetch_pool.map(
+                    lambda path: self.get_directory_contents(path, ref), directories
+                )
+                for file_content in directory_contents
+            ]
         return files_content
 
+    def get_directory_contents(
+        self, path: str, ref: Union[str, None] = None
+    ) -> List[ContentFile.ContentFile]:
+        contents = self.repo.get_contents(path, ref=ref or self.BRANCH_NAME)
+        return contents if isinstance(contents, list) else [contents]
 
-    def get_hash(self, folder_name: str) -> str:
-        
-        logging.info(f"Attempting to fetch contents for folder: {folder_name} in repo {self.REPO_NAME} on branch {self.BRANCH_NAME}")
+    def prefetch_files_content(self, files_content: List[ContentFile.ContentFile]) -> None:
+        """
+        Download the content of the files concurrently so that hashing them does not wait
+        on one request per file.
+        """
+
+        def fetch(file_content: ContentFile.ContentFile) -> None:
+            if file_content.type == "file":
+                logging.debug(f"File path: {file_content.path}, Content length: {len(file_content.decoded_content)}")
+
+        list(fetch_pool.map(fetch, files_content))
+
+
+    @traced()
+    @rate_limited
+    def get_hash(self, folder_name: str, ref: Union[str, None] = None) -> str:
+        ref = ref or self.BRANCH_NAME
+        logging.info(f"Attempting to fetch contents for folder: {folder_name} in repo {self.REPO_NAME} on ref {ref}")
         try:
-            contents = self.repo.get_contents(folder_name, ref=self.BRANCH_NAME)
+            contents = self.repo.get_contents(folder_name, ref=ref)
         except UnknownObjectException as e:
             logging.error(f"Failed to fetch folder '{folder_name}'. Error: {e}")
             raise e
 
-        files_content = self.get_files_content(contents)
+        files_content = self.get_files_content(contents, ref)
         logging.info(f"Number of files fetched from folder {folder_name}: {len(files_content)}")
-        for file_content in files_content:
-            logging.debug(f"File path: {file_content.path}, Content length: {len(file_content.decoded_content) if file_content.type == 'file' else 'N/A'}")
-        
+        get_current_span().set_attributes(
+            {"github.repository": self.REPO_NAME, "github.file_count": len(files_content)}
+        )
+        self.prefetch_files_content(files_content)
+
         hash_value = str(get_hash_files(files_content))
         logging.info(f"Generated hash for folder {folder_name}: {hash_value}")
         return hash_value
 
 
-    def get_all_artifacts(self) -> Union[requests.models.Response, Any]:
-        url = f"https://api.github.com/repos/{self.REPO_NAME}/actions/artifacts"
+    @traced()
+    @rate_limited
+    def get_tree_elements(
+        self, folder_name: str, ref: Union[str, None] = None
+    ) -> Sequence[TreeEntry]:
+        """
+        List the elements under a folder with a single recursive Git Trees API call.
+
+        When the tree of the repository is too large to be returned whole, the folder is
+        found from the root tree and its own subtree is fetched instead.
+        """
+        ref = ref or self.BRANCH_NAME
+        logging.info(f"Fetching tree of folder: {folder_name} in repo {self.REPO_NAME} on ref {ref}")
+        tree = self.repo.get_git_tree(ref, recursive=True)
+
+        folder_name = folder_name.strip("/")
+        elements: Sequence[TreeEntry]
+        if tree.raw_data.get("truncated"):
+            logging.warning(f"Tree of repo {self.REPO_NAME} is truncated, fetching the subtree of {folder_name}.")
+            elements = self._get_folder_elements(folder_name, ref)
+        else:
+            elements = [
+                element
+                for element in tree.tree
+                if element.path == folder_name or element.path.startswith(f"{folder_name}/")
+            ]
+        if not elements:
+            message = f"Failed to fetch folder '{folder_name}'. Not found in tree {tree.sha}."
+            logging.error(message)
+            raise UnknownObjectException(404, {"message": message}, None)
+        logging.info(f"Number of elements fetched from folder {folder_name}: {len(elements)}")
+        get_current_span().set_attributes(
+            {"github.repository": self.REPO_NAME, "github.file_count": len(elements)}
+        )
+        return elements
+
+    def _get_folder_elements(self, folder_name: str, ref: str) -> List[TreeElement]:
+        """
+        Find the folder by walking the trees of its parents from the root, then list it with
+        its own subtree. Empty if the folder does not exist.
+        """
+        folder = TreeElement(folder_name, "tree", ref)
+        for name in folder_name.split("/"):
+            if folder.type != "tree":
+                return []
+            entries = {element.path: element for element in self.repo.get_git_tree(folder.sha).tree}
+            if name not in entries:
+                return []
+            folder = TreeElement(folder_name, entries[name].type, entries[name].sha)
+        if folder.type != "tree":
+            return [folder]
+        return [folder, *self._get_subtree_elements(folder.sha, folder_name)]
+
+    def _get_subtree_elements(self, sha: str, prefix: str) -> List[TreeElement]:
+        """
+        Elements of a subtree, with their path from the root of the repository. A subtree
+        still truncated is walked one level at a time.
+        """
+        tree = self.repo.get_git_tree(sha, recursive=True)
+        if not tree.raw_data.get("truncated"):
+            return [
+                TreeElement(f"{prefix}/{element.path}", element.type, element.sha)
+                for element in tree.tree
+            ]
+        elements = []
+        for element in self.repo.get_git_tree(sha).tree:
+            path = f"{prefix}/{element.path}"
+            elements.append(TreeElement(path, element.type, element.sha))
+            if element.type == "tree":
+                elements.extend(self._get_subtree_elements(element.sha, path))
+        return elements
+
+    def get_tree_hash(self, folder_name: str, ref: Union[str, None] = None) -> str:
+        hash_value = get_hash_tree_elements(self.get_tree_elements(folder_name, ref))
+        logging.info(f"Generated hash for folder {folder_name}: {hash_value}")
+        return hash_value
+
+    def get_all_artifacts(
+        self, params: Union[Dict[str, Any], None] = None
+    ) -> Union[Dict[str, Any], None]:
+        url = "/".join([GH_API, self.REPO_NAME, GH_ALL_ARTIFACT_ENDPOINT])
         headers = self._get_headers()
-        max_retries = 3
-        delay = 5
-        for attempt in range(max_retries):
+        max_retries = GH_ARTIFACT_LOOKUP_ATTEMPTS
+        for attempt, delay in enumerate(get_backoff_delays(max_retries), start=1):
             try:
-                response = self._request_data(url, headers=headers)
+                response = self._request_data(url, headers=headers, params=params)
                 logging.info(f"Artifacts response: {response} from {url}")
                 if response and response.get("artifacts"):
-                    logging.info(f"Artifacts fetched successfully on attempt {attempt+1}")
+                    logging.info(f"Artifacts fetched successfully on attempt {attempt}")
+                    return response
+                if attempt == max_retries:
                     return response
-                logging.warning(f"No artifacts found on attempt {attempt+1}/{max_retries}. Retrying in {delay}s...")
+                logging.warning(f"No artifacts found on attempt {attempt}/{max_retries}. Retrying in {delay:.1f}s...")
                 time.sleep(delay)
-                # return response
             except requests.exceptions.HTTPError as e:
-                if e.response.status_code == 404:
+                if e.response is not None and e.response.status_code == 404:
                     logging.error(f"No artifacts found for the repository: {self.REPO_NAME}")
                     return None
                 else:
                     raise e
+        return None
+
+    @traced()
+    @timed("artifact_list")
+    def get_workflow_run_artifact(self, workflow_run_id: int) -> Union[None, Dict[str, Any]]:
+        """
+        Find the artifact uploaded by a workflow run.
+
+        The artifacts of the run are queried directly, retrying with exponential backoff
+        while they are not listed yet. As a fallback the repository artifacts are listed
+        page by page, newest first, until the run is found or older runs are reached.
+        """
+        url = "/".join([GH_API, self.REPO_NAME, "actions/runs", str(workflow_run_id), "artifacts"])
+        headers = self._get_headers()
+        max_retries = GH_ARTIFACT_LOOKUP_ATTEMPTS
+        for attempt, delay in enumerate(get_backoff_delays(max_retries), start=1):
+            try:
+                response = self._request_data(url, headers=headers)
+            except requests.exceptions.HTTPError as e:
+                if e.response is None or e.response.status_code != 404:
+                    raise e
+                logging.warning(f"Workflow run {workflow_run_id} not found on {self.REPO_NAME}.")
+                break
+            if response.get("artifacts"):
+                logging.info(f"Artifact of workflow run {workflow_run_id} found on attempt {attempt}")
+                return cast(Dict[str, Any], response["artifacts"][0])
+            if attempt < max_retries:
+                logging.warning(f"No artifact for workflow run {workflow_run_id} on attempt {attempt}/{max_retries}. Retrying in {delay:.1f}s...")
+                time.sleep(delay)
 
+        return self.find_workflow_run_artifact(workflow_run_id)
+
+    def find_workflow_run_artifact(self, workflow_run_id: int) -> Union[None, Dict[str, Any]]:
+        per_page = 100
+        url = "/".join([GH_API, self.REPO_NAME, GH_ALL_ARTIFACT_ENDPOINT])
+        headers = self._get_headers()
+        for page in range(1, GH_ARTIFACT_LIST_MAX_PAGES + 1):
+            try:
+                response = self._request_data(
+                    url, headers=headers, params={"per_page": per_page, "page": page}
+                )
+            except requests.exceptions.HTTPError as e:
+                if e.response is not None and e.response.status_code == 404:
+                    logging.error(f"No artifacts found for the repository: {self.REPO_NAME}")
+                    return None
+                raise e
+            artifacts = response.get("artifacts", [])
+            artifact = self.get_artifact_info_from_artifacts_with_worflow_run_id(
+                artifacts, workflow_run_id
+            )
+            if artifact:
+                return artifact
+            # Artifacts are listed newest first and run ids only grow, so once every
+            # artifact of a page comes from an older run the artifact will not be found.
+            if len(artifacts) < per_page or all(
+                a.get("workflow_run", {}).get("id", 0) < workflow_run_id for a in artifacts
+            ):
+                break
+        logging.error(f"No artifact found for workflow run {workflow_run_id} on {self.REPO_NAME}.")
+        return None
 
     def get_artifact_info_from_artifacts_with_worflow_run_id(
         self, artifacts: List[Dict[str, Any]], worflow_run_id: int
     ) -> Union[None, Dict[str, Any]]:
         for artifact in artifacts:
-            if artifact["workflow_run"]["id"] == worflow_run_id:
+            if artifact.get("workflow_run", {}).get("id") == worflow_run_id:
                 return artifact
         return None
 
@@ -145,7 +381,9 @@ class GitHubConnector:
         return json.loads(decode)
 
 
-    def get_artifact(self, artifact_info: Dict[str, Any]) -> Union[requests.models.Response, Any]:
+    def get_artifact(
+        self, artifact_info: Dict[str, Any], stream: bool = False
+    ) -> requests.models.Response:
         artifact_id = str(artifact_info["id"])
         archive_format = "zip"
         url = "/".join(
@@ -158,10 +396,36 @@ class GitHubConnector:
             ]
         )
         headers = self._get_headers()
-        response = self._request_data(url, headers=headers, dict_format=False)
+        response = self._request(url, headers=headers, stream=stream)
         # logging.info(f"Artifact response: {response}")
         return response
 
+    @traced()
+    @timed("artifact_download")
+    def download_artifact(self, artifact_info: Dict[str, Any]) -> IO[bytes]:
+        """
+        Download an artifact archive in chunks into a temporary file.
+
+        The file stays in memory up to ARTIFACT_SPOOL_MAX_SIZE bytes and is rolled over to
+        disk beyond that. It is returned rewound, and must be closed by the caller.
+        """
+        artifact_file = tempfile.SpooledTemporaryFile(max_size=ARTIFACT_SPOOL_MAX_SIZE)
+        size = 0
+        try:
+            with self.get_artifact(artifact_info, stream=True) as response:
+                for chunk in response.iter_content(chunk_size=ARTIFACT_CHUNK_SIZE):
+                    artifact_file.write(chunk)
+                    size += len(chunk)
+        except Exception:
+            artifact_file.close()
+            raise
+        logging.info(f"Artifact {artifact_info['id']} downloaded: {size} bytes")
+        get_current_span().set_attributes(
+            {"github.artifact_id": artifact_info["id"], "github.artifact_bytes": size}
+        )
+        artifact_file.seek(0)
+        return cast(IO[bytes], artifact_file)
+
 
     def _get_headers(self) -> Dict[str, str]:
 
@@ -171,19 +435,23 @@ class GitHubConnector:
         }
 
 
-    def _request_data(
+    def _request(
         self,
         url: str,
         headers: Dict[str, Any],
         params: Union[Dict[str, Any], None] = None,
-        dict_format: Union[bool, None] = True,
-    ) -> Union[requests.models.Response, Any]:
-        logging.info(f"Trying to request {url} with headers {headers} and params {params}")
-        response = requests.get(url, headers=headers, params=params)
+        stream: bool = False,
+    ) -> requests.models.Response:
+        logging.info(f"Trying to request {url} with params {params}")
+        rate_limiter.throttle(self.ACCESS_TOKEN)
+        response = get_http_session().get(url, headers=headers, params=params, stream=stream)
         response.raise_for_status()
-        if dict_format:
-            return response.json()
         return response
+
+    def _request_data(
+        self, url: str, headers: Dict[str, Any], params: Union[Dict[str, Any], None] = None
+    ) -> Dict[str, Any]:
+        return cast(Dict[str, Any], self._request(url, headers, params).json())
     
     
     def get_tests_results_json(self) -> Union[Dict[str, Any], None]:
@@ -193,11 +461,11 @@ class GitHubConnector:
             artifact = next((a for a in response["artifacts"] if a["name"] == "tests-results-logs"), None)
             if artifact:
                 # Download the artifact content
-                artifact_content = self.get_artifact(artifact)
+                artifact_file = self.download_artifact(artifact)
                 try:
-                    with zipfile.ZipFile(io.BytesIO(artifact_content.content)) as z:
+                    with artifact_file, zipfile.ZipFile(artifact_file) as z:
                         with z.open('results.json') as json_file:
-                            json_content = json.load(json_file)
+                            json_content: Dict[str, Any] = json.load(json_file)
                             return json_content
                 except Exception as e:
                     logging.error(f"Failed to parse test results JSON from artifact: {e}")
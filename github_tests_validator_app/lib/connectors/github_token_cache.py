@@ -0,0 +1,130 @@
+from typing import Any, Dict, Tuple, Union
+
+import logging
+import threading
+import time
+
+from github import Auth, GithubIntegration
+from github_tests_validator_app.config import (
+    GH_API_URL,
+    GH_APP_ID,
+    GH_APP_KEY,
+    GH_TOKEN_REFRESH_MARGIN,
+)
+from github_tests_validator_app.lib.connectors.rate_limiter import rate_limiter
+from github_tests_validator_app.lib.metrics import track_stage
+
+
+class InstallationTokenCache:
+    """
+    Thread-safe cache of GitHub App installation access tokens.
+
+    Tokens are kept per installation until `refresh_margin` seconds before they expire,
+    and the installation id of each repository is remembered so that it is only looked
+    up once.
+    """
+
+    def __init__(self, refresh_margin: float = GH_TOKEN_REFRESH_MARGIN) -> None:
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._installation_locks: Dict[int, threading.Lock] = {}
+        self._installation_ids: Dict[str, int] = {}
+        self._tokens: Dict[int, Tuple[str, float]] = {}
+        self._integration: Union[GithubIntegration, None] = None
+        self.hits = 0
+        self.misses = 0
+        self.installation_lookups = 0
+
+    def get_integration(self) -> GithubIntegration:
+        with self._lock:
+            if self._integration is None:
+                self._integration = GithubIntegration(
+                    auth=Auth.AppAuth(app_id=GH_APP_ID, private_key=GH_APP_KEY),
+                    base_url=GH_API_URL,
+                )
+            return self._integration
+
+    def remember_installation(self, repo_name: str, installation_id: int) -> None:
+        with self._lock:
+            self._installation_ids[repo_name.lower()] = installation_id
+
+    def get_cached_installation_id(self, repo_name: str) -> Union[int, None]:
+        with self._lock:
+            return self._installation_ids.get(repo_name.lower())
+
+    def store_installation_id(self, repo_name: str, installation_id: int) -> None:
+        """
+        Remember an installation id looked up from the GitHub API.
+        """
+        with self._lock:
+            self.installation_lookups += 1
+            self._installation_ids[repo_name.lower()] = installation_id
+
+    def get_installation_id(self, repo_name: str) -> int:
+        installation_id = self.get_cached_installation_id(repo_name)
+        if installation_id is not None:
+            return installation_id
+
+        owner, repo = repo_name.split("/")
+        installation_id = self.get_integration().get_installation(owner, repo).id
+        self.store_installation_id(repo_name, installation_id)
+        return installation_id
+
+    def get_token(self, repo_name: str) -> str:
+        installation_id = self.get_installation_id(repo_name)
+        token = self.get_cached_token(installation_id)
+        if token:
+            return token
+
+        with self._get_installation_lock(installation_id):
+            # Another thread may have minted the token while we were waiting.
+            token = self.get_cached_token(installation_id)
+            if token:
+                return token
+            logging.info(f"Minting a new access token for installation {installation_id} ...")
+            with track_stage("token_minting"):
+                authorization = self.get_integration().get_access_token(installation_id)
+            self.store_token(
+                installation_id, authorization.token, authorization.expires_at.timestamp()
+            )
+            return str(authorization.token)
+
+    def store_token(self, installation_id: int, token: str, expires_at: float) -> None:
+        """
+        Keep a newly minted token until `refresh_margin` seconds before `expires_at`.
+        """
+        # Tokens of an installation share its budget.
+        rate_limiter.set_label(token, f"installation-{installation_id}")
+        with self._lock:
+            self.misses += 1
+            self._tokens[installation_id] = (token, expires_at)
+
+    def invalidate(self, repo_name: str) -> None:
+        with self._lock:
+            installation_id = self._installation_ids.pop(repo_name.lower(), None)
+            if installation_id is not None:
+                self._tokens.pop(installation_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "installation_lookups": self.installation_lookups,
+                "cached_tokens": len(self._tokens),
+            }
+
+    def get_cached_token(self, installation_id: int) -> Union[str, None]:
+        with self._lock:
+            cached = self._tokens.get(installation_id)
+            if cached and time.time() < cached[1] - self.refresh_margin:
+                self.hits += 1
+                return cached[0]
+            return None
+
+    def _get_installation_lock(self, installation_id: int) -> threading.Lock:
+        with self._lock:
+            return self._installation_locks.setdefault(installation_id, threading.Lock())
+
+
+token_cache = InstallationTokenCache()
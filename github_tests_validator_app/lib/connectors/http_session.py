@@ -0,0 +1,106 @@
+from typing import Any, Dict, Optional, Tuple, Union
+
+import threading
+
+import requests
+from github import Auth, Github, GithubRetry
+from github_tests_validator_app.config import (
+    GH_API_URL,
+    GH_HTTP_BACKOFF_FACTOR,
+    GH_HTTP_POOL_SIZE,
+    GH_HTTP_RETRIES,
+    GH_HTTP_TIMEOUT,
+    GH_SECONDS_BETWEEN_REQUESTS,
+)
+from github_tests_validator_app.lib.cache import TTLCache
+from github_tests_validator_app.lib.connectors.rate_limiter import rate_limiter
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+
+def get_retry() -> GithubRetry:
+    """
+    Retry policy for GitHub requests: 5xx and 429 responses are retried with exponential
+    backoff, honoring the Retry-After header, and 403 responses are retried when they come
+    from a secondary rate limit.
+    """
+    return GithubRetry(
+        total=GH_HTTP_RETRIES,
+        backoff_factor=GH_HTTP_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    def __init__(self, *args: Any, timeout: float = GH_HTTP_TIMEOUT, **kwargs: Any) -> None:
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(
+        self,
+        request: requests.PreparedRequest,
+        stream: bool = False,
+        timeout: Union[float, Tuple[Optional[float], Optional[float]], None] = None,
+        verify: Union[bool, str] = True,
+        cert: Union[str, Tuple[str, str], None] = None,
+        proxies: Optional[Dict[str, str]] = None,
+    ) -> requests.Response:
+        return super().send(
+            request,
+            stream=stream,
+            timeout=self.timeout if timeout is None else timeout,
+            verify=verify,
+            cert=cert,
+            proxies=proxies,
+        )
+
+
+_session: Union[requests.Session, None] = None
+_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """
+    Return the process-wide session, keeping connections to GitHub alive between requests.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = TimeoutHTTPAdapter(
+                    pool_connections=GH_HTTP_POOL_SIZE,
+                    pool_maxsize=GH_HTTP_POOL_SIZE,
+                    max_retries=get_retry(),
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Accept-Encoding": "gzip, deflate"})
+                session.hooks["response"].append(rate_limiter.observe_response)
+                _session = session
+    return _session
+
+
+# Clients are kept as long as the installation token they are built for.
+_github_clients = TTLCache(max_size=256, ttl=3600)
+
+
+def get_github_client(access_token: str) -> Github:
+    """
+    Return a PyGithub client for the token, reusing its connection pool across connectors.
+    """
+    client: Union[Github, None] = _github_clients.get(access_token)
+    if client is None:
+        client = Github(
+            auth=Auth.Token(access_token),
+            base_url=GH_API_URL,
+            timeout=int(GH_HTTP_TIMEOUT),
+            retry=get_retry(),
+            pool_size=GH_HTTP_POOL_SIZE,
+            seconds_between_requests=GH_SECONDS_BETWEEN_REQUESTS,
+        )
+        _github_clients.set(access_token, client)
+    return client
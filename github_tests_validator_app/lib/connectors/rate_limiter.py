@@ -0,0 +1,163 @@
+from typing import Any, Dict, Mapping, Union
+
+import hashlib
+import logging
+import threading
+import time
+
+import requests
+from github_tests_validator_app.config import (
+    GH_RATE_LIMIT_LOW_WATERMARK,
+    GH_RATE_LIMIT_MAX_WAIT,
+    GH_RATE_LIMIT_RESERVE,
+)
+
+
+class RateLimitBudget:
+    def __init__(self, limit: int, remaining: int, reset: float) -> None:
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+
+
+class RateLimiter:
+    """
+    Track the GitHub API budget of each installation token and slow down before exhausting it.
+
+    The budget is read from the X-RateLimit-* headers of the responses. Each request taken
+    from the budget is counted right away, so that concurrent events share what is left.
+    Below `low_watermark` requests, the remaining budget is spread evenly until the reset;
+    below `reserve`, requests wait for the reset. No single wait exceeds `max_wait` seconds.
+    """
+
+    def __init__(
+        self,
+        reserve: int = GH_RATE_LIMIT_RESERVE,
+        low_watermark: int = GH_RATE_LIMIT_LOW_WATERMARK,
+        max_wait: float = GH_RATE_LIMIT_MAX_WAIT,
+    ) -> None:
+        self.reserve = reserve
+        self.low_watermark = low_watermark
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._budgets: Dict[str, RateLimitBudget] = {}
+        self._labels: Dict[str, str] = {}
+
+    def set_label(self, token: str, label: str) -> None:
+        with self._lock:
+            self._labels[self._fingerprint(token)] = label
+
+    def update(
+        self,
+        token: str,
+        limit: Union[int, str, None],
+        remaining: Union[int, str, None],
+        reset: Union[float, str, None],
+    ) -> None:
+        if limit is None or remaining is None or reset is None:
+            return
+        with self._lock:
+            key = self._key(token)
+            budget = self._budgets.get(key)
+            if budget is None:
+                self._budgets[key] = RateLimitBudget(int(limit), int(remaining), float(reset))
+                return
+            if float(reset) > budget.reset:
+                # A new window started, the counts of the previous one do not matter anymore.
+                budget.remaining = int(remaining)
+            else:
+                # Responses arrive out of order: keep the lowest remaining budget.
+                budget.remaining = min(budget.remaining, int(remaining))
+            budget.limit = int(limit)
+            budget.reset = float(reset)
+
+    def update_from_headers(self, token: str, headers: Mapping[str, str]) -> None:
+        self.update(
+            token,
+            headers.get("X-RateLimit-Limit"),
+            headers.get("X-RateLimit-Remaining"),
+            headers.get("X-RateLimit-Reset"),
+        )
+
+    def observe_response(self, response: requests.Response, *args: Any, **kwargs: Any) -> None:
+        """
+        `requests` response hook reading the budget of the token used by the request.
+        """
+        authorization = response.request.headers.get("Authorization", "")
+        if isinstance(authorization, bytes):
+            authorization = authorization.decode("latin-1")
+        if authorization and "X-RateLimit-Remaining" in response.headers:
+            self.update_from_headers(authorization.split(" ")[-1], response.headers)
+
+    def throttle(self, token: Union[str, None]) -> float:
+        """
+        Take one request from the token budget, waiting first if the budget is running low.
+
+        Returns:
+            float: seconds waited
+        """
+        delay = self.acquire(token)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def acquire(self, token: Union[str, None]) -> float:
+        """
+        Take one request from the token budget without waiting, for callers that wait on
+        their own, such as coroutines.
+
+        Returns:
+            float: seconds to wait before sending the request
+        """
+        if not token:
+            return 0.0
+        with self._lock:
+            key = self._key(token)
+            budget = self._budgets.get(key)
+            if budget is None:
+                return 0.0
+            now = time.time()
+            if budget.reset <= now:
+                return 0.0
+            delay = 0.0
+            if budget.remaining <= self.reserve:
+                delay = budget.reset - now
+            elif budget.remaining <= self.low_watermark:
+                delay = (budget.reset - now) / (budget.remaining - self.reserve)
+            delay = min(delay, self.max_wait)
+            budget.remaining -= 1
+            if delay > 0:
+                budget.throttled += 1
+                budget.throttled_seconds += delay
+        if delay > 0:
+            logging.warning(
+                f"GitHub API budget of {key} is low ({budget.remaining} left), waiting {delay:.1f}s ..."
+            )
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            return {
+                key: {
+                    "limit": budget.limit,
+                    "remaining": budget.remaining,
+                    "reset_in_seconds": max(0.0, budget.reset - now),
+                    "throttled": budget.throttled,
+                    "throttled_seconds": budget.throttled_seconds,
+                }
+                for key, budget in self._budgets.items()
+            }
+
+    def _key(self, token: str) -> str:
+        fingerprint = self._fingerprint(token)
+        return self._labels.get(fingerprint, fingerprint)
+
+    @staticmethod
+    def _fingerprint(token: str) -> str:
+        return f"token-{hashlib.sha256(token.encode()).hexdigest()[:12]}"
+
+
+rate_limiter = RateLimiter()
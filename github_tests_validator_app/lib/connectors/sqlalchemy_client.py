@@ -1,15 +1,36 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import json
+import time
 import operator
 import logging
-from datetime import datetime
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from functools import reduce
 
-from github_tests_validator_app.config import SQLALCHEMY_URI, commit_ref_path
-from sqlmodel import JSON, Column, Field, Relationship, Session, SQLModel, create_engine
-from google.cloud import bigquery
+from github_tests_validator_app.config import (
+    SQL_MAX_OVERFLOW,
+    SQL_POOL_RECYCLE,
+    SQL_POOL_SIZE,
+    SQL_POOL_TIMEOUT,
+    SQLALCHEMY_URI,
+    commit_ref_path,
+)
+from github_tests_validator_app.lib.connectors.detail_writers import (
+    UPSERT_INSERTS,
+    get_detail_writer,
+    get_replace_statements,
+    get_upsert_statement,
+)
+from github_tests_validator_app.lib.metrics import track_stage
+from github_tests_validator_app.lib.tracing import get_current_span, traced
+from sqlalchemy import delete, inspect, text
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import QueuePool
+from sqlmodel import JSON, Column, Field, Relationship, Session, SQLModel, create_engine, select
 
 
 class User(SQLModel, table=True):
@@ -72,27 +93,284 @@ class RepositoryValidation(SQLModel, table=True):
     organization_or_user: str
     is_valid: bool
     info: str = Field(primary_key=True)
+    # Commits the verdict was computed for, so that it can be reused for the same commits.
+    head_sha: Optional[str] = None
+    parent_repository: Optional[str] = None
+    parent_sha: Optional[str] = None
 
     user_id: int = Field(foreign_key="user.id")
 
 
+class FolderHash(SQLModel, table=True):
+    __tablename__ = "folder_hash"
+    __table_args__ = {"extend_existing": True}
+
+    repository: str = Field(primary_key=True)
+    commit_sha: str = Field(primary_key=True)
+    folder: str = Field(primary_key=True)
+    fetch_mode: str = Field(primary_key=True)
+    hash: str
+    created_at: datetime = Field(default=datetime.now(ZoneInfo("Europe/Paris")))
+
+
+class WebhookEvent(SQLModel, table=True):
+    __tablename__ = "webhook_event"
+    __table_args__ = {"extend_existing": True}
+
+    key: str = Field(primary_key=True)
+    created_at: datetime = Field(default=datetime.now(ZoneInfo("Europe/Paris")))
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool keeping track of how long callers wait to check out a connection.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+
+    def connect(self) -> Any:
+        start = time.perf_counter()
+        connection = super().connect()
+        wait = time.perf_counter() - start
+        with self._stats_lock:
+            self.checkouts += 1
+            self.checkout_wait_total += wait
+            self.checkout_wait_max = max(self.checkout_wait_max, wait)
+        return connection
+
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """
+    Return the process-wide engine, creating it on first use.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                logging.info("Using SQLALCHEMY_URI: %s", SQLALCHEMY_URI.strip())
+                _engine = create_engine(SQLALCHEMY_URI, **get_pool_options(SQLALCHEMY_URI))
+    return _engine
+
+
+def get_pool_options(uri: str) -> Dict[str, Any]:
+    # SQLite picks its own pool depending on the database being a file or in memory.
+    if make_url(uri).get_backend_name() == "sqlite":
+        return {}
+    return dict(
+        poolclass=TimedQueuePool,
+        pool_size=SQL_POOL_SIZE,
+        max_overflow=SQL_MAX_OVERFLOW,
+        pool_recycle=SQL_POOL_RECYCLE,
+        pool_timeout=SQL_POOL_TIMEOUT,
+    )
+
+
+def ping_db() -> None:
+    """
+    Open a connection of the pool, checking that the database can be reached.
+    """
+    with get_engine().connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+def init_db() -> None:
+    """
+    Create the missing tables, meant to be run once at startup or by the migrate command.
+    """
+    logging.info("Creating database tables...")
+    engine = get_engine()
+    SQLModel.metadata.create_all(engine)
+    add_missing_columns(engine)
+    logging.info("Database tables created.")
+
+
+def add_missing_columns(engine: Engine) -> None:
+    """
+    Add the nullable columns introduced after a table was created.
+    """
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns or not column.nullable:
+                continue
+            logging.info(f"Adding column {column.name} to table {table.name}...")
+            with engine.begin() as connection:
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {preparer.format_table(table)} "
+                        f"ADD COLUMN {preparer.format_column(column)} "
+                        f"{column.type.compile(dialect=engine.dialect)}"
+                    )
+                )
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    if _engine is None:
+        return {}
+    pool = _engine.pool
+    stats: Dict[str, Any] = {"status": pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    if isinstance(pool, TimedQueuePool):
+        with pool._stats_lock:
+            stats.update(
+                checkouts=pool.checkouts,
+                checkout_wait_total_seconds=pool.checkout_wait_total,
+                checkout_wait_max_seconds=pool.checkout_wait_max,
+            )
+    return stats
+
+
+# Parents first, so that foreign keys are satisfied within the transaction.
+UNIT_OF_WORK_MODELS = (User, WorkflowRun, RepositoryValidation)
+
+
 class SQLAlchemyConnector:
     def __init__(self) -> None:
-        logging.info("Using SQLALCHEMY_URI: %s", SQLALCHEMY_URI.strip())
-        self.engine = create_engine(SQLALCHEMY_URI)
-        SQLModel.metadata.create_all(self.engine)
+        self.engine = get_engine()
+        self._lock = threading.RLock()
+        self._pending: Optional[Dict[type, Dict[Tuple[Any, ...], SQLModel]]] = None
+        # Transaction of the unit of work, opened by the first write that cannot wait for it.
+        self._session: Optional[Session] = None
+        # Writes outside of the transaction, run once it is committed.
+        self._after_commit: List[Callable[[], Any]] = []
+
+    @contextmanager
+    def unit_of_work(self) -> Iterator["SQLAlchemyConnector"]:
+        """
+        Collect the users, workflow runs and repository validations written in the block
+        and write them in a single transaction when it ends, with one bulk upsert per table.
+        Test details are written in the same transaction, or given to the BigQuery batcher
+        once it is committed. Nothing is written if the block raises. Nested blocks join the
+        outer one.
+        """
+        with self._lock:
+            if self._pending is not None:
+                nested = True
+            else:
+                nested = False
+                self._pending = {}
+        if nested:
+            yield self
+            return
+        try:
+            yield self
+            self.flush()
+        except BaseException:
+            self._rollback()
+            raise
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def flush(self) -> None:
+        """
+        Write the rows collected so far by the current unit of work and commit its
+        transaction.
+        """
+        with self._lock:
+            pending = self._take_pending()
+            session, self._session = self._session, None
+            after_commit, self._after_commit = self._after_commit, []
+        if pending or session is not None:
+            with track_stage("sql_merge"):
+                session = session or Session(self.engine)
+                try:
+                    self._write_pending(session, pending)
+                    session.commit()
+                    logging.info(
+                        f"{sum(map(len, pending.values()))} rows written in one transaction."
+                    )
+                except Exception as e:
+                    session.rollback()
+                    logging.error(f"Error writing the unit of work: {e}")
+                    raise e
+                finally:
+                    session.close()
+        for callback in after_commit:
+            callback()
+
+    def _take_pending(self) -> Dict[type, Dict[Tuple[Any, ...], SQLModel]]:
+        with self._lock:
+            pending = self._pending or {}
+            if self._pending is not None:
+                self._pending = {}
+            return pending
+
+    def _write_pending(
+        self, session: Session, pending: Dict[type, Dict[Tuple[Any, ...], SQLModel]]
+    ) -> None:
+        insert = UPSERT_INSERTS.get(self.engine.dialect.name)
+        for model in UNIT_OF_WORK_MODELS:
+            rows = list(pending.get(model, {}).values())
+            if not rows:
+                continue
+            # Table models are a union of SQLModel classes, which do not declare __table__.
+            table = model.__table__  # type: ignore[union-attr]
+            values = [
+                {column.name: getattr(row, column.name) for column in table.columns}
+                for row in rows
+            ]
+            if insert is None:
+                for statement in get_replace_statements(table, values):
+                    session.execute(statement)
+            else:
+                session.execute(get_upsert_statement(table, insert), values)
+
+    def _get_unit_connection(self) -> Optional[Connection]:
+        """
+        Connection of the transaction of the current unit of work, holding the rows
+        collected so far, or None outside of a unit of work.
+        """
+        with self._lock:
+            if self._pending is None:
+                return None
+            if self._session is None:
+                self._session = Session(self.engine)
+            session = self._session
+            pending = self._take_pending()
+        with track_stage("sql_merge"):
+            self._write_pending(session, pending)
+        return session.connection()
+
+    def _run_after_commit(self, callback: Callable[[], Any]) -> None:
+        """
+        Run `callback` once the current unit of work is committed, right away outside of one.
+        """
+        with self._lock:
+            if self._pending is not None:
+                self._after_commit.append(callback)
+                return
+        callback()
+
+    def _rollback(self) -> None:
+        with self._lock:
+            session, self._session = self._session, None
+            self._after_commit = []
+        if session is not None:
+            session.rollback()
+            session.close()
 
     def add_new_user(self, user_data: Dict[str, Any]) -> None:
-        user = User(**user_data)
-        with Session(self.engine) as session:
-            try:
-                # Use merge to handle insert or update
-                session.merge(user)
-                session.commit()
-                logging.info("User added successfully.")
-            except Exception as e:
-                session.rollback()
-                raise e
+        self._save(User(**user_data), "User")
 
     def add_new_repository_validation(
         self,
@@ -101,6 +379,9 @@ class SQLAlchemyConnector:
         payload: Dict[str, Any],
         event: str,
         info: str = "",
+        head_sha: Optional[str] = None,
+        parent_repository: Optional[str] = None,
+        parent_sha: Optional[str] = None,
     ) -> None:
         logging.info(f"Adding new repository validation ...")
         repository_validation = RepositoryValidation(
@@ -111,16 +392,34 @@ class SQLAlchemyConnector:
             user_id=user_data["id"],
             is_valid=result,
             info=info,
+            head_sha=head_sha,
+            parent_repository=parent_repository,
+            parent_sha=parent_sha,
         )
+        self._save(repository_validation, "Repository validation")
+
+    def get_repository_validation(
+        self,
+        repository: str,
+        head_sha: str,
+        parent_repository: str,
+        parent_sha: str,
+        infos: Iterable[str],
+    ) -> Optional[bool]:
+        """
+        Return the verdict recorded for the same commits of a repository and its parent.
+        """
         with Session(self.engine) as session:
-            try:
-                session.merge(repository_validation)
-                session.commit()
-                logging.info("Repository validation added successfully.")
-            except Exception as e:
-                session.rollback()
-                logging.error(f"Error adding repository validation: {e}")
-                raise e
+            repository_validation = session.exec(
+                select(RepositoryValidation).where(
+                    RepositoryValidation.repository == repository,
+                    RepositoryValidation.head_sha == head_sha,
+                    RepositoryValidation.parent_repository == parent_repository,
+                    RepositoryValidation.parent_sha == parent_sha,
+                    RepositoryValidation.info.in_(list(infos)),  # type: ignore[attr-defined]
+                )
+            ).first()
+            return repository_validation.is_valid if repository_validation else None
 
     def add_new_pytest_summary(
         self,
@@ -145,28 +444,120 @@ class SQLAlchemyConnector:
             total_error_test=artifact.get("summary", {}).get("error", 0),
             info=info,
         )
+        self._save(pytest_summary, "Pytest summary")
+
+    def _save(self, row: SQLModel, name: str) -> None:
+        with self._lock:
+            if self._pending is not None:
+                # The last write of a row wins, as it would with successive merges.
+                primary_key = row.__table__.primary_key  # type: ignore[attr-defined]
+                key = tuple(getattr(row, column.name) for column in primary_key)
+                self._pending.setdefault(type(row), {})[key] = row
+                return
+        with track_stage("sql_merge"), Session(self.engine) as session:
+            try:
+                # Use merge to handle insert or update
+                session.merge(row)
+                session.commit()
+                logging.info(f"{name} added successfully.")
+            except Exception as e:
+                session.rollback()
+                logging.error(f"Error adding {name.lower()}: {e}")
+                raise e
+
+    def get_folder_hash(
+        self, repository: str, commit_sha: str, folder: str, fetch_mode: str
+    ) -> Optional[str]:
+        with Session(self.engine) as session:
+            folder_hash = session.get(
+                FolderHash,
+                dict(
+                    repository=repository,
+                    commit_sha=commit_sha,
+                    folder=folder,
+                    fetch_mode=fetch_mode,
+                ),
+            )
+            return folder_hash.hash if folder_hash else None
+
+    def add_folder_hash(
+        self, repository: str, commit_sha: str, folder: str, fetch_mode: str, hash: str
+    ) -> None:
+        folder_hash = FolderHash(
+            repository=repository,
+            commit_sha=commit_sha,
+            folder=folder,
+            fetch_mode=fetch_mode,
+            hash=hash,
+            created_at=datetime.now(ZoneInfo("Europe/Paris")),
+        )
         with Session(self.engine) as session:
             try:
-                session.merge(pytest_summary)
+                session.merge(folder_hash)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logging.error(f"Error adding folder hash: {e}")
+                raise e
+
+    def claim_webhook_events(self, keys: List[str], ttl: float) -> bool:
+        """
+        Record the keys of an event unless one of them was recorded less than `ttl` seconds
+        ago, by this instance or another one.
+
+        Returns:
+            bool: True if the event has not been seen yet
+        """
+        now = datetime.now(ZoneInfo("Europe/Paris"))
+        with Session(self.engine) as session:
+            try:
+                recent = session.exec(
+                    select(WebhookEvent).where(
+                        WebhookEvent.key.in_(keys),  # type: ignore[attr-defined]
+                        WebhookEvent.created_at > now - timedelta(seconds=ttl),
+                    )
+                ).first()
+                if recent:
+                    return False
+                session.exec(
+                    delete(WebhookEvent).where(WebhookEvent.key.in_(keys))  # type: ignore
+                )
+                session.add_all([WebhookEvent(key=key, created_at=now) for key in keys])
                 session.commit()
-                logging.info("Pytest summary added successfully.")
+                return True
+            except IntegrityError:
+                # Another instance recorded the same event in the meantime.
+                session.rollback()
+                return False
             except Exception as e:
                 session.rollback()
-                logging.error(f"Error adding pytest summary: {e}")
+                logging.error(f"Error recording webhook event: {e}")
                 raise e
 
+    def release_webhook_events(self, keys: List[str]) -> None:
+        with Session(self.engine) as session:
+            try:
+                session.exec(
+                    delete(WebhookEvent).where(WebhookEvent.key.in_(keys))  # type: ignore
+                )
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logging.error(f"Error releasing webhook event: {e}")
+                raise e
 
+    @traced()
     def add_new_pytest_detail(
             self,
             repository: str,
             branch: str,
-            results: List[Dict[str, Any]],
+            results: Iterable[Dict[str, Any]],
             workflow_run_id: int,
         ) -> None:
         
-        summaries = [
+        summaries = (
                     dict(
-                        created_at=datetime.now(ZoneInfo("Europe/Paris")).isoformat(),
+                        created_at=datetime.now(ZoneInfo("Europe/Paris")),
                         organization_or_user=repository.split("/")[0],
                         repository=repository,
                         branch=branch,
@@ -181,82 +572,22 @@ class SQLAlchemyConnector:
                         teardown=json.dumps(test["teardown"]),
                     )
                     for test in results
-        ] 
-        
-        client        = bigquery.Client()
-        dataset       = SQLALCHEMY_URI.split("/")[-1]
-        main_table    = f"{dataset}.workflow_run_detail"
-        staging_table = f"{dataset}.staging_workflow_run_detail_{workflow_run_id}"
-
-        
-        create_staging_sql = f"""
-        CREATE TABLE `{staging_table}` 
-        LIKE `{main_table}`;
-        """
-        
-        try:
-            logging.info("Creating staging table...")
-            client.query(create_staging_sql).result()
-        except Exception as e:
-            logging.error(f"Error creating staging table: {e}")
-            raise e
-
-        try:
-            logging.info("Inserting data into staging table...")
-            errors = client.insert_rows_json(staging_table, summaries)
-            if errors:
-                raise RuntimeError(errors)
-        except Exception as e:
-            logging.error(f"Error inserting data into staging table: {e}")
-            raise e
-
-        # 2) MERGE depuis staging vers la table principale
-        merge_sql = f"""
-        MERGE `{main_table}` AS T
-        USING `{staging_table}` AS S
-        ON T.organization_or_user = S.organization_or_user
-        AND T.file_path           = S.file_path
-        AND T.test_name           = S.test_name
-        AND T.repository          = S.repository
-        WHEN MATCHED THEN
-        UPDATE SET
-            created_at           = S.created_at,
-            branch               = S.branch,
-            workflow_run_id      = S.workflow_run_id,
-            script_name          = S.script_name,
-            challenge_name       = S.challenge_name,
-            outcome              = S.outcome,
-            setup                = S.setup,
-            call                 = S.call,
-            teardown             = S.teardown
-        WHEN NOT MATCHED THEN
-        INSERT (created_at, organization_or_user, repository, branch,
-                workflow_run_id, file_path, test_name, script_name,
-                challenge_name, outcome, setup, call, teardown)
-        VALUES (S.created_at, S.organization_or_user, S.repository, S.branch,
-                S.workflow_run_id, S.file_path, S.test_name, S.script_name,
-                S.challenge_name, S.outcome, S.setup, S.call, S.teardown)
-        """
-        
-        try:
-            logging.info("Merging data from staging to main table...")
-            client.query(merge_sql).result()
-        except Exception as e:
-            logging.error(f"Error merging data: {e}")
-            raise e
-
-        
-        cleanup_sql = f"""
-        DROP TABLE `{staging_table}`;
-        """
+        )
         
         try:
-            logging.info("Dropping staging table...")
-            job = client.query(cleanup_sql)
-            job.result()
+            table = WorkflowRunDetail.__table__  # type: ignore[attr-defined]
+            writer = get_detail_writer(self.engine, table)
+            if writer.transactional:
+                # Details reference their workflow run, which is written first in the same
+                # transaction when they are part of a unit of work.
+                count = writer.write(summaries, self._get_unit_connection())
+            else:
+                # The rows cannot be rolled back once sent, they wait for the commit.
+                rows = list(summaries)
+                self._run_after_commit(lambda: writer.write(rows))
+                count = len(rows)
+            get_current_span().set_attribute("db.rows", count)
+            logging.info(f"{count} pytest details added.")
         except Exception as e:
-            logging.error(f"Error cleaning up staging table: {e}")
+            logging.error(f"Error adding pytest details: {e}")
             raise e
-
-        logging.info("Pytest details added successfully.")
-        
@@ -0,0 +1,120 @@
+from typing import Any, Dict, List, Union
+
+import logging
+import threading
+
+from github_tests_validator_app.config import (
+    EVENT_DEDUP_CACHE_SIZE,
+    EVENT_DEDUP_SQL,
+    EVENT_DEDUP_TTL,
+    SQLALCHEMY_URI,
+)
+from github_tests_validator_app.lib.cache import TTLCache
+from github_tests_validator_app.lib.connectors.sqlalchemy_client import SQLAlchemyConnector
+
+
+def get_delivery_keys(delivery_id: Union[str, None]) -> List[str]:
+    # Redeliveries of a webhook share its X-GitHub-Delivery id.
+    return [f"delivery:{delivery_id}"] if delivery_id else []
+
+
+def get_workflow_run_keys(payload: Dict[str, Any]) -> List[str]:
+    # A workflow run sends one workflow_job event per job, and again when it is re-run.
+    if "workflow_job" not in payload or "repository" not in payload:
+        return []
+    return [
+        f"workflow_run:{payload['repository']['full_name']}"
+        f":{payload['workflow_job']['run_id']}:{payload['workflow_job'].get('run_attempt', 1)}"
+        f":{payload.get('action', '')}"
+    ]
+
+
+def get_event_keys(payload: Dict[str, Any], delivery_id: Union[str, None]) -> List[str]:
+    """
+    Keys identifying a webhook event: its delivery and, for workflow_job events, its
+    workflow run.
+    """
+    return get_delivery_keys(delivery_id) + get_workflow_run_keys(payload)
+
+
+class EventDeduplicator:
+    """
+    Remember the keys of the events being processed or processed during `ttl` seconds, so
+    that duplicates are skipped. Keys are kept in memory and, with `use_sql`, in the
+    webhook_event table so that they are shared by all the instances of the application.
+    The webhook_event table relies on its primary key to reject a key recorded at the same
+    time by two instances, so it is not used on BigQuery, which does not enforce it.
+    """
+
+    def __init__(
+        self,
+        max_size: int = EVENT_DEDUP_CACHE_SIZE,
+        ttl: float = EVENT_DEDUP_TTL,
+        use_sql: bool = EVENT_DEDUP_SQL,
+    ) -> None:
+        if use_sql and SQLALCHEMY_URI.startswith("bigquery"):
+            logging.warning(
+                "EVENT_DEDUP_SQL is not supported on BigQuery, duplicate events are only "
+                "skipped by the instance receiving them."
+            )
+            use_sql = False
+        self.ttl = ttl
+        self.use_sql = use_sql
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self.claimed = 0
+        self.skipped = 0
+
+    def claim(self, keys: List[str]) -> bool:
+        """
+        Returns:
+            bool: True if none of the keys has been seen, they are then remembered
+        """
+        if not keys:
+            return True
+        with self._lock:
+            added = []
+            for key in keys:
+                if not self._cache.add(key, True):
+                    break
+                added.append(key)
+            if len(added) < len(keys):
+                for key in added:
+                    self._cache.delete(key)
+                self.skipped += 1
+                return False
+
+        if self.use_sql:
+            try:
+                claimed = SQLAlchemyConnector().claim_webhook_events(keys, self.ttl)
+            except Exception as e:
+                # Better process an event twice than not at all.
+                logging.error(f"[ERROR]: cannot check the event in the database: {e}")
+                claimed = True
+            if not claimed:
+                # The database is the reference, it knows when another instance releases them.
+                with self._lock:
+                    for key in keys:
+                        self._cache.delete(key)
+                    self.skipped += 1
+                return False
+
+        with self._lock:
+            self.claimed += 1
+        return True
+
+    def release(self, keys: List[str]) -> None:
+        """
+        Forget the keys of an event that could not be processed, so that it can be redelivered.
+        """
+        for key in keys:
+            self._cache.delete(key)
+        if self.use_sql and keys:
+            try:
+                SQLAlchemyConnector().release_webhook_events(keys)
+            except Exception as e:
+                logging.error(f"[ERROR]: cannot release the event in the database: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"size": len(self._cache), "claimed": self.claimed, "skipped": self.skipped}
@@ -0,0 +1,235 @@
+from typing import Any, Callable, Dict, List, Tuple, Union, cast
+
+import asyncio
+import logging
+import os
+import queue
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from contextvars import Context, copy_context
+
+_STOP = None
+
+# Function, arguments, error callback and context of the submitter
+Job = Tuple[Callable[..., Any], Tuple[Any, ...], Any, Context]
+
+
+class JobQueue:
+    """
+    Bounded in-process job queue consumed by background workers.
+
+    Jobs are executed by `workers` threads, in the context they were submitted from so that
+    they carry on its trace. In "process" mode each thread hands its job over to a process
+    pool of the same size, so CPU bound work does not share the GIL with the web server;
+    jobs must then be picklable. In "async" mode jobs are coroutine functions run by an
+    event loop in a background thread, `workers` of them at a time, and other functions
+    are run in the default executor of the loop.
+
+    Args:
+        workers (int): number of concurrent workers
+        max_size (int): maximum number of jobs waiting in the queue
+        mode (str): "thread", "process" or "async"
+    """
+
+    def __init__(self, workers: int, max_size: int, mode: str = "thread") -> None:
+        if mode not in ["thread", "process", "async"]:
+            raise ValueError(f"Unknown worker mode: {mode}")
+        self.workers = max(1, workers)
+        self.max_size = max_size
+        self.mode = mode
+        self._queue: "queue.Queue[Union[Job, None]]" = queue.Queue(maxsize=max_size)
+        self._threads: List[threading.Thread] = []
+        self._process_pool: Union[ProcessPoolExecutor, None] = None
+        self._loop: Union[asyncio.AbstractEventLoop, None] = None
+        self._slots = threading.Semaphore(self.workers)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+        self.running = False
+
+    def start(self) -> None:
+        if self.running:
+            return
+        if self.mode == "process":
+            self._process_pool = ProcessPoolExecutor(max_workers=self.workers)
+        if self.mode == "async":
+            self._loop = asyncio.new_event_loop()
+            # One thread runs the loop, the other takes the jobs from the queue.
+            self._threads = [
+                threading.Thread(target=self._run_loop, name="job-loop", daemon=True),
+                threading.Thread(target=self._dispatch, name="job-dispatcher", daemon=True),
+            ]
+        else:
+            self._threads = [
+                threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+        self.running = True
+        logging.info(
+            f"Job queue started with {self.workers} {self.mode} worker(s), max size {self.max_size}."
+        )
+
+    def warm_up(self) -> None:
+        """
+        Start the worker processes ahead of the first job.
+        """
+        if self._process_pool:
+            futures = [self._process_pool.submit(os.getpid) for _ in range(self.workers)]
+            for future in futures:
+                future.result()
+
+    def alive(self) -> bool:
+        """
+        Whether the workers of a running queue are all still running.
+        """
+        return not self.running or all(thread.is_alive() for thread in self._threads)
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        on_error: Union[Callable[[], Any], None] = None,
+    ) -> None:
+        """
+        Enqueue a job without blocking. `on_error` is called in this process if the job fails.
+
+        Raises:
+            queue.Full: the queue has reached its maximum size or is not running
+        """
+        if not self.running:
+            raise queue.Full("Job queue is not running.")
+        try:
+            self._queue.put_nowait((fn, args, on_error, copy_context()))
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise
+
+    def stop(self, timeout: Union[float, None] = None) -> None:
+        """
+        Stop accepting jobs and wait for the queued and in-flight jobs to finish.
+        """
+        if not self.running:
+            return
+        self.running = False
+        logging.info(f"Draining job queue ({self.depth()} job(s) waiting)...")
+        for _ in range(1 if self._loop else len(self._threads)):
+            # Sentinels are queued behind pending jobs so everything is drained first.
+            self._queue.put(_STOP)
+        if self._loop:
+            self._threads[1].join(timeout)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._loop = None
+        if self._process_pool:
+            self._process_pool.shutdown(wait=True)
+            self._process_pool = None
+        logging.info("Job queue drained.")
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "workers": self.workers,
+                "max_size": self.max_size,
+                "depth": self.depth(),
+                "in_flight": self._in_flight,
+                "processed": self._processed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+            }
+
+    def _run_loop(self) -> None:
+        loop = cast(asyncio.AbstractEventLoop, self._loop)
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_forever()
+        finally:
+            from github_tests_validator_app.lib.connectors.async_github_client import (
+                close_async_github_client,
+            )
+
+            # The connections of the GitHub client of the loop cannot outlive it.
+            loop.run_until_complete(close_async_github_client())
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
+
+    def _dispatch(self) -> None:
+        loop = cast(asyncio.AbstractEventLoop, self._loop)
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                # Wait for the jobs in flight to finish.
+                for _ in range(self.workers):
+                    self._slots.acquire()
+                for _ in range(self.workers):
+                    self._slots.release()
+                self._queue.task_done()
+                return
+            self._slots.acquire()
+            with self._lock:
+                self._in_flight += 1
+            # The task copies the context it is created in.
+            loop.call_soon_threadsafe(job[3].run, loop.create_task, self._run_async(job))
+
+    async def _run_async(self, job: Job) -> None:
+        fn, args, on_error, _ = job
+        try:
+            if asyncio.iscoroutinefunction(fn):
+                await fn(*args)
+            else:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, copy_context().run, fn, *args
+                )
+            with self._lock:
+                self._processed += 1
+        except Exception:
+            self._fail(on_error)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+            self._queue.task_done()
+
+    def _fail(self, on_error: Union[Callable[[], Any], None]) -> None:
+        with self._lock:
+            self._failed += 1
+        logging.error(traceback.format_exc())
+        if on_error:
+            try:
+                on_error()
+            except Exception:
+                logging.error(traceback.format_exc())
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                self._queue.task_done()
+                return
+            fn, args, on_error, context = job
+            with self._lock:
+                self._in_flight += 1
+            try:
+                if self._process_pool:
+                    self._process_pool.submit(fn, *args).result()
+                else:
+                    context.run(fn, *args)
+                with self._lock:
+                    self._processed += 1
+            except Exception:
+                self._fail(on_error)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                self._queue.task_done()
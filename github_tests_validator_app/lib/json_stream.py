@@ -0,0 +1,147 @@
+from typing import IO, Any, Dict, Iterator
+
+import io
+import json
+
+_WHITESPACE = " \t\n\r"
+
+
+class JSONStreamReader:
+    """
+    Incremental reader of a JSON document coming from a binary stream.
+
+    Values are decoded one at a time with `json.JSONDecoder.raw_decode` while the stream
+    is read in chunks, so only the value being decoded has to fit in memory.
+    """
+
+    def __init__(self, stream: IO[bytes], chunk_size: int = 64 * 1024) -> None:
+        self._reader = io.TextIOWrapper(stream, encoding="utf-8")
+        self._decoder = json.JSONDecoder()
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def iter_members(self) -> Iterator[str]:
+        """
+        Iterate over the keys of the object at the current position.
+
+        The value of each key must be consumed with `read_value`, `skip_value` or
+        `iter_array` before asking for the next key.
+        """
+        self._consume("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.read_value()
+            if not isinstance(key, str):
+                raise ValueError(f"Expected an object key, got {key!r}")
+            self._consume(":")
+            yield key
+            delimiter = self._peek()
+            self._pos += 1
+            if delimiter == "}":
+                return
+            if delimiter != ",":
+                raise ValueError(f"Expected ',' or '}}', got {delimiter!r}")
+
+    def iter_array(self) -> Iterator[Any]:
+        """
+        Iterate over the elements of the array at the current position, one at a time.
+        """
+        if self._peek() != "[":
+            value = self.read_value()
+            if isinstance(value, list):
+                yield from value
+            return
+        self._pos += 1
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self.read_value()
+            delimiter = self._peek()
+            self._pos += 1
+            if delimiter == "]":
+                return
+            if delimiter != ",":
+                raise ValueError(f"Expected ',' or ']', got {delimiter!r}")
+
+    def read_value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                self._fill()
+                continue
+            if not self._eof and (
+                end == len(self._buffer)
+                or (
+                    isinstance(value, (int, float)) and self._buffer[end] not in _WHITESPACE + ",]}"
+                )
+            ):
+                # A number may continue in the next chunk.
+                self._fill()
+                continue
+            self._pos = end
+            return value
+
+    def skip_value(self) -> None:
+        if self._peek() == "[":
+            for _ in self.iter_array():
+                pass
+        else:
+            self.read_value()
+
+    def _peek(self) -> str:
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if self._eof:
+                raise ValueError("Unexpected end of JSON document")
+            self._fill()
+
+    def _consume(self, char: str) -> None:
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r}, got {found!r}")
+        self._pos += 1
+
+    def _fill(self) -> None:
+        chunk = self._reader.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+        self._buffer = self._buffer[self._pos :] + chunk
+        self._pos = 0
+
+
+def load_object_without(stream: IO[bytes], skipped_key: str) -> Dict[str, Any]:
+    """
+    Load a JSON object without keeping the value of `skipped_key` in memory.
+    """
+    reader = JSONStreamReader(stream)
+    members = {}
+    for key in reader.iter_members():
+        if key == skipped_key:
+            reader.skip_value()
+        else:
+            members[key] = reader.read_value()
+    return members
+
+
+def iter_object_array(stream: IO[bytes], key: str) -> Iterator[Any]:
+    """
+    Lazily iterate over the elements of the array stored under `key` in a JSON object.
+    """
+    reader = JSONStreamReader(stream)
+    for member in reader.iter_members():
+        if member == key:
+            yield from reader.iter_array()
+            return
+        reader.skip_value()
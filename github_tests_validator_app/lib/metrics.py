@@ -0,0 +1,239 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar, cast
+
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+Sample = Tuple[str, Dict[str, str], float]
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Metric:
+    """
+    Metric rendered in the Prometheus text exposition format, with one value per set of
+    label values.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket, then +Inf, then the sum.
+                counts = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        with self._lock:
+            values = [(key, list(counts)) for key, counts in self._values.items()]
+        for key, counts in values:
+            labels = self._labels(key)
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                samples.append((f"{self.name}_bucket", dict(labels, le=le), cumulative))
+            samples.append((f"{self.name}_sum", labels, counts[-1]))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class Registry:
+    """
+    Metrics of the process, plus collectors building metrics from component stats when
+    they are scraped.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Metric]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return cast(Counter, self.register(Counter(name, documentation, labelnames)))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return cast(Gauge, self.register(Gauge(name, documentation, labelnames)))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return cast(Histogram, self.register(Histogram(name, documentation, labelnames, buckets)))
+
+    def add_collector(self, collector: Callable[[], Iterable[Metric]]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for collector in collectors:
+            metrics.extend(collector())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{n}="{escape_label_value(v)}"' for n, v in labels.items()) + "}"
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+registry = Registry()
+
+# Event being processed by the current thread, labelling the stage metrics.
+current_event: ContextVar[str] = ContextVar("current_event", default="")
+
+STAGE_SECONDS = registry.histogram(
+    "github_app_stage_duration_seconds",
+    "Duration of the stages of the webhook processing.",
+    ("event", "stage"),
+)
+STAGE_ERRORS = registry.counter(
+    "github_app_stage_errors_total",
+    "Stages of the webhook processing which raised an error.",
+    ("event", "stage"),
+)
+
+
+class track_stage:
+    """
+    Context manager timing a stage into STAGE_SECONDS and counting its errors.
+    """
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+        self.start = 0.0
+
+    def __enter__(self) -> "track_stage":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Optional[type], *args: Any) -> None:
+        event = current_event.get()
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, event=event, stage=self.stage)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(event=event, stage=self.stage)
+
+
+def timed(stage: str) -> Callable[[F], F]:
+    """
+    Decorator timing every call of a function, or coroutine function, as a stage.
+    """
+
+    def decorator(function: F) -> F:
+        if inspect.iscoroutinefunction(function):
+
+            @wraps(function)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with track_stage(stage):
+                    return await function(*args, **kwargs)
+
+            return cast(F, async_wrapper)
+
+        @wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with track_stage(stage):
+                return function(*args, **kwargs)
+
+        return cast(F, wrapper)
+
+    return decorator
+
+
+def gauges_from_stats(prefix: str, stats: Dict[str, Any]) -> List[Metric]:
+    """
+    Turn the numeric values of a component stats dict into gauges named `prefix_key`.
+    """
+    metrics: List[Metric] = []
+    for key, value in stats.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            gauge = Gauge(f"{prefix}_{key}", f"{key.replace('_', ' ').capitalize()}.")
+            gauge.set(value)
+            metrics.append(gauge)
+    return metrics
@@ -0,0 +1,167 @@
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar, Union, cast
+
+import inspect
+import logging
+from contextlib import contextmanager
+from functools import wraps
+from types import ModuleType
+
+from github_tests_validator_app.config import TRACING_EXPORTER, TRACING_SAMPLE_RATIO
+
+# None when OpenTelemetry is not installed.
+trace: Optional[ModuleType]
+try:
+    from opentelemetry import trace
+except ImportError:  # pragma: no cover
+    trace = None
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+SERVICE_NAME = "github_tests_validator_app"
+
+
+class NoOpSpan:
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        pass
+
+
+NO_OP_SPAN = NoOpSpan()
+
+# Set by `setup_tracing`, spans are not created at all until then.
+_tracer: Any = None
+_provider: Any = None
+
+
+def setup_tracing(
+    exporter: str = TRACING_EXPORTER, sample_ratio: float = TRACING_SAMPLE_RATIO
+) -> Any:
+    """
+    Send the spans of the application to `exporter`: "console", "memory" or "otlp", the
+    OTLP endpoint being read from the OTEL_EXPORTER_OTLP_* environment variables.
+    A ratio of the traces is sampled, the spans of a trace following its root span.
+
+    Returns:
+        Any: the span exporter, None if tracing is disabled or not installed
+    """
+    global _tracer, _provider
+    if exporter in ["", "none"]:
+        return None
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import (
+            BatchSpanProcessor,
+            ConsoleSpanExporter,
+            SimpleSpanProcessor,
+        )
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    except ImportError:
+        logging.warning("OpenTelemetry SDK is not installed, tracing is disabled.")
+        return None
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(sample_ratio)),
+    )
+    if exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        span_exporter = OTLPSpanExporter()
+        provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    elif exporter == "console":
+        span_exporter = ConsoleSpanExporter()
+        provider.add_span_processor(SimpleSpanProcessor(span_exporter))
+    elif exporter == "memory":
+        span_exporter = InMemorySpanExporter()
+        provider.add_span_processor(SimpleSpanProcessor(span_exporter))
+    else:
+        raise ValueError(f"Unknown tracing exporter: {exporter}")
+
+    try:
+        from opentelemetry.instrumentation.requests import RequestsInstrumentor
+
+        # One child span per GitHub request, made by PyGithub or by the connectors.
+        RequestsInstrumentor().instrument(tracer_provider=provider)
+    except ImportError:
+        logging.warning("opentelemetry-instrumentation-requests is not installed.")
+    try:
+        from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+
+        # Requests of the async GitHub connector.
+        HTTPXClientInstrumentor().instrument(tracer_provider=provider)
+    except ImportError:
+        logging.warning("opentelemetry-instrumentation-httpx is not installed.")
+
+    if trace is not None and isinstance(trace.get_tracer_provider(), trace.ProxyTracerProvider):
+        # Libraries tracing their own calls, such as the BigQuery client, use the global one.
+        trace.set_tracer_provider(provider)
+    _provider = provider
+    _tracer = provider.get_tracer(SERVICE_NAME)
+    logging.info(f"Tracing {sample_ratio:.0%} of the events with the {exporter} exporter.")
+    return span_exporter
+
+
+def stop_tracing() -> None:
+    """
+    Export the spans still buffered, meant to be called before shutting down.
+    """
+    global _tracer, _provider
+    if _provider is not None:
+        _provider.shutdown()
+    _tracer = _provider = None
+
+
+@contextmanager
+def start_span(name: str, attributes: Union[Dict[str, Any], None] = None) -> Iterator[Any]:
+    """
+    Span child of the current one, doing nothing while tracing is not set up.
+    Attributes set to None are left out.
+    """
+    if _tracer is None:
+        yield NO_OP_SPAN
+        return
+    attributes = {key: value for key, value in (attributes or {}).items() if value is not None}
+    with _tracer.start_as_current_span(name, attributes=attributes) as span:
+        yield span
+
+
+def get_current_span() -> Any:
+    if _tracer is None or trace is None:
+        return NO_OP_SPAN
+    return trace.get_current_span()
+
+
+def traced(name: Union[str, None] = None) -> Callable[[F], F]:
+    """
+    Decorator running every call of a function, or coroutine function, in a span named
+    after it.
+    """
+
+    def decorator(function: F) -> F:
+        span_name = name or function.__name__
+
+        if inspect.iscoroutinefunction(function):
+
+            @wraps(function)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                if _tracer is None:
+                    return await function(*args, **kwargs)
+                with start_span(span_name):
+                    return await function(*args, **kwargs)
+
+            return cast(F, async_wrapper)
+
+        @wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _tracer is None:
+                return function(*args, **kwargs)
+            with start_span(span_name):
+                return function(*args, **kwargs)
+
+        return cast(F, wrapper)
+
+    return decorator
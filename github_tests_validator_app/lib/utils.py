@@ -1,15 +1,30 @@
-from typing import Any, Dict, List, Optional
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Protocol,
+    Sequence,
+    TypeVar,
+)
 
 import re
 import hashlib
 import logging
 import random
+from concurrent.futures import Executor, Future
+from contextvars import copy_context
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
 from github import ContentFile, GithubException
+from github_tests_validator_app.config import GH_BACKOFF_BASE_DELAY, GH_BACKOFF_MAX_DELAY
 from github_tests_validator_app.lib.connectors.sqlalchemy_client import User
 
+T = TypeVar("T")
 
 
 def get_hash_files(contents: List[ContentFile.ContentFile]) -> str:
@@ -28,6 +43,73 @@ def get_hash_files(contents: List[ContentFile.ContentFile]) -> str:
     logging.info(f"Generated hash value: {hash_value}")
     return hash_value
 
+class TreeEntry(Protocol):
+    """
+    Attributes of an element of a Git tree that are hashed, such as PyGithub's
+    GitTreeElement or a `TreeElement`.
+    """
+
+    @property
+    def path(self) -> str:
+        ...
+
+    @property
+    def type(self) -> str:
+        ...
+
+    @property
+    def sha(self) -> str:
+        ...
+
+
+class TreeElement(NamedTuple):
+    """
+    Element of a Git tree, with the attributes of PyGithub's GitTreeElement that are hashed.
+    """
+
+    path: str
+    type: str
+    sha: str
+
+
+def get_hash_tree_elements(elements: Sequence[TreeEntry]) -> str:
+    """
+    Hash the git object SHAs of the files of a folder.
+
+    Elements are taken level by level, in path order, which is the order the files are
+    visited by `GitHubConnector.get_files_content`.
+    """
+    hash = hashlib.sha256()
+
+    for element in sorted(elements, key=lambda element: (element.path.count("/"), element.path)):
+        if element.type == "tree":
+            continue
+        logging.info(f"Hashing {element.type} SHA for: {element.path}, SHA: {element.sha}")
+        hash.update(element.sha.encode())
+
+    hash_value = str(hash.hexdigest())
+    logging.info(f"Generated hash value: {hash_value}")
+    return hash_value
+
+
+def get_backoff_delays(
+    attempts: int, base: float = GH_BACKOFF_BASE_DELAY, cap: float = GH_BACKOFF_MAX_DELAY
+) -> Iterator[float]:
+    """
+    Delays to wait after each attempt: exponential backoff with full jitter.
+    """
+    for attempt in range(attempts):
+        yield random.uniform(0, min(cap, base * 2**attempt))  # nosec B311
+
+
+def submit_with_context(executor: Executor, fn: Callable[..., T], *args: Any) -> "Future[T]":
+    """
+    Submit a call running in a copy of the current context, so that context variables such
+    as the event being processed follow it into the executor thread.
+    """
+    return executor.submit(copy_context().run, fn, *args)
+
+
 def init_github_user_from_github_event(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
 
     if not "sender" in data:
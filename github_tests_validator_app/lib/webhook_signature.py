@@ -0,0 +1,20 @@
+from typing import Union
+
+import hashlib
+import hmac
+
+SIGNATURE_PREFIX = "sha256="
+
+
+def verify_signature(body: bytes, signature: Union[str, None], secret: bytes) -> bool:
+    """
+    Check the X-Hub-Signature-256 header of a webhook: the HMAC-SHA256 of the raw body
+    keyed with the webhook secret, compared in constant time. The header is compared as
+    bytes, `compare_digest` rejects non-ASCII strings.
+    """
+    if not signature or not signature.startswith(SIGNATURE_PREFIX):
+        return False
+    expected = hmac.new(secret, body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(
+        expected.encode(), signature[len(SIGNATURE_PREFIX) :].encode("utf-8", "ignore")
+    )
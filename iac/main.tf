@@ -87,6 +87,19 @@ resource "google_secret_manager_secret_version" "GH_APP_KEY_version" {
   secret_data = var.GH_APP_KEY
 }
 
+# GH_WEBHOOK_SECRET
+resource "google_secret_manager_secret" "GH_WEBHOOK_SECRET" {
+  secret_id = "GH_WEBHOOK_SECRET"
+  replication {
+    auto {}
+  }
+}
+
+resource "google_secret_manager_secret_version" "GH_WEBHOOK_SECRET_version" {
+  secret      = google_secret_manager_secret.GH_WEBHOOK_SECRET.id
+  secret_data = var.GH_WEBHOOK_SECRET
+}
+
 # SQLALCHEMY_URI
 resource "google_secret_manager_secret" "SQLALCHEMY_URI" {
   secret_id = local.secret_sql_uri_name
@@ -124,6 +137,10 @@ resource "google_cloud_run_service" "github_test_validator_app" {
     metadata {
       annotations = {
         "run.googleapis.com/rollout-timestamp" = timestamp()
+        # Webhooks are answered before being processed: keep the CPU allocated
+        # outside of requests for the background workers and the BigQuery batcher.
+        "run.googleapis.com/cpu-throttling" = "false"
+        "autoscaling.knative.dev/minScale"  = "1"
       }
     }
     spec {
@@ -149,6 +166,15 @@ resource "google_cloud_run_service" "github_test_validator_app" {
             }
           }
         }
+        env {
+          name = "GH_WEBHOOK_SECRET"
+          value_from {
+            secret_key_ref {
+              name = "GH_WEBHOOK_SECRET"
+              key  = "latest"
+            }
+          }
+        }
         env {
           name = local.secret_sql_uri_name
           value_from {
@@ -36,6 +36,11 @@ variable "GH_APP_KEY" {
   type        = string
 }
 
+variable "GH_WEBHOOK_SECRET" {
+  description = "The webhook secret of the GitHub App."
+  type        = string
+}
+
 variable "SQLALCHEMY_URI" {
   description = "The SQLAlchemy connection URI."
   type        = string
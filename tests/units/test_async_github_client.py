@@ -0,0 +1,216 @@
+import asyncio
+import base64
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+from github_tests_validator_app.lib.connectors import async_github_client
+from github_tests_validator_app.lib.connectors.async_github_client import (
+    AsyncGitHubClient,
+    AsyncGitHubConnector,
+)
+from github_tests_validator_app.lib.connectors.github_token_cache import InstallationTokenCache
+from github_tests_validator_app.lib.utils import get_hash_files, get_hash_tree_elements
+
+API = "https://api.github.com/repos/owner/repo"
+
+
+def get_client(routes, requests=None):
+    """
+    Client answering `routes`, a dict of (method, url) to response or callable.
+    """
+
+    async def handler(request):
+        if requests is not None:
+            requests.append(request)
+        route = routes[(request.method, str(request.url))]
+        return route(request) if callable(route) else route
+
+    return AsyncGitHubClient(http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+def get_connector(routes, requests=None):
+    return AsyncGitHubConnector(
+        {"organization_or_user": "owner"},
+        "owner/repo",
+        "main",
+        "token",
+        get_client(routes, requests),
+    )
+
+
+def test_connector_fetches_repository_and_branch():
+    routes = {
+        ("GET", API): httpx.Response(
+            200, json={"full_name": "owner/repo", "parent": {"full_name": "teacher/repo"}}
+        ),
+        ("GET", f"{API}/branches/main"): httpx.Response(200, json={"commit": {"sha": "abc"}}),
+    }
+
+    async def connect():
+        connector = await AsyncGitHubConnector.create(
+            {"organization_or_user": "owner"}, "owner/repo", "main", "token", get_client(routes)
+        )
+        return connector.parent_full_name, await connector.get_last_hash_commit()
+
+    assert asyncio.run(connect()) == ("teacher/repo", "abc")
+
+
+def test_get_tree_hash_matches_the_synchronous_hash():
+    tree = [
+        {"path": ".github/workflows", "type": "tree", "sha": "t"},
+        {"path": ".github/workflows/b.yml", "type": "blob", "sha": "b"},
+        {"path": ".github/workflows/a.yml", "type": "blob", "sha": "a"},
+        {"path": "README.md", "type": "blob", "sha": "r"},
+    ]
+    routes = {
+        ("GET", f"{API}/git/trees/abc?recursive=1"): httpx.Response(
+            200, json={"sha": "abc", "tree": tree}
+        )
+    }
+    folder_hash = asyncio.run(get_connector(routes).get_tree_hash(".github/workflows", "abc"))
+    elements = [SimpleNamespace(**element) for element in tree[:3]]
+    assert folder_hash == get_hash_tree_elements(elements)
+
+
+def test_get_tree_hash_fetches_the_subtree_of_a_truncated_tree():
+    tree = [
+        {"path": ".github/workflows", "type": "tree", "sha": "t"},
+        {"path": ".github/workflows/b.yml", "type": "blob", "sha": "b"},
+        {"path": ".github/workflows/a.yml", "type": "blob", "sha": "a"},
+    ]
+    routes = {
+        ("GET", f"{API}/git/trees/abc?recursive=1"): httpx.Response(
+            200, json={"sha": "abc", "tree": [], "truncated": True}
+        ),
+        ("GET", f"{API}/git/trees/abc"): httpx.Response(
+            200, json={"sha": "abc", "tree": [{"path": ".github", "type": "tree", "sha": "g"}]}
+        ),
+        ("GET", f"{API}/git/trees/g"): httpx.Response(
+            200, json={"sha": "g", "tree": [{"path": "workflows", "type": "tree", "sha": "t"}]}
+        ),
+        ("GET", f"{API}/git/trees/t?recursive=1"): httpx.Response(
+            200,
+            json={
+                "sha": "t",
+                "tree": [
+                    {"path": "b.yml", "type": "blob", "sha": "b"},
+                    {"path": "a.yml", "type": "blob", "sha": "a"},
+                ],
+            },
+        ),
+    }
+    folder_hash = asyncio.run(get_connector(routes).get_tree_hash(".github/workflows", "abc"))
+    assert folder_hash == get_hash_tree_elements([SimpleNamespace(**element) for element in tree])
+
+
+def test_get_hash_walks_the_folder_and_downloads_the_files():
+    def entry(path, type, content=None):
+        data = {"path": path, "type": type, "sha": f"sha-{path}"}
+        if content is not None:
+            data["content"] = base64.b64encode(content).decode()
+        return data
+
+    contents = f"{API}/contents"
+    routes = {
+        ("GET", f"{contents}/w?ref=abc"): httpx.Response(
+            200, json=[entry("w/a.yml", "file"), entry("w/d", "dir")]
+        ),
+        ("GET", f"{contents}/w/d?ref=abc"): httpx.Response(200, json=[entry("w/d/b.yml", "file")]),
+        ("GET", f"{contents}/w/a.yml?ref=abc"): httpx.Response(
+            200, json=entry("w/a.yml", "file", b"a")
+        ),
+        ("GET", f"{contents}/w/d/b.yml?ref=abc"): httpx.Response(
+            200, json=entry("w/d/b.yml", "file", b"b")
+        ),
+    }
+    folder_hash = asyncio.run(get_connector(routes).get_hash("w", "abc"))
+    files = [
+        SimpleNamespace(type="file", path="w/a.yml", decoded_content=b"a"),
+        SimpleNamespace(type="file", path="w/d/b.yml", decoded_content=b"b"),
+    ]
+    assert folder_hash == get_hash_files(files)
+
+
+def test_requests_are_retried_and_observed_by_the_rate_limiter(mocker):
+    update = mocker.patch.object(async_github_client.rate_limiter, "update_from_headers")
+    responses = iter(
+        [
+            httpx.Response(502, headers={"Retry-After": "0"}),
+            httpx.Response(403, headers={"Retry-After": "0"}),
+            httpx.Response(
+                200, json={"commit": {"sha": "abc"}}, headers={"X-RateLimit-Remaining": "9"}
+            ),
+        ]
+    )
+    routes = {("GET", f"{API}/branches/main"): lambda request: next(responses)}
+    assert asyncio.run(get_connector(routes).get_last_hash_commit()) == "abc"
+    assert update.call_count == 3
+    assert update.call_args.args[0] == "token"
+
+
+def test_errors_are_raised_after_the_retries(mocker):
+    mocker.patch.object(async_github_client, "GH_HTTP_RETRIES", 1)
+    requests = []
+    routes = {("GET", f"{API}/branches/main"): httpx.Response(500, headers={"Retry-After": "0"})}
+    try:
+        asyncio.run(get_connector(routes, requests).get_last_hash_commit())
+    except httpx.HTTPStatusError as e:
+        assert e.response.status_code == 500
+    else:
+        raise AssertionError("HTTPStatusError not raised")
+    assert len(requests) == 2
+
+
+def test_download_artifact_streams_the_redirected_archive_without_the_token():
+    requests = []
+    blob_url = "https://blob.example.com/artifact.zip"
+    routes = {
+        ("GET", f"{API}/actions/artifacts/7/zip"): httpx.Response(
+            302, headers={"Location": blob_url}
+        ),
+        ("GET", blob_url): httpx.Response(200, content=b"zip" * 1000),
+    }
+    artifact_file = asyncio.run(get_connector(routes, requests).download_artifact({"id": 7}))
+    with artifact_file:
+        assert artifact_file.read() == b"zip" * 1000
+    assert requests[0].headers["Authorization"] == "Bearer token"
+    assert "Authorization" not in requests[1].headers
+
+
+def test_get_workflow_run_artifact_falls_back_to_the_artifacts_list(mocker):
+    mocker.patch.object(async_github_client, "get_backoff_delays", return_value=[0])
+    artifact = {"id": 1, "workflow_run": {"id": 10}}
+    routes = {
+        ("GET", f"{API}/actions/runs/10/artifacts"): httpx.Response(200, json={"artifacts": []}),
+        ("GET", f"{API}/actions/artifacts?per_page=100&page=1"): httpx.Response(
+            200, json={"artifacts": [{"id": 2, "workflow_run": {"id": 11}}, artifact]}
+        ),
+    }
+    assert asyncio.run(get_connector(routes).get_workflow_run_artifact(10)) == artifact
+
+
+def test_installation_token_is_minted_once_for_concurrent_events(mocker):
+    token_cache = InstallationTokenCache(refresh_margin=300)
+    mocker.patch.object(async_github_client, "token_cache", token_cache)
+    mocker.patch.object(AsyncGitHubClient, "_get_app_authorization", return_value="Bearer jwt")
+    expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    minted = []
+
+    def create_token(request):
+        minted.append(request.headers["Authorization"])
+        expiration = expires_at.strftime("%Y-%m-%dT%H:%M:%SZ")
+        return httpx.Response(201, json={"token": f"token-{len(minted)}", "expires_at": expiration})
+
+    routes = {
+        ("GET", f"{API}/installation"): httpx.Response(200, json={"id": 42}),
+        ("POST", "https://api.github.com/app/installations/42/access_tokens"): create_token,
+    }
+    client = get_client(routes)
+
+    async def get_tokens():
+        return await asyncio.gather(*(client.get_token("owner/repo") for _ in range(5)))
+
+    assert asyncio.run(get_tokens()) == ["token-1"] * 5
+    assert minted == ["Bearer jwt"]
+    assert token_cache.get_token("owner/repo") == "token-1"
@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+from github_tests_validator_app.lib.connectors.bigquery_batcher import (
+    BigQueryDetailBatcher,
+    deduplicate_rows,
+)
+
+
+def get_row(test_name, outcome="passed", repository="user/repo"):
+    return dict(
+        organization_or_user=repository.split("/")[0],
+        repository=repository,
+        file_path="tests/test_a.py",
+        test_name=test_name,
+        outcome=outcome,
+    )
+
+
+@pytest.fixture
+def client(mocker):
+    client = mocker.MagicMock()
+    client.project = "project"
+    client.get_table.return_value.schema = []
+    return client
+
+
+def test_deduplicate_rows_keeps_last_row_of_a_key():
+    rows = [
+        get_row("a"),
+        get_row("b"),
+        get_row("a", "failed"),
+        get_row("a", repository="other/repo"),
+    ]
+    assert deduplicate_rows(rows) == [
+        get_row("b"),
+        get_row("a", "failed"),
+        get_row("a", repository="other/repo"),
+    ]
+
+
+def test_flush_writes_runs_with_one_load_job_and_one_merge(client):
+    batcher = BigQueryDetailBatcher("dataset", max_rows=100, max_seconds=60, client=client)
+    batcher.add([get_row("a"), get_row("b")])
+    batcher.add([get_row("a", "failed")])
+    batcher.flush()
+
+    client.load_table_from_json.assert_called_once()
+    rows, staging_table = client.load_table_from_json.call_args.args
+    assert rows == [get_row("b"), get_row("a", "failed")]
+    client.query.assert_called_once()
+    assert "MERGE `dataset.workflow_run_detail`" in client.query.call_args.args[0]
+    assert staging_table in client.query.call_args.args[0]
+    client.delete_table.assert_called_once_with(staging_table, not_found_ok=True)
+    assert batcher.stats() == {
+        "pending_rows": 0,
+        "batches": 1,
+        "rows_written": 2,
+        "failed_batches": 0,
+    }
+    batcher.stop()
+
+
+def test_batch_is_written_when_full(client):
+    batcher = BigQueryDetailBatcher("dataset", max_rows=3, max_seconds=60, client=client)
+    batcher.add([get_row(str(i)) for i in range(3)])
+    for _ in range(100):
+        if batcher.batches:
+            break
+        time.sleep(0.01)
+    assert batcher.batches == 1
+    batcher.stop()
+
+
+def test_rows_are_consumed_without_blocking_other_adds(client):
+    batcher = BigQueryDetailBatcher("dataset", max_rows=100, max_seconds=60, client=client)
+
+    def rows():
+        yield get_row("a")
+        # Another event adds its rows while the artifact of this one is being parsed.
+        other = threading.Thread(target=batcher.add, args=([get_row("b")],))
+        other.start()
+        other.join(timeout=1)
+        assert not other.is_alive()
+        yield get_row("c")
+
+    assert batcher.add(rows()) == 2
+    assert batcher.stats()["pending_rows"] == 3
+    batcher.stop()
+
+
+def test_batch_is_written_after_max_seconds(client):
+    batcher = BigQueryDetailBatcher("dataset", max_rows=100, max_seconds=0.05, client=client)
+    batcher.add([get_row("a")])
+    for _ in range(100):
+        if batcher.batches:
+            break
+        time.sleep(0.01)
+    assert batcher.batches == 1
+    batcher.stop()
+
+
+def test_failed_batch_is_retried_with_the_next_one(client, mocker):
+    client.query.side_effect = [RuntimeError("boom"), mocker.MagicMock()]
+    batcher = BigQueryDetailBatcher("dataset", max_rows=100, max_seconds=60, client=client)
+    batcher.add([get_row("a")])
+    batcher.flush()
+    assert batcher.stats()["pending_rows"] == 1
+    assert batcher.failed_batches == 1
+    batcher.add([get_row("b")])
+    batcher.stop()
+    assert client.load_table_from_json.call_args.args[0] == [get_row("a"), get_row("b")]
+    assert batcher.rows_written == 2
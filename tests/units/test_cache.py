@@ -0,0 +1,36 @@
+from github_tests_validator_app.lib.cache import TTLCache
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats() == {"size": 2, "hits": 3, "misses": 1}
+
+
+def test_ttl_cache_expires_entries(mocker):
+    monotonic = mocker.patch("github_tests_validator_app.lib.cache.time.monotonic")
+    monotonic.return_value = 0
+    cache = TTLCache(max_size=2, ttl=10)
+    cache.set("a", 1)
+    monotonic.return_value = 9
+    assert cache.get("a") == 1
+    monotonic.return_value = 10
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_add_only_sets_missing_keys(mocker):
+    monotonic = mocker.patch("github_tests_validator_app.lib.cache.time.monotonic")
+    monotonic.return_value = 0
+    cache = TTLCache(max_size=2, ttl=10)
+    assert cache.add("a", 1)
+    assert not cache.add("a", 2)
+    monotonic.return_value = 10
+    assert cache.add("a", 3)
+    assert cache.get("a") == 3
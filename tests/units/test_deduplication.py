@@ -0,0 +1,88 @@
+import queue
+
+import pytest
+from github_tests_validator_app.bin import github_event_process
+from github_tests_validator_app.bin.github_event_process import EventCoalescer, dispatch
+from github_tests_validator_app.lib import deduplication
+from github_tests_validator_app.lib.connectors import sqlalchemy_client
+from github_tests_validator_app.lib.deduplication import EventDeduplicator, get_event_keys
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, create_engine
+
+PAYLOAD = {
+    "action": "completed",
+    "repository": {"full_name": "user/repo"},
+    "workflow_job": {"run_id": 42, "head_branch": "main"},
+}
+
+
+def test_get_event_keys():
+    assert get_event_keys(PAYLOAD, "delivery-1") == [
+        "delivery:delivery-1",
+        "workflow_run:user/repo:42:1:completed",
+    ]
+    assert get_event_keys({"action": "opened", "pull_request": {}}, None) == []
+
+
+def test_deduplicator_skips_seen_keys_until_released():
+    deduplicator = EventDeduplicator(max_size=10, ttl=60, use_sql=False)
+    assert deduplicator.claim(["delivery:1", "workflow_run:a"])
+    assert not deduplicator.claim(["delivery:2", "workflow_run:a"])
+    # A rejected event does not leave its other keys behind.
+    assert deduplicator.claim(["delivery:2"])
+    deduplicator.release(["delivery:1", "workflow_run:a"])
+    assert deduplicator.claim(["delivery:1", "workflow_run:a"])
+    assert deduplicator.stats() == {"size": 3, "claimed": 3, "skipped": 1}
+
+
+def test_deduplicator_shares_keys_through_the_database(mocker):
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    mocker.patch.object(sqlalchemy_client, "_engine", engine)
+    instance_1 = EventDeduplicator(max_size=10, ttl=60, use_sql=True)
+    instance_2 = EventDeduplicator(max_size=10, ttl=60, use_sql=True)
+    assert instance_1.claim(["delivery:1"])
+    assert not instance_2.claim(["delivery:1"])
+    instance_1.release(["delivery:1"])
+    assert instance_2.claim(["delivery:1"])
+
+
+def test_deduplicator_does_not_use_the_database_on_bigquery(mocker):
+    mocker.patch.object(deduplication, "SQLALCHEMY_URI", "bigquery://project/dataset")
+    assert not EventDeduplicator(max_size=10, ttl=60, use_sql=True).use_sql
+
+
+@pytest.fixture
+def deduplicator(mocker):
+    deduplicator = EventDeduplicator(max_size=10, ttl=60, use_sql=False)
+    mocker.patch.object(github_event_process, "event_deduplicator", deduplicator)
+    mocker.patch.object(github_event_process, "event_coalescer", EventCoalescer(window=0))
+    mocker.patch.object(github_event_process, "get_event", return_value="workflow_job")
+    return deduplicator
+
+
+def test_dispatch_submits_each_event_once(deduplicator, mocker):
+    submit = mocker.Mock()
+    assert dispatch(PAYLOAD, "delivery-1", submit)
+    assert not dispatch(PAYLOAD, "delivery-1", submit)
+    assert not dispatch(PAYLOAD, "delivery-2", submit)
+    submit.assert_called_once()
+
+    # The event is forgotten when its processing fails.
+    submit.call_args.kwargs["on_error"]()
+    assert dispatch(PAYLOAD, "delivery-1", submit)
+
+
+def test_dispatch_processes_each_attempt_of_a_workflow_run(deduplicator, mocker):
+    submit = mocker.Mock()
+    assert dispatch(PAYLOAD, "delivery-1", submit)
+    rerun = {**PAYLOAD, "workflow_job": {**PAYLOAD["workflow_job"], "run_attempt": 2}}
+    assert dispatch(rerun, "delivery-2", submit)
+    assert not dispatch(rerun, "delivery-3", submit)
+    assert submit.call_count == 2
+
+
+def test_dispatch_forgets_rejected_events(deduplicator, mocker):
+    with pytest.raises(queue.Full):
+        dispatch(PAYLOAD, "delivery-1", mocker.Mock(side_effect=queue.Full))
+    assert dispatch(PAYLOAD, "delivery-1", mocker.Mock())
@@ -0,0 +1,97 @@
+from datetime import datetime
+
+import pytest
+from github_tests_validator_app.lib.connectors import detail_writers, sqlalchemy_client
+from github_tests_validator_app.lib.connectors.detail_writers import (
+    BigQueryDetailWriter,
+    ReplaceDetailWriter,
+    UpsertDetailWriter,
+    get_detail_writer,
+)
+from github_tests_validator_app.lib.connectors.sqlalchemy_client import (
+    SQLAlchemyConnector,
+    WorkflowRunDetail,
+)
+from sqlmodel import Session, SQLModel, create_engine, select
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def get_test(test_name, outcome="passed"):
+    return dict(
+        file_path="tests/test_a.py",
+        test_name=test_name,
+        script_name="a.py",
+        challenge_name="a",
+        outcome=outcome,
+        setup={},
+        call={"duration": 0.1},
+        teardown={},
+    )
+
+
+def test_get_detail_writer_by_dialect(engine, mocker):
+    assert isinstance(get_detail_writer(engine, WorkflowRunDetail.__table__), UpsertDetailWriter)
+    bigquery_engine = mocker.Mock()
+    bigquery_engine.dialect.name = "bigquery"
+    assert isinstance(
+        get_detail_writer(bigquery_engine, WorkflowRunDetail.__table__), BigQueryDetailWriter
+    )
+    other_engine = mocker.Mock()
+    other_engine.dialect.name = "mssql"
+    assert isinstance(
+        get_detail_writer(other_engine, WorkflowRunDetail.__table__), ReplaceDetailWriter
+    )
+
+
+def test_add_new_pytest_detail_upserts_rows_on_sqlite(engine, mocker):
+    mocker.patch.object(detail_writers, "SQL_UPSERT_BATCH_SIZE", 2)
+    mocker.patch.object(sqlalchemy_client, "_engine", engine)
+    connector = SQLAlchemyConnector()
+    connector.add_new_pytest_detail("user/repo", "main", (get_test(str(i)) for i in range(5)), 1)
+    connector.add_new_pytest_detail(
+        "user/repo", "main", [get_test("0", "failed"), get_test("5")], 2
+    )
+
+    with Session(engine) as session:
+        details = {detail.test_name: detail for detail in session.exec(select(WorkflowRunDetail))}
+    assert sorted(details) == ["0", "1", "2", "3", "4", "5"]
+    assert details["0"].outcome == "failed"
+    assert details["0"].workflow_run_id == 2
+    assert details["1"].workflow_run_id == 1
+    assert details["0"].call == '{"duration": 0.1}'
+
+
+def test_replace_writer_replaces_rows(engine, mocker):
+    mocker.patch.object(sqlalchemy_client, "_engine", engine)
+    mocker.patch.object(
+        sqlalchemy_client,
+        "get_detail_writer",
+        lambda engine, table: ReplaceDetailWriter(engine, table, batch_size=2),
+    )
+    connector = SQLAlchemyConnector()
+    connector.add_new_pytest_detail("user/repo", "main", (get_test(str(i)) for i in range(5)), 1)
+    connector.add_new_pytest_detail(
+        "user/repo", "main", [get_test("0", "failed"), get_test("5")], 2
+    )
+
+    with Session(engine) as session:
+        details = {detail.test_name: detail for detail in session.exec(select(WorkflowRunDetail))}
+    assert sorted(details) == ["0", "1", "2", "3", "4", "5"]
+    assert details["0"].outcome == "failed"
+    assert details["0"].workflow_run_id == 2
+    assert details["1"].workflow_run_id == 1
+
+
+def test_bigquery_writer_sends_rows_to_the_batcher(mocker):
+    batcher = mocker.patch.object(detail_writers, "get_detail_batcher").return_value
+    added = []
+    batcher.add.side_effect = lambda rows: len(added.extend(rows) or added)
+    created_at = datetime(2024, 1, 1)
+    assert BigQueryDetailWriter().write([dict(test_name="a", created_at=created_at)]) == 1
+    assert added == [dict(test_name="a", created_at="2024-01-01T00:00:00")]
@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+from github_tests_validator_app.bin import github_app_backend
+from github_tests_validator_app.bin.github_app_backend import app
+
+
+@pytest.fixture
+def dispatch(mocker):
+    return mocker.patch.object(github_app_backend, "dispatch")
+
+
+@pytest.mark.parametrize(
+    "event_name,action,dispatched",
+    [
+        ("push", None, False),
+        ("workflow_job", "queued", False),
+        ("workflow_job", "in_progress", False),
+        ("workflow_job", "completed", True),
+        ("pull_request", "opened", True),
+        (None, "queued", True),
+    ],
+)
+def test_main_drops_ignored_events_before_decoding(dispatch, event_name, action, dispatched):
+    payload = {"action": action, "workflow_job": {"run_id": 1}} if action else {"ref": "main"}
+    headers = {"X-GitHub-Delivery": "delivery-1"}
+    if event_name:
+        headers["X-GitHub-Event"] = event_name
+    response = TestClient(app).post("/", content=json.dumps(payload), headers=headers)
+    assert response.status_code == 202
+    assert dispatch.called == dispatched
+    if dispatched:
+        assert dispatch.call_args.args[:2] == (payload, "delivery-1")
+
+
+def test_main_rejects_webhooks_with_a_wrong_signature(dispatch, mocker):
+    mocker.patch.object(github_app_backend, "webhook_secret", b"secret")
+    body = json.dumps({"action": "completed", "workflow_job": {"run_id": 1}}).encode()
+    signature = "sha256=" + hmac.new(b"secret", body, hashlib.sha256).hexdigest()
+    client = TestClient(app)
+    headers = {"X-GitHub-Event": "workflow_job"}
+
+    assert client.post("/", content=body, headers=headers).status_code == 401
+    wrong_signature = {**headers, "X-Hub-Signature-256": "sha256=" + "0" * 64}
+    assert client.post("/", content=body, headers=wrong_signature).status_code == 401
+    non_ascii_signature = {**headers, "X-Hub-Signature-256": "sha256=\u00e9".encode()}
+    assert client.post("/", content=body, headers=non_ascii_signature).status_code == 401
+    dispatch.assert_not_called()
+    right_signature = {**headers, "X-Hub-Signature-256": signature}
+    assert client.post("/", content=body, headers=right_signature).status_code == 202
+    dispatch.assert_called_once()
+
+
+def test_lifespan_refuses_to_start_without_webhook_secret(mocker):
+    mocker.patch.object(github_app_backend, "webhook_secret", b"")
+    mocker.patch.object(github_app_backend, "GH_ALLOW_UNSIGNED_WEBHOOKS", False)
+    create_tables = mocker.patch.object(github_app_backend, "create_tables")
+
+    async def start():
+        async with github_app_backend.lifespan(app):
+            pass
+
+    with pytest.raises(RuntimeError, match="GH_ALLOW_UNSIGNED_WEBHOOKS"):
+        asyncio.run(start())
+    create_tables.assert_not_called()
+
+
+def test_metrics_exposes_deliveries_stages_and_components(dispatch, mocker):
+    mocker.patch.object(github_app_backend, "webhook_secret", b"")
+    mocker.patch.object(
+        github_app_backend.rate_limiter,
+        "stats",
+        return_value={
+            "installation-1": {
+                "limit": 5000,
+                "remaining": 4321,
+                "reset_in_seconds": 10.0,
+                "throttled": 0,
+                "throttled_seconds": 0.0,
+            }
+        },
+    )
+    client = TestClient(app)
+    client.post("/", content=b'{"action": "queued"}', headers={"X-GitHub-Event": "workflow_job"})
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert (
+        'github_app_webhook_deliveries_total{event="workflow_job",outcome="ignored"}'
+        in response.text
+    )
+    assert "# TYPE github_app_stage_duration_seconds histogram" in response.text
+    assert 'github_app_github_rate_limit_remaining{budget="installation-1"} 4321.0' in response.text
+    assert "github_app_queue_depth 0.0" in response.text
+
+
+@pytest.fixture
+def server_state(mocker):
+    state = github_app_backend.ServerState()
+    mocker.patch.object(github_app_backend, "server_state", state)
+    mocker.patch.object(github_app_backend.job_queue, "running", True)
+    return state
+
+
+def test_readyz_waits_for_the_prewarm_checks(server_state, mocker):
+    def unreachable():
+        raise ConnectionError("unreachable")
+
+    checks = {"database": lambda: None, "github_app": unreachable}
+    mocker.patch.object(github_app_backend, "prewarm_checks", checks)
+    client = TestClient(app)
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["status"] == "warming_up"
+
+    github_app_backend.prewarm()
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["checks"] == {"database": "ok", "github_app": "error: unreachable"}
+
+    checks["github_app"] = lambda: None
+    github_app_backend.prewarm()
+    assert client.get("/readyz").status_code == 200
+    assert client.get("/healthz").status_code == 200
+
+    server_state.draining = True
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["status"] == "draining"
+
+
+def test_get_server_workers_defaults_to_one_per_cpu(mocker):
+    mocker.patch.object(github_app_backend.os, "cpu_count", return_value=6)
+    assert github_app_backend.get_server_workers(0) == 6
+    assert github_app_backend.get_server_workers(2) == 2
+
+
+def test_launch_app_creates_the_tables_before_starting_the_server_processes(mocker):
+    mocker.patch.dict(os.environ)
+    mocker.patch.object(github_app_backend, "SQL_CREATE_TABLES_ON_STARTUP", True)
+    mocker.patch.object(github_app_backend, "get_server_workers", return_value=4)
+    init_db = mocker.patch.object(github_app_backend, "init_db")
+    run = mocker.patch.object(github_app_backend.uvicorn, "run")
+    github_app_backend.launch_app()
+    init_db.assert_called_once()
+    assert run.call_args.kwargs["workers"] == 4
+    # The server processes do not create them again.
+    assert os.environ["SQL_CREATE_TABLES_ON_STARTUP"] == "false"
+
+
+def test_optional_dependencies_are_not_imported_with_the_application():
+    code = (
+        "import sys; import github_tests_validator_app.bin.github_app_backend; "
+        "print([m for m in ('httpx', 'google.cloud.bigquery', 'google.cloud.logging') "
+        "if m in sys.modules])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env={**os.environ, "LOGGING": "LOCAL", "WORKER_MODE": "thread"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_prewarm_imports_the_modules_of_the_configuration(mocker):
+    import_module = mocker.patch.object(github_app_backend.importlib, "import_module")
+    mocker.patch.object(github_app_backend, "WORKER_MODE", "async")
+    mocker.patch.object(github_app_backend, "SQLALCHEMY_URI", "bigquery://project/dataset")
+    github_app_backend.import_deferred_modules()
+    assert [call.args[0] for call in import_module.call_args_list] == [
+        "github_tests_validator_app.lib.connectors.async_github_client",
+        "google.cloud.bigquery",
+    ]
@@ -0,0 +1,148 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from github_tests_validator_app.bin import github_backfill
+from github_tests_validator_app.bin.github_event_process import handle_process
+from github_tests_validator_app.bin.github_backfill import (
+    BackfillCheckpoint,
+    backfill,
+    get_backfill_payload,
+    get_repository_connector,
+    list_workflow_runs,
+    reprocess,
+)
+from typer import Typer
+from typer.testing import CliRunner
+
+
+def get_payload(repository, run_id):
+    return {"repository": {"full_name": repository}, "workflow_job": {"run_id": run_id}}
+
+
+def test_checkpoint_resumes_the_runs_done(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    checkpoint = BackfillCheckpoint(path)
+    checkpoint.mark("user/repo:1", "done")
+    checkpoint.mark("user/repo:2", "failed")
+    checkpoint.mark("user/repo:3", "done")
+    checkpoint.mark("user/repo:3", "failed")
+
+    assert BackfillCheckpoint(path).done == {"user/repo:1"}
+
+
+def test_reprocess_skips_the_runs_done_and_counts_failures(tmp_path, mocker):
+    def run(payload):
+        if payload["workflow_job"]["run_id"] == 3:
+            raise RuntimeError("boom")
+
+    run = mocker.patch.object(github_backfill, "run", side_effect=run)
+    checkpoint = BackfillCheckpoint(tmp_path / "checkpoint.jsonl")
+    checkpoint.mark("user/repo:1", "done")
+    payloads = [get_payload("user/repo", run_id) for run_id in [1, 2, 3]]
+
+    assert reprocess(payloads, checkpoint, workers=2) == {"done": 1, "failed": 1, "skipped": 1}
+    assert sorted(call.args[0]["workflow_job"]["run_id"] for call in run.call_args_list) == [2, 3]
+    assert BackfillCheckpoint(checkpoint.path).done == {"user/repo:1", "user/repo:2"}
+
+
+def test_backfill_payload_is_a_completed_workflow_job():
+    workflow_run = MagicMock(id=42, run_attempt=2, head_sha="abc", head_branch="main")
+    workflow_run.actor.configure_mock(login="student", id=7, url="https://api.github.com/users/s")
+
+    payload = get_backfill_payload(workflow_run, "student/course", 3)
+
+    assert handle_process(payload) == "workflow_job"
+    assert payload["workflow_job"] == {
+        "run_id": 42,
+        "run_attempt": 2,
+        "head_sha": "abc",
+        "head_branch": "main",
+    }
+    assert payload["sender"]["login"] == "student"
+    assert payload["installation"] == {"id": 3}
+
+
+def test_list_workflow_runs_lists_the_runs_of_the_workflow(mocker):
+    connector = mocker.patch.object(github_backfill, "GitHubConnector").return_value
+    workflow_run = MagicMock(id=42, run_attempt=1, head_sha="abc", head_branch="main")
+    connector.repo.get_workflow.return_value.get_runs.return_value = [workflow_run]
+    mocker.patch.object(github_backfill, "rate_limiter")
+    mocker.patch.object(github_backfill, "token_cache")
+
+    payloads = list_workflow_runs(
+        "student/course", 3, "tests.yml", datetime(2024, 1, 1), datetime(2024, 2, 1)
+    )
+
+    assert [payload["workflow_job"]["run_id"] for payload in payloads] == [42]
+    connector.repo.get_workflow.assert_called_once_with("tests.yml")
+    connector.repo.get_workflow_runs.assert_not_called()
+    get_runs = connector.repo.get_workflow.return_value.get_runs
+    assert get_runs.call_args.kwargs["branch"] is github_backfill.NotSet
+
+    list_workflow_runs(
+        "student/course", 3, "tests.yml", datetime(2024, 1, 1), datetime(2024, 2, 1), "dev"
+    )
+    assert get_runs.call_args.kwargs["branch"] == "dev"
+
+    connector.repo.get_workflow.side_effect = github_backfill.UnknownObjectException(404)
+    assert (
+        list_workflow_runs(
+            "student/course", 3, "tests.yml", datetime(2024, 1, 1), datetime(2024, 2, 1)
+        )
+        == []
+    )
+
+
+def test_get_repository_connector_defaults_to_the_default_branch(mocker):
+    github_connector = mocker.patch.object(github_backfill, "GitHubConnector")
+    github_connector.return_value.repo.default_branch = "master"
+    assert get_repository_connector("student/course").BRANCH_NAME == "master"
+    github_connector.return_value.BRANCH_NAME = "dev"
+    assert get_repository_connector("student/course", "dev").BRANCH_NAME == "dev"
+    assert github_connector.call_args.args[2] == "dev"
+
+
+@pytest.fixture
+def cli(mocker):
+    mocker.patch.object(github_backfill, "get_installations", return_value={"student-1": 11})
+    mocker.patch.object(
+        github_backfill, "list_forks", return_value=["student-1/course", "student-2/course"]
+    )
+    list_workflow_runs = mocker.patch.object(
+        github_backfill,
+        "list_workflow_runs",
+        side_effect=lambda fork, installation_id, *args: [get_payload(fork, 1)],
+    )
+    run = mocker.patch.object(github_backfill, "run")
+    mocker.patch.object(github_backfill, "stop_detail_batcher")
+    app = Typer()
+    app.command()(backfill)
+    return app, list_workflow_runs, run
+
+
+def test_backfill_reingests_the_runs_of_the_installed_forks(cli, tmp_path):
+    app, list_workflow_runs, run = cli
+    arguments = ["teacher/course", "--workflow", "tests.yml", "--since", "2024-01-01"]
+    arguments.append("--checkpoint")
+    arguments.append(str(tmp_path / "checkpoint.jsonl"))
+
+    result = CliRunner().invoke(app, arguments)
+
+    assert result.exit_code == 0, result.output
+    assert list_workflow_runs.call_args.args[:3] == ("student-1/course", 11, "tests.yml")
+    run.assert_called_once_with(get_payload("student-1/course", 1))
+    assert "1 workflow runs re-ingested, 0 failed, 0 already done" in result.output
+
+    result = CliRunner().invoke(app, arguments)
+    assert "0 workflow runs re-ingested, 0 failed, 1 already done" in result.output
+
+
+def test_backfill_dry_run_only_lists(cli, tmp_path):
+    app, list_workflow_runs, run = cli
+    arguments = ["teacher/course", "--workflow", "tests.yml", "--since", "2024-01-01", "--dry-run"]
+    result = CliRunner().invoke(app, arguments + ["--branch", "dev"])
+    assert result.exit_code == 0, result.output
+    assert list_workflow_runs.call_args.args[-1] == "dev"
+    assert "1 runs of tests.yml between" in result.output
+    run.assert_not_called()
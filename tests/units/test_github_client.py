@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+
+import pytest
+from github_tests_validator_app.lib.connectors.github_client import GitHubConnector
+
+
+def test_get_files_content_keeps_breadth_first_order(mocker):
+    def content(path, type):
+        return SimpleNamespace(path=path, type=type)
+
+    children = {
+        "a": [content("a/c", "file"), content("a/d", "dir")],
+        "b": [content("b/e", "file")],
+        "a/d": [content("a/d/f", "file")],
+    }
+    connector = GitHubConnector.__new__(GitHubConnector)
+    connector.BRANCH_NAME = "main"
+    connector.repo = mocker.Mock()
+    connector.repo.get_contents.side_effect = lambda path, ref: children[path]
+    files_content = connector.get_files_content(
+        [content("a", "dir"), content("x", "file"), content("b", "dir")]
+    )
+    assert [file_content.path for file_content in files_content] == ["x", "a/c", "b/e", "a/d/f"]
+
+
+def test_get_files_content_accepts_a_single_content_file(mocker):
+    connector = GitHubConnector.__new__(GitHubConnector)
+    connector.BRANCH_NAME = "main"
+    connector.repo = mocker.Mock()
+    connector.repo.get_contents.return_value = SimpleNamespace(path="a/b", type="file")
+    files_content = connector.get_files_content(SimpleNamespace(path="a", type="dir"))
+    assert [file_content.path for file_content in files_content] == ["a/b"]
+    connector.repo.get_contents.assert_called_once_with("a", ref="main")
+
+
+def get_connector(mocker):
+    connector = GitHubConnector.__new__(GitHubConnector)
+    connector.REPO_NAME = "owner/repo"
+    connector.ACCESS_TOKEN = "token"
+    mocker.patch("github_tests_validator_app.lib.connectors.github_client.time.sleep")
+    return connector
+
+
+def test_get_workflow_run_artifact_retries_run_endpoint(mocker):
+    connector = get_connector(mocker)
+    artifact = {"id": 1, "workflow_run": {"id": 10}}
+    request_data = mocker.patch.object(
+        connector,
+        "_request_data",
+        side_effect=[
+            {"total_count": 0, "artifacts": []},
+            {"total_count": 1, "artifacts": [artifact]},
+        ],
+    )
+    assert connector.get_workflow_run_artifact(10) == artifact
+    assert request_data.call_args.args[0].endswith("/owner/repo/actions/runs/10/artifacts")
+
+
+def test_find_workflow_run_artifact_stops_at_older_runs(mocker):
+    connector = get_connector(mocker)
+    page = {"artifacts": [{"id": i, "workflow_run": {"id": 200 - i}} for i in range(100)]}
+    older_page = {"artifacts": [{"id": i, "workflow_run": {"id": 5 - i}} for i in range(100)]}
+    request_data = mocker.patch.object(
+        connector, "_request_data", side_effect=[page, older_page, page]
+    )
+    assert connector.find_workflow_run_artifact(50) is None
+    assert request_data.call_count == 2
+    assert request_data.call_args.kwargs["params"] == {"per_page": 100, "page": 2}
+
+
+def test_get_tree_elements_fetches_the_subtree_of_a_truncated_tree(mocker):
+    def tree(elements, truncated=False):
+        return SimpleNamespace(
+            sha="root",
+            raw_data={"truncated": truncated},
+            tree=[SimpleNamespace(path=path, type=type, sha=sha) for path, type, sha in elements],
+        )
+
+    trees = {
+        ("main", True): tree([("README.md", "blob", "r")], truncated=True),
+        ("main", False): tree([(".github", "tree", "g"), ("README.md", "blob", "r")]),
+        ("g", False): tree([("workflows", "tree", "w")]),
+        ("w", True): tree([("a.yml", "blob", "a"), ("d", "tree", "d")], truncated=True),
+        ("w", False): tree([("a.yml", "blob", "a"), ("d", "tree", "d")]),
+        ("d", True): tree([("b.yml", "blob", "b")]),
+    }
+    connector = get_connector(mocker)
+    connector.BRANCH_NAME = "main"
+    connector.repo = mocker.Mock()
+    connector.repo.get_git_tree.side_effect = lambda sha, recursive=False: trees[(sha, recursive)]
+    mocker.patch.object(connector, "observe_rate_limit")
+
+    elements = connector.get_tree_elements(".github/workflows/")
+    assert [(element.path, element.type, element.sha) for element in elements] == [
+        (".github/workflows", "tree", "w"),
+        (".github/workflows/a.yml", "blob", "a"),
+        (".github/workflows/d", "tree", "d"),
+        (".github/workflows/d/b.yml", "blob", "b"),
+    ]
+    assert connector._get_folder_elements("README.md/x", "main") == []
+
+
+def test_connector_refuses_to_connect_without_access_token(mocker):
+    mocker.patch.object(GitHubConnector, "set_git_integration")
+    mocker.patch(
+        "github_tests_validator_app.lib.connectors.github_client.token_cache.get_token",
+        return_value="",
+    )
+    get_github_client = mocker.patch(
+        "github_tests_validator_app.lib.connectors.github_client.get_github_client"
+    )
+    with pytest.raises(ValueError, match="owner/repo"):
+        GitHubConnector({"organization_or_user": "user"}, "owner/repo", "main")
+    get_github_client.assert_not_called()
@@ -0,0 +1,169 @@
+import queue
+import threading
+import time
+from contextvars import ContextVar
+
+from github_tests_validator_app.bin import github_event_process
+import pytest
+from github_tests_validator_app.bin.github_event_process import (
+    EventCoalescer,
+    accept_event,
+    dispatch,
+    handle_process,
+)
+from github_tests_validator_app.lib.deduplication import EventDeduplicator
+
+
+def get_payload(run_id, job_id):
+    return {
+        "action": "completed",
+        "repository": {"full_name": "user/repo"},
+        "workflow_job": {"run_id": run_id, "id": job_id, "head_branch": "main"},
+    }
+
+
+def test_coalescer_fires_last_event_once_per_key():
+    fired = []
+    done = threading.Event()
+
+    def callback(payload, claimed):
+        fired.append(payload)
+        if len(fired) == 2:
+            done.set()
+
+    coalescer = EventCoalescer(window=0.1, max_delay=10)
+    for job_id in range(3):
+        coalescer.add(1, get_payload(1, job_id), callback)
+    coalescer.add(2, get_payload(2, 0), callback)
+    assert done.wait(5)
+    time.sleep(0.2)
+    assert sorted((p["workflow_job"]["run_id"], p["workflow_job"]["id"]) for p in fired) == [
+        (1, 2),
+        (2, 0),
+    ]
+    assert coalescer.stats() == {"pending": 0, "coalesced": 2, "fired": 2}
+
+
+def test_coalescer_does_not_wait_longer_than_max_delay():
+    fired = threading.Event()
+    coalescer = EventCoalescer(window=10, max_delay=0.1)
+    coalescer.add(1, get_payload(1, 0), lambda payload, claimed: fired.set())
+    assert fired.wait(5)
+
+
+def test_coalescer_flush_fires_pending_events():
+    fired = []
+    coalescer = EventCoalescer(window=60, max_delay=60)
+    coalescer.add(1, get_payload(1, 0), lambda payload, claimed: fired.append(payload))
+    coalescer.flush()
+    assert fired == [get_payload(1, 0)]
+
+
+def test_coalescer_fires_in_the_context_of_the_last_event():
+    delivery = ContextVar("delivery")
+    fired = []
+    coalescer = EventCoalescer(window=60, max_delay=60)
+    for delivery_id in ["first", "last"]:
+        token = delivery.set(delivery_id)
+        coalescer.add(1, get_payload(1, 0), lambda *args: fired.append(delivery.get()))
+        delivery.reset(token)
+    coalescer.flush()
+    assert fired == ["last"]
+
+
+def test_dispatch_processes_a_workflow_run_once(mocker):
+    mocker.patch.object(
+        github_event_process, "event_deduplicator", EventDeduplicator(10, 60, use_sql=False)
+    )
+    coalescer = EventCoalescer(window=60, max_delay=60)
+    mocker.patch.object(github_event_process, "event_coalescer", coalescer)
+    mocker.patch.object(github_event_process, "get_event", return_value="workflow_job")
+    submit = mocker.Mock()
+
+    for job_id in range(3):
+        assert dispatch(get_payload(1, job_id), f"delivery-{job_id}", submit)
+    assert not dispatch(get_payload(1, 2), "delivery-2", submit)
+    submit.assert_not_called()
+    coalescer.flush()
+    submit.assert_called_once()
+    assert submit.call_args.args[1] == get_payload(1, 2)
+    # A job event arriving after the run has been processed is a duplicate.
+    dispatch(get_payload(1, 3), "delivery-3", submit)
+    coalescer.flush()
+    submit.assert_called_once()
+
+
+def test_dispatch_releases_the_deliveries_of_a_failed_workflow_run(mocker):
+    mocker.patch.object(
+        github_event_process, "event_deduplicator", EventDeduplicator(10, 60, use_sql=False)
+    )
+    coalescer = EventCoalescer(window=60, max_delay=60)
+    mocker.patch.object(github_event_process, "event_coalescer", coalescer)
+    mocker.patch.object(github_event_process, "get_event", return_value="workflow_job")
+    submit = mocker.Mock()
+
+    for job_id in range(2):
+        assert dispatch(get_payload(1, job_id), f"delivery-{job_id}", submit)
+    coalescer.flush()
+    submit.call_args.kwargs["on_error"]()
+    # Both deliveries can be redelivered once the processing failed.
+    for job_id in range(2):
+        assert dispatch(get_payload(1, job_id), f"delivery-{job_id}", submit)
+
+
+def test_coalescer_retries_events_rejected_by_a_full_queue(mocker):
+    mocker.patch.object(
+        github_event_process, "event_deduplicator", EventDeduplicator(10, 60, use_sql=False)
+    )
+    coalescer = EventCoalescer(window=0.01, max_delay=60, retry_delay=0.05)
+    mocker.patch.object(github_event_process, "event_coalescer", coalescer)
+    mocker.patch.object(github_event_process, "get_event", return_value="workflow_job")
+    submitted = threading.Event()
+    calls = []
+
+    def submit(job, payload, on_error):
+        calls.append(payload)
+        if len(calls) == 1:
+            raise queue.Full()
+        submitted.set()
+
+    assert dispatch(get_payload(1, 0), "delivery-0", submit)
+    assert submitted.wait(5)
+    assert calls == [get_payload(1, 0)] * 2
+    assert coalescer.stats()["pending"] == 0
+
+
+def test_dispatch_submits_the_coroutine_in_async_mode(mocker):
+    mocker.patch.object(
+        github_event_process, "event_deduplicator", EventDeduplicator(10, 60, use_sql=False)
+    )
+    mocker.patch.object(github_event_process, "WORKER_MODE", "async")
+    mocker.patch.object(github_event_process.event_coalescer, "window", 0)
+    mocker.patch.object(github_event_process, "get_event", return_value="workflow_job")
+    submit = mocker.Mock()
+    assert dispatch(get_payload(1, 0), "delivery-0", submit)
+    assert submit.call_args.args[0] is github_event_process.run_async
+
+
+@pytest.mark.parametrize(
+    "event_name,body,expected",
+    [
+        (None, b"{}", True),
+        ("push", b'{"ref": "refs/heads/main"}', False),
+        ("workflow_job", b'{"action": "queued", "workflow_job": {}}', False),
+        ("workflow_job", b'{\n  "action":"completed", "workflow_job": {}}', True),
+        ("pull_request", b'{"action": "closed"}', False),
+        ("pull_request", b'{"action": "reopened"}', True),
+        # The action is not the first key, the decoded payload will tell.
+        ("pull_request", b'{"number": 1, "action": "closed"}', True),
+    ],
+)
+def test_accept_event(event_name, body, expected):
+    assert accept_event(event_name, body) == expected
+
+
+def test_handle_process_filters_actions():
+    assert handle_process({"action": "completed", "workflow_job": {}}) == "workflow_job"
+    assert handle_process({"action": "queued", "workflow_job": {}}) == ""
+    assert handle_process({"action": "opened", "pull_request": {}}) == "pull_request"
+    assert handle_process({"ref": "main", "pusher": {}}) == ""
@@ -1,5 +1,21 @@
+import threading
+from types import SimpleNamespace
+
 import pytest
-from github_tests_validator_app.bin.github_repo_validation import get_event, get_user_branch
+from github import UnknownObjectException
+from github_tests_validator_app.bin import github_repo_validation
+from github_tests_validator_app.bin.github_repo_validation import (
+    compare_folder,
+    compare_folder_tree,
+    folder_hash_cache,
+    get_event,
+    get_head_sha,
+    get_reference_folder_hash,
+    get_user_branch,
+    validate_github_repo,
+    validation_cache,
+)
+from github_tests_validator_app.lib.utils import get_hash_tree_elements
 
 
 @pytest.mark.parametrize(
@@ -27,3 +43,153 @@ def test_get_event(payload, expected):
 )
 def test_get_user_branch(payload, trigger, expected):
     assert get_user_branch(payload, trigger) == expected
+
+
+def tree_element(path, type, sha):
+    return SimpleNamespace(path=path, type=type, sha=sha)
+
+
+@pytest.mark.parametrize(
+    "user_elements,solution_elements,expected",
+    [
+        (
+            [tree_element("folder", "tree", "1"), tree_element("folder/a.yml", "blob", "2")],
+            [tree_element("folder", "tree", "3"), tree_element("folder/a.yml", "blob", "2")],
+            True,
+        ),
+        (
+            [tree_element("folder", "tree", "1"), tree_element("folder/a.yml", "blob", "2")],
+            [tree_element("folder", "tree", "1"), tree_element("folder/a.yml", "blob", "4")],
+            False,
+        ),
+    ],
+)
+def test_compare_folder_tree(mocker, user_elements, solution_elements, expected):
+    user_github = mocker.Mock(BRANCH_NAME="main")
+    user_github.get_tree_elements.return_value = user_elements
+    solution_repo = mocker.Mock(BRANCH_NAME="main")
+    solution_repo.get_tree_hash.side_effect = lambda folder, ref: get_hash_tree_elements(
+        solution_elements
+    )
+    assert compare_folder_tree(user_github, solution_repo, "folder") == expected
+
+
+def test_compare_folder_tree_submodule(mocker):
+    user_github = mocker.Mock(BRANCH_NAME="main")
+    user_github.get_tree_elements.return_value = [tree_element("tests", "commit", "abc")]
+    solution_repo = mocker.Mock(BRANCH_NAME="main")
+    solution_repo.get_last_hash_commit.return_value = "abc"
+    assert compare_folder_tree(user_github, solution_repo, "tests")
+
+
+def hash_after(released, hashed):
+    def get_hash(folder, ref):
+        released.wait(5)
+        hashed.set()
+        return "hash"
+
+    return get_hash
+
+
+def test_compare_folder_tree_submodule_does_not_wait_for_the_reference_hash(mocker):
+    released, hashed = threading.Event(), threading.Event()
+    user_github = mocker.Mock(BRANCH_NAME="main")
+    user_github.get_tree_elements.return_value = [tree_element("tests", "commit", "abc")]
+    solution_repo = mocker.Mock(BRANCH_NAME="main")
+    solution_repo.get_last_hash_commit.return_value = "abc"
+    solution_repo.get_tree_hash.side_effect = solution_repo.get_hash.side_effect = hash_after(
+        released, hashed
+    )
+    try:
+        assert compare_folder_tree(user_github, solution_repo, "tests")
+        assert not hashed.is_set()
+    finally:
+        released.set()
+
+
+def test_compare_folder_missing_user_folder_does_not_wait_for_the_reference_hash(mocker):
+    released, hashed = threading.Event(), threading.Event()
+    user_github = mocker.Mock(BRANCH_NAME="main")
+    user_github.repo.get_contents.side_effect = UnknownObjectException(404, {}, None)
+    solution_repo = mocker.Mock(BRANCH_NAME="main")
+    solution_repo.get_tree_hash.side_effect = solution_repo.get_hash.side_effect = hash_after(
+        released, hashed
+    )
+    mocker.patch.object(github_repo_validation, "GH_FOLDER_FETCH_MODE", "contents")
+    try:
+        with pytest.raises(UnknownObjectException):
+            compare_folder(user_github, solution_repo, "tests")
+        assert not hashed.is_set()
+    finally:
+        released.set()
+
+
+def test_get_reference_folder_hash_is_cached_by_commit(mocker):
+    folder_hash_cache.clear()
+    solution_repo = mocker.Mock(REPO_NAME="owner/repo")
+    solution_repo.get_last_hash_commit.side_effect = ["sha1", "sha1", "sha2"]
+    solution_repo.get_tree_hash.side_effect = lambda folder, ref: f"hash-{ref}"
+    assert get_reference_folder_hash(solution_repo, "folder") == "hash-sha1"
+    assert get_reference_folder_hash(solution_repo, "folder") == "hash-sha1"
+    assert get_reference_folder_hash(solution_repo, "folder") == "hash-sha2"
+    assert solution_repo.get_tree_hash.call_count == 2
+    assert folder_hash_cache.stats()["hits"] == 1
+
+
+def test_get_head_sha():
+    repository = {"full_name": "user/repo"}
+    assert get_head_sha({"workflow_job": {"head_sha": "abc"}}, "workflow_job") == "abc"
+    head = {"sha": "def", "repo": {"full_name": "user/repo"}}
+    payload = {"repository": repository, "pull_request": {"head": head}}
+    assert get_head_sha(payload, "pull_request") == "def"
+    head["repo"] = {"full_name": "other/repo"}
+    assert get_head_sha(payload, "pull_request") is None
+
+
+def test_validate_github_repo_reuses_verdict_of_same_commits(mocker):
+    validation_cache.clear()
+    user_github = mocker.Mock(REPO_NAME="user/repo", user_data={"id": 1})
+    user_github.repo.parent.full_name = "owner/repo"
+    original_github = mocker.patch.object(github_repo_validation, "GitHubConnector").return_value
+    original_github.get_last_hash_commit.return_value = "parent-sha"
+    compare_folder = mocker.patch.object(
+        github_repo_validation, "compare_folder", return_value=True
+    )
+    sql_client = mocker.Mock()
+    sql_client.get_repository_validation.return_value = None
+    payload = {"workflow_job": {"head_sha": "head-sha"}}
+
+    assert validate_github_repo(user_github, sql_client, payload, "workflow_job")
+    assert validate_github_repo(user_github, sql_client, payload, "workflow_job")
+    compare_folder.assert_called_once()
+    assert compare_folder.call_args.kwargs == {"user_ref": "head-sha", "solution_ref": "parent-sha"}
+    assert sql_client.add_new_repository_validation.call_args.kwargs == {
+        "head_sha": "head-sha",
+        "parent_repository": "owner/repo",
+        "parent_sha": "parent-sha",
+    }
+
+    # A verdict recorded by another instance is reused too.
+    validation_cache.clear()
+    sql_client.get_repository_validation.return_value = False
+    assert validate_github_repo(user_github, sql_client, payload, "workflow_job") is False
+    compare_folder.assert_called_once()
+
+
+def test_validate_github_repo_compares_the_branch_without_head_commit(mocker):
+    validation_cache.clear()
+    user_github = mocker.Mock(REPO_NAME="user/repo", user_data={"id": 1})
+    user_github.repo.parent.full_name = "owner/repo"
+    original_github = mocker.patch.object(github_repo_validation, "GitHubConnector").return_value
+    original_github.get_last_hash_commit.return_value = "parent-sha"
+    compare_folder = mocker.patch.object(
+        github_repo_validation, "compare_folder", return_value=True
+    )
+    sql_client = mocker.Mock()
+    head = {"sha": "head-sha", "repo": {"full_name": "other/repo"}}
+    payload = {"repository": {"full_name": "user/repo"}, "pull_request": {"head": head}}
+
+    assert validate_github_repo(user_github, sql_client, payload, "pull_request")
+    # Without a head commit of the fork, its branch is compared and nothing is reused.
+    assert compare_folder.call_args.kwargs == {"user_ref": None, "solution_ref": "parent-sha"}
+    sql_client.get_repository_validation.assert_not_called()
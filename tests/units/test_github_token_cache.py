@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from github_tests_validator_app.lib.connectors.github_token_cache import InstallationTokenCache
+
+
+def get_token_cache(mocker, expires_in):
+    integration = mocker.Mock()
+    integration.get_installation.return_value = SimpleNamespace(id=42)
+    integration.get_access_token.side_effect = lambda installation_id: SimpleNamespace(
+        token=f"token-{integration.get_access_token.call_count}",
+        expires_at=datetime.now(timezone.utc) + expires_in,
+    )
+    token_cache = InstallationTokenCache(refresh_margin=300)
+    mocker.patch.object(token_cache, "get_integration", return_value=integration)
+    return token_cache, integration
+
+
+def test_token_is_reused_until_expiry(mocker):
+    token_cache, integration = get_token_cache(mocker, timedelta(hours=1))
+    assert token_cache.get_token("owner/repo") == "token-1"
+    assert token_cache.get_token("Owner/Repo") == "token-1"
+    assert integration.get_installation.call_count == 1
+    assert integration.get_access_token.call_count == 1
+    assert token_cache.stats()["hits"] == 1
+
+
+def test_token_is_refreshed_shortly_before_expiry(mocker):
+    token_cache, integration = get_token_cache(mocker, timedelta(minutes=2))
+    assert token_cache.get_token("owner/repo") == "token-1"
+    assert token_cache.get_token("owner/repo") == "token-2"
+    assert integration.get_installation.call_count == 1
+
+
+def test_remembered_installation_skips_lookup(mocker):
+    token_cache, integration = get_token_cache(mocker, timedelta(hours=1))
+    token_cache.remember_installation("owner/repo", 7)
+    token_cache.get_token("owner/repo")
+    integration.get_installation.assert_not_called()
+    integration.get_access_token.assert_called_once_with(7)
@@ -0,0 +1,42 @@
+import requests
+from github_tests_validator_app.lib.connectors.http_session import (
+    RETRY_STATUS_CODES,
+    TimeoutHTTPAdapter,
+    get_github_client,
+    get_http_session,
+)
+
+
+def test_http_session_is_shared_and_retries():
+    session = get_http_session()
+    assert get_http_session() is session
+    adapter = session.get_adapter("https://api.github.com")
+    assert isinstance(adapter, TimeoutHTTPAdapter)
+    assert adapter.timeout > 0
+    assert set(RETRY_STATUS_CODES) <= set(adapter.max_retries.status_forcelist)
+    assert adapter.max_retries.respect_retry_after_header
+
+
+def test_adapter_defaults_the_timeout_of_requests(mocker):
+    send = mocker.patch.object(requests.adapters.HTTPAdapter, "send")
+    adapter = TimeoutHTTPAdapter(timeout=5)
+    request = requests.Request("GET", "https://api.github.com").prepare()
+
+    adapter.send(request)
+    assert send.call_args.kwargs["timeout"] == 5
+    adapter.send(request, timeout=1)
+    assert send.call_args.kwargs["timeout"] == 1
+
+
+def test_github_client_is_reused_per_token():
+    assert get_github_client("token-a") is get_github_client("token-a")
+    assert get_github_client("token-a") is not get_github_client("token-b")
+
+
+def test_github_client_uses_the_configured_api_url(mocker):
+    mocker.patch(
+        "github_tests_validator_app.lib.connectors.http_session.GH_API_URL",
+        "http://127.0.0.1:8081",
+    )
+    client = get_github_client("token-local")
+    assert client.requester.base_url == "http://127.0.0.1:8081"
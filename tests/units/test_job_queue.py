@@ -0,0 +1,130 @@
+import asyncio
+import queue
+import threading
+from contextvars import ContextVar
+
+import pytest
+from github_tests_validator_app.lib.job_queue import JobQueue
+
+
+def test_job_queue_runs_jobs_and_drains_on_stop():
+    results = []
+    job_queue = JobQueue(workers=2, max_size=10)
+    job_queue.start()
+    for i in range(5):
+        job_queue.submit(results.append, i)
+    job_queue.stop()
+    assert sorted(results) == [0, 1, 2, 3, 4]
+    assert job_queue.stats()["processed"] == 5
+
+
+def test_job_queue_runs_jobs_in_the_context_they_were_submitted_from():
+    event = ContextVar("event", default="")
+    results = []
+    job_queue = JobQueue(workers=1, max_size=10)
+    job_queue.start()
+    for name in ["pull_request", "workflow_job"]:
+        token = event.set(name)
+        job_queue.submit(lambda: results.append(event.get()))
+        event.reset(token)
+    job_queue.stop()
+    assert results == ["pull_request", "workflow_job"]
+
+
+def test_job_queue_rejects_when_full():
+    release = threading.Event()
+    job_queue = JobQueue(workers=1, max_size=1)
+    job_queue.start()
+    job_queue.submit(release.wait)
+    # Wait for the worker to pick the blocking job so the queue is empty again.
+    while job_queue.depth():
+        pass
+    job_queue.submit(lambda: None)
+    with pytest.raises(queue.Full):
+        job_queue.submit(lambda: None)
+    release.set()
+    job_queue.stop()
+    assert job_queue.stats()["rejected"] == 1
+
+
+def test_job_queue_counts_failures():
+    def fail():
+        raise RuntimeError("boom")
+
+    errors = []
+    job_queue = JobQueue(workers=1, max_size=1)
+    job_queue.start()
+    job_queue.submit(fail, on_error=lambda: errors.append("fail"))
+    job_queue.stop()
+    assert job_queue.stats()["failed"] == 1
+    assert errors == ["fail"]
+
+
+def test_job_queue_refuses_jobs_when_stopped():
+    job_queue = JobQueue(workers=1, max_size=1)
+    with pytest.raises(queue.Full):
+        job_queue.submit(lambda: None)
+
+
+def test_async_job_queue_runs_coroutines_concurrently_on_one_loop():
+    event = ContextVar("event", default="")
+    started = []
+    results = []
+    job_queue = JobQueue(workers=3, max_size=10, mode="async")
+    job_queue.start()
+
+    async def job(name):
+        # Every job waits for the others to have started.
+        started.append(asyncio.get_running_loop())
+        while len(started) < 3:
+            await asyncio.sleep(0.001)
+        results.append((name, event.get()))
+
+    for name in ["a", "b", "c"]:
+        token = event.set(name)
+        job_queue.submit(job, name)
+        event.reset(token)
+    job_queue.submit(results.append, ("sync", ""))
+    job_queue.stop()
+    assert sorted(results) == [("a", "a"), ("b", "b"), ("c", "c"), ("sync", "")]
+    assert len(set(started)) == 1
+    assert job_queue.stats()["processed"] == 4
+
+
+def test_async_job_queue_counts_failures():
+    async def fail():
+        raise RuntimeError("boom")
+
+    errors = []
+    job_queue = JobQueue(workers=2, max_size=1, mode="async")
+    job_queue.start()
+    job_queue.submit(fail, on_error=lambda: errors.append("fail"))
+    job_queue.stop()
+    assert job_queue.stats()["failed"] == 1
+    assert errors == ["fail"]
+
+
+def test_async_job_queue_closes_the_github_client_of_its_loop():
+    from github_tests_validator_app.lib.connectors.async_github_client import (
+        get_async_github_client,
+    )
+
+    clients = []
+
+    async def job():
+        clients.append(get_async_github_client())
+
+    job_queue = JobQueue(workers=1, max_size=1, mode="async")
+    job_queue.start()
+    job_queue.submit(job)
+    job_queue.stop()
+    assert clients[0].http.is_closed
+
+
+def test_job_queue_starts_worker_processes_ahead_of_the_first_job():
+    job_queue = JobQueue(workers=2, max_size=1, mode="process")
+    job_queue.start()
+    job_queue.warm_up()
+    assert len(job_queue._process_pool._processes) == 2
+    assert job_queue.alive()
+    job_queue.stop()
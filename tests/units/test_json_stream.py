@@ -0,0 +1,72 @@
+import io
+import json
+import zipfile
+
+import pytest
+from github_tests_validator_app.lib.artifacts import open_pytest_artifact
+from github_tests_validator_app.lib.json_stream import (
+    JSONStreamReader,
+    iter_object_array,
+    load_object_without,
+)
+
+REPORT = {
+    "created": 1700000000.123,
+    "duration": 12.5,
+    "summary": {"passed": 2, "failed": 1, "collected": 3},
+    "tests": [
+        {"nodeid": f"tests/test_{i}.py::test_{i}", "outcome": "passed", "setup": {"l": "x" * i}}
+        for i in range(3)
+    ],
+    "warnings": [],
+    "exitcode": 1234567,
+}
+
+
+def stream(document, **kwargs):
+    return io.BytesIO(json.dumps(document, **kwargs).encode())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_json_stream_reader_decodes_members_across_chunks(chunk_size):
+    reader = JSONStreamReader(stream(REPORT, indent=2), chunk_size=chunk_size)
+    members = {}
+    for key in reader.iter_members():
+        members[key] = list(reader.iter_array()) if key == "tests" else reader.read_value()
+    assert members == REPORT
+
+
+def test_load_object_without_skips_key():
+    header = load_object_without(stream(REPORT), "tests")
+    assert "tests" not in header
+    assert header["summary"] == REPORT["summary"]
+    assert header["exitcode"] == 1234567
+
+
+@pytest.mark.parametrize(
+    "document,expected",
+    [
+        (REPORT, REPORT["tests"]),
+        ({"differences": "diff"}, []),
+        ({"tests": []}, []),
+        ({"tests": None}, []),
+    ],
+)
+def test_iter_object_array(document, expected):
+    assert list(iter_object_array(stream(document), "tests")) == expected
+
+
+def test_open_pytest_artifact():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("results.json", json.dumps(REPORT))
+    archive.seek(0)
+    with open_pytest_artifact(archive) as artifact:
+        assert artifact.get("duration") == 12.5
+        assert "differences" not in artifact
+        assert list(artifact.iter_tests()) == REPORT["tests"]
+    assert archive.closed
+
+
+def test_open_pytest_artifact_invalid_archive():
+    assert open_pytest_artifact(io.BytesIO(b"not a zip")) is None
@@ -0,0 +1,102 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from github_tests_validator_app.lib.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+    current_event,
+    gauges_from_stats,
+    timed,
+    track_stage,
+)
+from github_tests_validator_app.lib.utils import submit_with_context
+
+
+def test_counter_and_gauge_render_one_line_per_labels():
+    registry = Registry()
+    counter = registry.counter("events_total", "Events.", ("event",))
+    gauge = registry.gauge("depth", "Depth.")
+    counter.inc(event="workflow_job")
+    counter.inc(2, event="workflow_job")
+    counter.inc(event='pull "request"')
+    gauge.set(3)
+
+    assert registry.render().splitlines() == [
+        "# HELP events_total Events.",
+        "# TYPE events_total counter",
+        'events_total{event="workflow_job"} 3.0',
+        'events_total{event="pull \\"request\\""} 1.0',
+        "# HELP depth Depth.",
+        "# TYPE depth gauge",
+        "depth 3.0",
+    ]
+
+
+def test_registry_returns_the_metric_already_registered():
+    registry = Registry()
+    assert registry.counter("events_total", "Events.") is registry.counter("events_total", "")
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("duration_seconds", "Duration.", ("stage",), buckets=(0.1, 1))
+    for value in [0.05, 0.1, 0.5, 3]:
+        histogram.observe(value, stage="get_repo")
+
+    samples = {(name, labels.get("le")): value for name, labels, value in histogram.samples()}
+
+    assert samples[("duration_seconds_bucket", "0.1")] == 2
+    assert samples[("duration_seconds_bucket", "1.0")] == 3
+    assert samples[("duration_seconds_bucket", "+Inf")] == 4
+    assert samples[("duration_seconds_count", None)] == 4
+    assert samples[("duration_seconds_sum", None)] == pytest.approx(3.65)
+
+
+def test_track_stage_labels_the_current_event_and_counts_errors(mocker):
+    seconds = mocker.patch("github_tests_validator_app.lib.metrics.STAGE_SECONDS")
+    errors = mocker.patch("github_tests_validator_app.lib.metrics.STAGE_ERRORS")
+    token = current_event.set("workflow_job")
+    try:
+        with track_stage("artifact_list"):
+            pass
+        with pytest.raises(ValueError), track_stage("artifact_download"):
+            raise ValueError()
+    finally:
+        current_event.reset(token)
+
+    assert [call.kwargs for call in seconds.observe.call_args_list] == [
+        {"event": "workflow_job", "stage": "artifact_list"},
+        {"event": "workflow_job", "stage": "artifact_download"},
+    ]
+    errors.inc.assert_called_once_with(event="workflow_job", stage="artifact_download")
+
+
+def test_timed_keeps_the_return_value(mocker):
+    seconds = mocker.patch("github_tests_validator_app.lib.metrics.STAGE_SECONDS")
+
+    @timed("zip_parse")
+    def parse(value):
+        return value * 2
+
+    assert parse(21) == 42
+    assert seconds.observe.call_args.kwargs == {"event": "", "stage": "zip_parse"}
+
+
+def test_submit_with_context_keeps_the_current_event():
+    token = current_event.set("pull_request")
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            assert executor.submit(current_event.get).result() == ""
+            assert submit_with_context(executor, current_event.get).result() == "pull_request"
+    finally:
+        current_event.reset(token)
+
+
+def test_gauges_from_stats_keeps_numeric_values():
+    metrics = gauges_from_stats("github_app_queue", {"mode": "thread", "depth": 2, "ok": True})
+
+    assert [(metric.name, metric.samples()) for metric in metrics] == [
+        ("github_app_queue_depth", [("github_app_queue_depth", {}, 2.0)])
+    ]
+    assert isinstance(metrics[0], Gauge) and not isinstance(metrics[0], Counter)
@@ -0,0 +1,124 @@
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from github_tests_validator_app.lib.connectors.github_client import GitHubConnector
+from github_tests_validator_app.lib.connectors.rate_limiter import RateLimiter, rate_limiter
+
+
+@pytest.fixture
+def sleep(mocker):
+    return mocker.patch("github_tests_validator_app.lib.connectors.rate_limiter.time.sleep")
+
+
+def test_throttle_does_nothing_with_unknown_budget(sleep):
+    assert RateLimiter().throttle("token") == 0
+    sleep.assert_not_called()
+
+
+def test_throttle_spreads_budget_below_low_watermark(sleep):
+    limiter = RateLimiter(reserve=10, low_watermark=100, max_wait=60)
+    limiter.update("token", 5000, 30, time.time() + 40)
+    delay = limiter.throttle("token")
+    assert delay == pytest.approx(40 / 20, rel=0.05)
+    assert limiter.stats()[limiter._fingerprint("token")]["remaining"] == 29
+
+
+def test_throttle_waits_for_reset_below_reserve(sleep):
+    limiter = RateLimiter(reserve=10, low_watermark=100, max_wait=60)
+    limiter.set_label("token", "installation-1")
+    limiter.update("token", 5000, 10, time.time() + 600)
+    assert limiter.throttle("token") == 60
+    stats = limiter.stats()["installation-1"]
+    assert stats["throttled"] == 1
+    assert stats["throttled_seconds"] == 60
+
+
+def test_update_keeps_lowest_remaining_of_a_window():
+    limiter = RateLimiter()
+    reset = time.time() + 600
+    limiter.update("token", 5000, 100, reset)
+    limiter.update("token", 5000, 120, reset)
+    assert limiter.stats()[limiter._fingerprint("token")]["remaining"] == 100
+    limiter.update("token", 5000, 4999, reset + 3600)
+    assert limiter.stats()[limiter._fingerprint("token")]["remaining"] == 4999
+
+
+class FakeGitHub(BaseHTTPRequestHandler):
+    """
+    Serve the run artifacts endpoint with a tiny rate limit window, answering 403 once
+    the budget of the window is exhausted like GitHub does.
+    """
+
+    limit = 5
+    window = 1.0
+    lock = threading.Lock()
+    reset = 0.0
+    remaining = 0
+    rejected = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            now = time.time()
+            if now >= cls.reset:
+                cls.reset = math.ceil(now + cls.window)
+                cls.remaining = cls.limit
+            if cls.remaining == 0:
+                cls.rejected += 1
+                status, body = 403, {"message": "API rate limit exceeded"}
+            else:
+                cls.remaining -= 1
+                status, body = 200, {"total_count": 0, "artifacts": []}
+            headers = {
+                "X-RateLimit-Limit": str(cls.limit),
+                "X-RateLimit-Remaining": str(cls.remaining),
+                "X-RateLimit-Reset": str(cls.reset),
+            }
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.mark.parametrize("authorization", ["token abc", b"token abc"])
+def test_observe_response_reads_the_budget_of_the_token(authorization, mocker):
+    limiter = RateLimiter()
+    response = mocker.Mock(headers={"X-RateLimit-Remaining": "10"})
+    response.request.headers = {"Authorization": authorization}
+    update_from_headers = mocker.patch.object(limiter, "update_from_headers")
+    limiter.observe_response(response)
+    update_from_headers.assert_called_once_with("abc", response.headers)
+
+
+def test_events_are_delayed_instead_of_rate_limited(mocker):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGitHub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    mocker.patch.object(rate_limiter, "reserve", 1)
+    mocker.patch.object(rate_limiter, "low_watermark", 2)
+    mocker.patch.object(rate_limiter, "max_wait", 5)
+    connector = GitHubConnector.__new__(GitHubConnector)
+    connector.REPO_NAME = "owner/repo"
+    connector.ACCESS_TOKEN = "fake-github-token"
+    url = f"http://127.0.0.1:{server.server_address[1]}/repos/owner/repo/actions/runs/1/artifacts"
+    try:
+        for _ in range(8):
+            assert connector._request_data(url, headers=connector._get_headers()) == {
+                "total_count": 0,
+                "artifacts": [],
+            }
+    finally:
+        server.shutdown()
+    assert FakeGitHub.rejected == 0
+    assert rate_limiter.stats()[rate_limiter._fingerprint("fake-github-token")]["throttled"] > 0
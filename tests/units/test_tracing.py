@@ -0,0 +1,65 @@
+import pytest
+from github_tests_validator_app.lib import tracing
+from github_tests_validator_app.lib.job_queue import JobQueue
+
+
+@pytest.fixture
+def exporter():
+    pytest.importorskip("opentelemetry.sdk")
+    exporter = tracing.setup_tracing("memory", sample_ratio=1.0)
+    yield exporter
+    tracing.stop_tracing()
+
+
+def test_spans_do_nothing_until_tracing_is_set_up():
+    assert tracing.setup_tracing("none") is None
+
+    @tracing.traced()
+    def compare_folder():
+        tracing.get_current_span().set_attribute("github.file_count", 3)
+        return True
+
+    with tracing.start_span("run", {"github.event": "workflow_job"}) as span:
+        assert span is tracing.NO_OP_SPAN
+        assert compare_folder()
+
+
+def test_jobs_continue_the_trace_of_their_delivery(exporter):
+    @tracing.traced()
+    def validate_github_repo():
+        tracing.get_current_span().set_attribute("github.file_count", 3)
+
+    def run():
+        with tracing.start_span("run", {"github.run_id": 1, "github.repository": None}):
+            validate_github_repo()
+
+    job_queue = JobQueue(workers=1, max_size=1)
+    job_queue.start()
+    with tracing.start_span("webhook"):
+        job_queue.submit(run)
+    job_queue.stop()
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert sorted(spans) == ["run", "validate_github_repo", "webhook"]
+    assert spans["run"].parent.span_id == spans["webhook"].context.span_id
+    assert spans["validate_github_repo"].parent.span_id == spans["run"].context.span_id
+    assert len({span.context.trace_id for span in spans.values()}) == 1
+    assert dict(spans["run"].attributes) == {"github.run_id": 1}
+    assert dict(spans["validate_github_repo"].attributes) == {"github.file_count": 3}
+
+
+def test_unsampled_traces_are_not_exported():
+    pytest.importorskip("opentelemetry.sdk")
+    exporter = tracing.setup_tracing("memory", sample_ratio=0.0)
+    try:
+        with tracing.start_span("webhook"), tracing.start_span("run"):
+            pass
+    finally:
+        tracing.stop_tracing()
+    assert exporter.get_finished_spans() == ()
+
+
+def test_unknown_exporter_is_rejected():
+    pytest.importorskip("opentelemetry.sdk")
+    with pytest.raises(ValueError):
+        tracing.setup_tracing("zipkin")
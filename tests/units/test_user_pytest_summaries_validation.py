@@ -0,0 +1,28 @@
+from github_tests_validator_app.bin import github_repo_validation, user_pytest_summaries_validation
+from github_tests_validator_app.bin.github_repo_validation import validation_cache
+from github_tests_validator_app.bin.user_pytest_summaries_validation import (
+    send_user_pytest_summaries,
+)
+
+
+def test_send_user_pytest_summaries_records_the_validation_without_artifact(mocker):
+    validation_cache.clear()
+    user_github = mocker.Mock(REPO_NAME="user/repo", BRANCH_NAME="main", user_data={"id": 1})
+    user_github.repo.parent.full_name = "owner/repo"
+    user_github.get_workflow_run_artifact.return_value = None
+    original_github = mocker.patch.object(github_repo_validation, "GitHubConnector").return_value
+    original_github.get_last_hash_commit.return_value = "parent-sha"
+    mocker.patch.object(github_repo_validation, "compare_folder", return_value=True)
+    send_artifact_results = mocker.patch.object(
+        user_pytest_summaries_validation, "send_artifact_results"
+    )
+    sql_client = mocker.Mock()
+    sql_client.get_repository_validation.return_value = None
+    payload = {"workflow_job": {"run_id": 10, "head_sha": "head-sha"}}
+
+    send_user_pytest_summaries(user_github, sql_client, payload, "workflow_job")
+    # The repository is validated while the artifact is looked up, so its verdict is
+    # recorded along with the missing artifact.
+    sql_client.add_new_repository_validation.assert_called_once()
+    assert "Cannot find the artifact" in sql_client.add_new_pytest_summary.call_args.kwargs["info"]
+    send_artifact_results.assert_not_called()
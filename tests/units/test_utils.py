@@ -1,9 +1,16 @@
+import hashlib
+from types import SimpleNamespace
 from unittest.mock import PropertyMock
 
 import pytest
 from github import ContentFile
 from github_tests_validator_app.lib.connectors.sqlalchemy_client import User
-from github_tests_validator_app.lib.utils import get_hash_files, init_github_user_from_github_event
+from github_tests_validator_app.lib.utils import (
+    get_backoff_delays,
+    get_hash_files,
+    get_hash_tree_elements,
+    init_github_user_from_github_event,
+)
 
 
 @pytest.mark.parametrize(
@@ -51,3 +58,21 @@ def test_init_github_user_from_github_event(contents, expected):
             and github_user.id == expected.id
             and github_user.url == expected.url
         )
+
+
+def test_get_hash_tree_elements_uses_breadth_first_order():
+    elements = [
+        SimpleNamespace(path=".github/workflows", type="tree", sha="0"),
+        SimpleNamespace(path=".github/workflows/b", type="tree", sha="1"),
+        SimpleNamespace(path=".github/workflows/b/c.yml", type="blob", sha="2"),
+        SimpleNamespace(path=".github/workflows/d.yml", type="blob", sha="3"),
+    ]
+    assert get_hash_tree_elements(elements) == hashlib.sha256(b"32").hexdigest()
+    assert get_hash_tree_elements(elements[::-1]) == get_hash_tree_elements(elements)
+
+
+def test_get_backoff_delays_grow_exponentially_up_to_cap():
+    delays = list(get_backoff_delays(6, base=1, cap=10))
+    assert len(delays) == 6
+    for attempt, delay in enumerate(delays):
+        assert 0 <= delay <= min(10, 2**attempt)
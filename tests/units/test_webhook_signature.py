@@ -0,0 +1,24 @@
+import hashlib
+import hmac
+
+import pytest
+from github_tests_validator_app.lib.webhook_signature import verify_signature
+
+BODY = b'{"action": "completed"}'
+SIGNATURE = "sha256=" + hmac.new(b"secret", BODY, hashlib.sha256).hexdigest()
+
+
+@pytest.mark.parametrize(
+    "body,signature,expected",
+    [
+        (BODY, SIGNATURE, True),
+        (BODY + b" ", SIGNATURE, False),
+        (BODY, SIGNATURE.replace("sha256=", "sha1="), False),
+        (BODY, "sha256=", False),
+        (BODY, None, False),
+        (BODY, "sha256=\u00e9", False),
+        (BODY, SIGNATURE + "\u00e9", False),
+    ],
+)
+def test_verify_signature(body, signature, expected):
+    assert verify_signature(body, signature, b"secret") == expected